@@ -1,6 +1,16 @@
 from flask import Flask, render_template, jsonify
 from models import db
-from flasgger import Swagger
+from utils import FinanceJSONProvider
+from metrics import init_metrics
+from ledger import init_ledger
+from dedupe import init_dedupe
+from categorization import init_categorization
+from archive import init_archive
+from sharding import init_sharding
+from backup import init_backup
+from changes import init_changes
+from assets import init_assets
+from startup import init_apidocs, init_startup, ensure_schema, warm_up, startup_phase, report_startup
 from routes.auth import auth_bp
 from routes.transactions import transactions_bp
 from routes.simplefin import simplefin_bp
@@ -12,11 +22,17 @@ from routes.forecasts import forecasts_bp
 from routes.budget import budget_bp
 from routes.export import export_bp
 from routes.accounts import accounts_bp
+from routes.dashboard import dashboard_bp
+from routes.networth import networth_bp
+from routes.search import search_bp
+from routes.duplicates import duplicates_bp
+from routes.jobs import jobs_bp
+from routes.admin import admin_bp
+from routes.changes import changes_bp
+from routes.analytics import analytics_bp
 
 import os
 import sys
-import webbrowser
-import threading
 import time
 from dotenv import load_dotenv
 import logging
@@ -26,6 +42,8 @@ load_dotenv()
 
 
 def create_app(test_config=None):
+    started = time.perf_counter()
+    timings = {}
     if getattr(sys, 'frozen', False):
         base_path = sys._MEIPASS
         template_folder = os.path.join(base_path, 'templates')
@@ -33,8 +51,21 @@ def create_app(test_config=None):
         app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
     else:
         app = Flask(__name__)
+    app.json = FinanceJSONProvider(app)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key')
+    # Fast start: lazy /apidocs. On by default for the desktop build; gunicorn sets it via raw_env
+    app.config['FAST_START'] = os.environ.get('FAST_START', '1' if getattr(sys, 'frozen', False) else '0') == '1'
+    # Per-user database files (see sharding.py); the main database then only holds users
+    app.config['SHARDING'] = os.environ.get('SHARDING', '0') == '1'
+    app.config['SHARD_DIR'] = os.environ.get('SHARD_DIR')
+    app.config['SHARD_MAX_OPEN'] = int(os.environ.get('SHARD_MAX_OPEN', '32'))
+    # Online backups (see backup.py); BACKUP_DIR defaults to instance/backups
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR')
+    app.config['BACKUP_KEEP'] = int(os.environ.get('BACKUP_KEEP', '7'))
+    app.config['BACKUP_INTERVAL_HOURS'] = float(os.environ.get('BACKUP_INTERVAL_HOURS', '0'))
+    # Delete markers older than this are pruned from /api/changes by `flask prune-changes`
+    app.config['CHANGE_TOMBSTONE_DAYS'] = int(os.environ.get('CHANGE_TOMBSTONE_DAYS', '90'))
 
     if test_config:
         app.config.update(test_config)
@@ -45,10 +76,20 @@ def create_app(test_config=None):
             db_path = os.path.join(app_dir, 'finance.db')
             app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
         else:
-            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///finance.db'
+            app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///finance.db')
 
     db.init_app(app)
-    Swagger(app)
+    init_sharding(app)
+    init_apidocs(app)
+    init_assets(app)
+    init_metrics(app)
+    init_ledger(app)
+    init_dedupe(app)
+    init_categorization(app)
+    init_archive(app)
+    init_backup(app)
+    init_changes(app)
+    init_startup(app)
 
     # Ensure instance folder exists
     try:
@@ -84,24 +125,32 @@ def create_app(test_config=None):
     app.register_blueprint(budget_bp)
     app.register_blueprint(export_bp)
     app.register_blueprint(accounts_bp)
-
-    with app.app_context():
-        db.create_all()
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(networth_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(duplicates_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(changes_bp)
+    app.register_blueprint(analytics_bp)
 
     @app.route('/health')
     def health_check():
         return jsonify({"status": "healthy", "database": "connected"}), 200
 
-    return app
+    with startup_phase(timings, 'schema'):
+        ensure_schema(app)
+    with startup_phase(timings, 'warm_up'):
+        warm_up(app)
+    report_startup(app, timings, started)
 
+    return app
 
-def open_browser():
-    """Wait for server to start and then open browser."""
-    time.sleep(1.5)
-    webbrowser.open("http://127.0.0.1:5000")
 
 if __name__ == '__main__':
     app = create_app()
-    if getattr(sys, 'frozen', False):
-        threading.Thread(target=open_browser).start()
-    app.run(port=5000)
+    if getattr(sys, 'frozen', False) or '--desktop' in sys.argv:
+        from desktop import run_desktop
+        run_desktop(app)
+    else:
+        app.run(port=5000)
@@ -0,0 +1,162 @@
+"""
+Hot/cold archival of old transactions.
+
+`flask archive-transactions` moves expenses and incomes dated more than
+ARCHIVE_AFTER_DAYS (default 730) ago into expense_archive / income_archive,
+which have the same columns, so per-user queries over recent dates only
+touch the (much smaller) hot tables and their indexes.
+
+Rows keep their ids. The hot tables use AUTOINCREMENT, so SQLite never
+hands an archived id out again and the two tables never overlap.
+
+ArchiveState records a cutoff per table: every archived row is dated before
+it. Read paths query history(model, since) instead of the model. That is the
+hot table alone when the range starts on or after the cutoff, otherwise a
+UNION ALL of both under the model's own attribute names. Rollups, exports
+and the ledger therefore keep seeing the full history. Archived rows are
+read-only: edits and bulk mutations that reach one answer 409 (see
+is_archived_row) rather than not found. Only recategorize-other, which fixes
+the fallback category shown for them, also updates the archive.
+Rows younger than MIN_ARCHIVE_AFTER_DAYS are never archived, so fixed
+look-back windows of up to a year (forecast, income projection,
+duplicate detection) read the hot tables directly.
+"""
+from models import db, Income, Expense, IncomeArchive, ExpenseArchive, ArchiveState
+from categorization import CliProgress
+from sharding import each_shard
+from flask import current_app
+from sqlalchemy import select, union_all, insert, delete, func
+from sqlalchemy.orm import aliased
+from datetime import date, datetime, timedelta
+import click
+
+ARCHIVES = {
+    Expense: ExpenseArchive,
+    Income: IncomeArchive,
+}
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 730
+MIN_ARCHIVE_AFTER_DAYS = 366
+CHUNK_SIZE = 2000
+
+
+def archive_cutoff(model):
+    """Date before which rows of model may be archived; None if nothing ever was."""
+    return db.session.query(ArchiveState.cutoff).filter_by(table=model.__tablename__).scalar()
+
+
+def history(model, since=None):
+    """
+    Entity to query for rows of model dated on or after `since` (None: all
+    dates). Use its attributes exactly like the model's.
+    """
+    cutoff = archive_cutoff(model)
+    if isinstance(since, datetime):
+        since = since.date()
+    if cutoff is None or (since is not None and since >= cutoff):
+        return model
+    hot, cold = model.__table__, ARCHIVES[model].__table__
+    both = union_all(
+        select(*hot.c),
+        select(*[cold.c[c.name] for c in hot.c]),
+    ).subquery(f'{hot.name}_history')
+    return aliased(model, both, adapt_on_names=True)
+
+
+def is_archived_row(model, user_id, row_id):
+    """True if the user's row of model with this id has been moved to the archive."""
+    archive = ARCHIVES[model]
+    return db.session.query(archive.id).filter(archive.id == row_id, archive.user_id == user_id).first() is not None
+
+
+def is_archived(user_id, external_id):
+    """True if one of the user's imported or synced rows with this external id was archived."""
+    if not external_id:
+        return False
+    return any(
+        db.session.query(archive.id).filter(
+            archive.user_id == user_id, archive.simplefin_id == external_id
+        ).first() is not None
+        for archive in ARCHIVES.values()
+    )
+
+
+def _move(progress, source, target, condition, total):
+    """Copy matching rows from source to target and delete them, one committed chunk at a time."""
+    columns = [c.name for c in source.c]
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(source.c.id).where(condition).order_by(source.c.id).limit(CHUNK_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(insert(target).from_select(
+            columns, select(*[source.c[name] for name in columns]).where(source.c.id.in_(ids))
+        ))
+        db.session.execute(delete(source).where(source.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        progress.update(moved, total)
+    return moved
+
+
+def archive_transactions(progress, days=None):
+    """Move rows older than `days` into the archive tables. Returns per-table counts."""
+    if days is None:
+        days = current_app.config.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    if days < MIN_ARCHIVE_AFTER_DAYS:
+        raise ValueError(f'Rows younger than {MIN_ARCHIVE_AFTER_DAYS} days are never archived')
+    cutoff = date.today() - timedelta(days=days)
+    result = {}
+    for model, archive in ARCHIVES.items():
+        hot = model.__table__
+        condition = hot.c.date < cutoff
+        total = db.session.query(func.count()).select_from(hot).filter(condition).scalar()
+        progress.update(0, total, force=True)
+        if total:
+            # Publish the cutoff first, so readers span both tables while rows move
+            state = db.session.get(ArchiveState, hot.name)
+            if state is None:
+                db.session.add(ArchiveState(table=hot.name, cutoff=cutoff))
+            elif state.cutoff < cutoff:
+                state.cutoff = cutoff
+                state.archived_at = datetime.utcnow()
+            db.session.commit()
+        result[hot.name] = _move(progress, hot, archive.__table__, condition, total)
+    return result
+
+
+def restore_transactions(progress):
+    """Move every archived row back to the hot tables."""
+    result = {}
+    for model, archive in ARCHIVES.items():
+        cold = archive.__table__
+        total = db.session.query(func.count()).select_from(cold).scalar()
+        progress.update(0, total, force=True)
+        result[model.__tablename__] = _move(progress, cold, model.__table__, cold.c.id.isnot(None), total)
+        db.session.query(ArchiveState).filter_by(table=model.__tablename__).delete()
+        db.session.commit()
+    return result
+
+
+def init_archive(app):
+    """Register the archive-transactions CLI command."""
+
+    @app.cli.command('archive-transactions')
+    @click.option('--days', type=int, default=None,
+                  help=f'Archive rows dated more than this many days ago (default ARCHIVE_AFTER_DAYS, '
+                       f'{DEFAULT_ARCHIVE_AFTER_DAYS})')
+    @click.option('--restore', is_flag=True, help='Move every archived row back to the hot tables')
+    def archive_transactions_command(days, restore):
+        """Move old expenses and incomes to the archive tables (or back)."""
+        if days is not None and days < MIN_ARCHIVE_AFTER_DAYS:
+            raise click.BadParameter(f'must be at least {MIN_ARCHIVE_AFTER_DAYS}', param_hint='--days')
+        for uid in each_shard():
+            prefix = f'user {uid}: ' if uid is not None else ''
+            if restore:
+                for table, moved in restore_transactions(CliProgress(f'{prefix}restore')).items():
+                    click.echo(f'{prefix}{table}: {moved} rows restored')
+            else:
+                for table, moved in archive_transactions(CliProgress(f'{prefix}archive'), days).items():
+                    click.echo(f'{prefix}{table}: {moved} rows archived')
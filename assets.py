@@ -0,0 +1,209 @@
+"""
+Static asset pipeline.
+
+`flask build-assets` concatenates each bundle in ASSET_BUNDLES, minifies it,
+names it by content hash and writes gzip/brotli variants next to it in
+static/dist, with a manifest mapping bundle names to built files. Built
+files are served from /assets with far-future immutable caching, picking
+the precompressed variant the client accepts. Without a current build
+(never built, or a source edited since) templates fall back to the
+individual source files under /static.
+
+Page HTML only depends on the request path, so each page is rendered once
+per process and served with an ETag; repeat loads revalidate to a 304.
+"""
+from flask import request, make_response, render_template, send_from_directory, url_for, abort
+from markupsafe import Markup, escape
+import mimetypes
+import threading
+import hashlib
+import click
+import gzip
+import json
+import os
+
+# bundle name -> source files (relative to the static folder), in load order
+ASSET_BUNDLES = {
+    'css/app.css': ['css/main.css'],
+    'js/core.js': ['js/api.js', 'js/utils.js'],
+    'js/dashboard.js': ['js/dashboard.js'],
+    'js/transactions.js': ['js/transactions.js'],
+    'js/goals.js': ['js/goals.js'],
+    'js/budget.js': ['js/budget.js'],
+    'js/forecast.js': ['js/forecast.js'],
+    'js/settings.js': ['js/settings.js'],
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Lower index wins when the client accepts several
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _dist_path(app):
+    return os.path.join(app.static_folder, DIST_DIR)
+
+
+def source_digest(static_folder):
+    """Hash of every bundle source, recorded at build time to detect stale builds."""
+    digest = hashlib.sha256()
+    for sources in ASSET_BUNDLES.values():
+        for source in sources:
+            try:
+                with open(os.path.join(static_folder, source), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+    return digest.hexdigest()
+
+
+def build_assets(static_folder):
+    """Write minified, hashed and precompressed bundles. Returns the manifest."""
+    from rjsmin import jsmin
+    from rcssmin import cssmin
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    for root, _, files in os.walk(dist):
+        for name in files:
+            os.remove(os.path.join(root, name))
+
+    manifest = {}
+    for bundle, sources in ASSET_BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        if bundle.endswith('.js'):
+            data = ';\n'.join(jsmin(p) for p in parts).encode('utf-8')
+        else:
+            data = '\n'.join(cssmin(p) for p in parts).encode('utf-8')
+
+        base, ext = os.path.splitext(bundle)
+        built = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(dist, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[bundle] = built
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump({'sources': source_digest(static_folder), 'bundles': manifest}, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(app):
+    """Built bundle names, or None if never built or a source changed since."""
+    try:
+        with open(os.path.join(_dist_path(app), MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('sources') != source_digest(app.static_folder):
+        app.logger.warning('Static sources changed since the last build-assets; serving unbuilt assets')
+        return None
+    return manifest.get('bundles')
+
+
+def _tag(bundle, url):
+    if bundle.endswith('.css'):
+        return f'<link rel="stylesheet" href="{escape(url)}">'
+    return f'<script src="{escape(url)}"></script>'
+
+
+class PageCache:
+    """Rendered page HTML (plus a gzip copy) keyed by template and path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = {}
+
+    def get(self, template):
+        key = (template, request.script_root, request.path)
+        page = self._pages.get(key)
+        if page is None:
+            html = render_template(template).encode('utf-8')
+            page = (html, gzip.compress(html, mtime=0), hashlib.sha256(html).hexdigest()[:16])
+            with self._lock:
+                self._pages[key] = page
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = PageCache()
+
+
+def render_page(template):
+    """Serve a static page from the render cache with ETag revalidation."""
+    from flask import current_app
+    if current_app.debug or current_app.config.get('ASSETS_DEBUG'):
+        return render_template(template)
+
+    html, html_gz, etag = page_cache.get(template)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    elif 'gzip' in request.accept_encodings:
+        response = make_response(html_gz)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # The HTML names the hashed asset files, so it must be revalidated on every load
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def init_assets(app):
+    """Register the /assets route, the asset_tags template helper and the build-assets command."""
+    manifest = None if app.config.get('ASSETS_DEBUG') else load_manifest(app)
+    app.extensions['asset_manifest'] = manifest
+
+    def asset_tags(bundle):
+        built = app.extensions.get('asset_manifest')
+        if built and bundle in built:
+            return Markup(_tag(bundle, url_for('serve_asset', filename=built[bundle])))
+        return Markup('\n'.join(_tag(bundle, url_for('static', filename=s)) for s in ASSET_BUNDLES[bundle]))
+
+    app.jinja_env.globals['asset_tags'] = asset_tags
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        built = app.extensions.get('asset_manifest') or {}
+        if filename not in built.values():
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        dist = _dist_path(app)
+        encoding, suffix = None, ''
+        for name, ext in PRECOMPRESSED:
+            if name in request.accept_encodings and os.path.exists(os.path.join(dist, filename + ext)):
+                encoding, suffix = name, ext
+                break
+        response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Bundle, minify, fingerprint and precompress static assets."""
+        built = build_assets(app.static_folder)
+        for bundle, path in built.items():
+            size = os.path.getsize(os.path.join(_dist_path(app), path))
+            click.echo(f'{bundle:22s} -> {path} ({size} bytes)')
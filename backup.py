@@ -0,0 +1,250 @@
+"""
+Online database backups.
+
+Each SQLite file (the main database, plus every user's file when sharded) is
+copied with SQLite's online backup API, BACKUP_STEP_PAGES pages per step,
+pausing between steps so writers are never locked out for long. A copy is
+restarted by SQLite whenever another connection writes to the source; after
+MAX_RESTARTS it is retried with steps STEP_GROWTH times larger, and finally
+in a single step, so a busy database still gets a consistent snapshot. Snapshots are packed into a
+.tar.gz that is streamed as it is produced.
+
+`GET /api/admin/backup` streams an archive to an admin (granted with
+`flask set-admin`, so rights never follow a username someone can register);
+`flask backup-db` writes one to BACKUP_DIR (or --output) and prunes old
+archives down to BACKUP_KEEP. With BACKUP_INTERVAL_HOURS set, the server
+also takes one on that schedule; a lock file keeps concurrent workers from
+taking the same backup twice.
+"""
+from models import db, User
+from flask import current_app
+from datetime import datetime
+import threading
+import tempfile
+import tarfile
+import sqlite3
+import click
+import time
+import os
+
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_PAUSE = 0.005  # Seconds between steps
+MAX_RESTARTS = 3
+STEP_GROWTH = 16
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_KEEP = 7
+ARCHIVE_PREFIX = 'finance-'
+ARCHIVE_SUFFIX = '.tar.gz'
+
+# A scheduled backup lock older than this is assumed left behind by a dead process
+LOCK_STALE_AFTER = 3600
+SCHEDULER_POLL_SECONDS = 60
+
+
+class _SourceBusy(Exception):
+    pass
+
+
+def snapshot(source_path, target_path, pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_PAUSE):
+    """Consistent copy of a live SQLite file, taken in paged steps. Returns the step size that completed."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        for step in (pages, pages * STEP_GROWTH):
+            last_remaining, restarts = None, 0
+
+            def progress(status, remaining, total):
+                nonlocal last_remaining, restarts
+                if last_remaining is not None and remaining > last_remaining:
+                    restarts += 1  # The source changed under us; SQLite started over
+                    if restarts > MAX_RESTARTS:
+                        raise _SourceBusy()
+                last_remaining = remaining
+                time.sleep(pause)  # No lock is held between steps
+
+            try:
+                source.backup(target, pages=step, progress=progress)
+                return step
+            except _SourceBusy:
+                continue
+        source.backup(target, pages=-1)
+        return -1
+    finally:
+        target.close()
+        source.close()
+
+
+def database_files(app):
+    """(archive name, path) of every SQLite file holding app data."""
+    with app.app_context():
+        url = db.engine.url
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            raise ValueError('Only file-based SQLite databases can be backed up')
+        files = [(os.path.basename(url.database), url.database)]
+        router = app.extensions.get('shards')
+        if router is not None:
+            files.extend((f'shards/user_{uid}.db', router.path(uid)) for uid in router.user_ids())
+    return files
+
+
+def write_archive(fileobj, files):
+    """Snapshot each file and write them as a gzip-compressed tar stream to fileobj."""
+    with tempfile.TemporaryDirectory(prefix='finance-backup-') as workdir, \
+            tarfile.open(fileobj=fileobj, mode='w|gz') as archive:
+        for index, (name, path) in enumerate(files):
+            copy = os.path.join(workdir, f'{index}.db')
+            snapshot(path, copy)
+            archive.add(copy, arcname=name)
+            os.remove(copy)
+
+
+def stream_archive(files):
+    """Generator of .tar.gz chunks, produced by a writer thread as the snapshots are taken."""
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def writer():
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe:
+                write_archive(pipe, files)
+        except Exception as e:  # Includes the reader going away mid-stream
+            errors.append(e)
+
+    thread = threading.Thread(target=writer, daemon=True, name='backup-stream')
+    thread.start()
+    with os.fdopen(read_fd, 'rb') as pipe:
+        while True:
+            chunk = pipe.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def archive_name(now=None):
+    return f"{ARCHIVE_PREFIX}{(now or datetime.now()).strftime('%Y%m%d-%H%M%S')}{ARCHIVE_SUFFIX}"
+
+
+def list_backups(directory):
+    """Archives in directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = [n for n in os.listdir(directory) if n.startswith(ARCHIVE_PREFIX) and n.endswith(ARCHIVE_SUFFIX)]
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+def backup_to_directory(app, directory, keep=DEFAULT_KEEP):
+    """Write a new archive into directory and delete all but the newest `keep`. Returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, archive_name())
+    partial = path + '.part'
+    try:
+        with open(partial, 'wb') as f:
+            write_archive(f, database_files(app))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    for old in list_backups(directory)[:-keep] if keep > 0 else []:
+        os.remove(old)
+    return path
+
+
+def backup_settings(app):
+    directory = app.config.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+    keep = int(app.config.get('BACKUP_KEEP') or DEFAULT_KEEP)
+    return directory, keep
+
+
+def _backup_due(directory, interval):
+    existing = list_backups(directory)
+    return not existing or time.time() - os.path.getmtime(existing[-1]) >= interval
+
+
+def _claim(lock_path):
+    """Create the lock file, replacing one left by a dead process. False if another process holds it."""
+    try:
+        if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_AFTER:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def run_scheduled_backups(app, interval):
+    """Scheduler loop: take a backup whenever the newest one is older than interval seconds."""
+    directory, keep = backup_settings(app)
+    lock_path = os.path.join(directory, '.backup.lock')
+    while True:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if _backup_due(directory, interval) and _claim(lock_path):
+                try:
+                    # Re-check: another worker may have finished one since
+                    if _backup_due(directory, interval):
+                        path = backup_to_directory(app, directory, keep)
+                        app.logger.info(f'Scheduled backup written to {path}')
+                finally:
+                    os.remove(lock_path)
+        except Exception:
+            app.logger.exception('Scheduled backup failed')
+        time.sleep(SCHEDULER_POLL_SECONDS)
+
+
+_scheduler_lock = threading.Lock()
+_scheduler_started = False
+
+
+def init_backup(app):
+    """Start the backup scheduler on the first request (if configured) and register the backup-db and set-admin CLI commands."""
+    interval = float(app.config.get('BACKUP_INTERVAL_HOURS') or 0) * 3600
+
+    if interval > 0:
+        # Started lazily so CLI commands, and a preloading gunicorn master, don't run it
+        @app.before_request
+        def _start_backup_scheduler():
+            global _scheduler_started
+            if _scheduler_started:
+                return
+            with _scheduler_lock:
+                if not _scheduler_started:
+                    _scheduler_started = True
+                    threading.Thread(target=run_scheduled_backups, args=(current_app._get_current_object(), interval),
+                                     daemon=True, name='backup-scheduler').start()
+
+    @app.cli.command('backup-db')
+    @click.option('--output', default=None, help='Write the archive to this file ("-" for stdout) '
+                                                 'instead of BACKUP_DIR')
+    @click.option('--keep', type=int, default=None, help='Archives to keep in BACKUP_DIR (default BACKUP_KEEP)')
+    def backup_db_command(output, keep):
+        """Take an online backup of every database as a .tar.gz."""
+        if output == '-':
+            write_archive(click.get_binary_stream('stdout'), database_files(app))
+            return
+        if output:
+            with open(output, 'wb') as f:
+                write_archive(f, database_files(app))
+            click.echo(f'Backup written to {output}')
+            return
+        directory, default_keep = backup_settings(app)
+        path = backup_to_directory(app, directory, default_keep if keep is None else keep)
+        click.echo(f'Backup written to {path}')
+
+    @app.cli.command('set-admin')
+    @click.argument('username')
+    @click.option('--revoke', is_flag=True, help='Remove admin rights instead')
+    def set_admin_command(username, revoke):
+        """Grant (or revoke) a registered user's admin rights (backup downloads)."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named {username}')
+        user.is_admin = not revoke
+        db.session.commit()
+        click.echo(f"{username} is {'no longer' if revoke else 'now'} an admin")
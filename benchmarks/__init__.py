@@ -0,0 +1,5 @@
+"""
+Benchmark and load-test tooling.
+
+    python -m benchmarks.run --sizes 10000,100000 --output bench.json
+"""
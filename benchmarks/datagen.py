@@ -0,0 +1,218 @@
+"""
+Seeded synthetic data for benchmarks.
+
+Everything is derived from a random.Random(seed), so the same seed and size
+always produce the same user history, import files and bridge payloads.
+Dates are laid out backwards from an anchor date (today by default) so the
+date-windowed endpoints (forecast, budget status) see realistic data.
+"""
+from models import db, Account, Income, Expense, Budget, CategoryMapping, Category, EXPENSE_CATEGORIES
+from datetime import date, timedelta
+import random
+
+# (merchant, category, typical amount)
+MERCHANTS = [
+    ('AMAZON MKTPL', 'Shopping', 35), ('WALMART SUPERCENTER', 'Shopping', 60), ('TARGET', 'Shopping', 45),
+    ('COSTCO WHSE', 'Food', 140), ('KROGER', 'Food', 80), ('TRADER JOES', 'Food', 55),
+    ('WHOLE FOODS MKT', 'Food', 70), ('STARBUCKS', 'Food', 7), ('CHIPOTLE', 'Food', 14),
+    ('MCDONALDS', 'Food', 11), ('DOORDASH', 'Food', 32), ('SHELL OIL', 'Transport', 45),
+    ('CHEVRON', 'Transport', 50), ('UBER TRIP', 'Transport', 22), ('LYFT RIDE', 'Transport', 19),
+    ('DELTA AIR', 'Transport', 320), ('NETFLIX.COM', 'Entertainment', 15), ('SPOTIFY USA', 'Entertainment', 11),
+    ('AMC THEATRES', 'Entertainment', 28), ('STEAM GAMES', 'Entertainment', 20), ('COMCAST CABLE', 'Utilities', 90),
+    ('CITY WATER DEPT', 'Utilities', 45), ('PG&E ENERGY', 'Utilities', 120), ('VERIZON WIRELESS', 'Utilities', 85),
+    ('CVS PHARMACY', 'Healthcare', 25), ('WALGREENS', 'Healthcare', 18), ('KAISER COPAY', 'Healthcare', 40),
+    ('RENT PAYMENT', 'Housing', 1800), ('HOME DEPOT', 'Housing', 95), ('IKEA', 'Housing', 150),
+    ('VENMO', 'Other', 40), ('ATM WITHDRAWAL', 'Other', 100),
+]
+INCOME_SOURCES = ['PAYROLL ACME CORP', 'DIRECT DEP EMPLOYER', 'INTEREST PAYMENT', 'VENMO CASHOUT', 'TAX REFUND']
+
+
+def merchant_description(rng, merchant):
+    """A bank-style description: the merchant plus store numbers, ids or card suffixes."""
+    style = rng.random()
+    if style < 0.3:
+        return f"{merchant} #{rng.randint(100, 9999)}"
+    if style < 0.55:
+        return f"{merchant}*{rng.choice('ABCDEFGHJK')}{rng.randint(10, 99)}{rng.choice('XYZQW')}{rng.randint(1, 9)}"
+    if style < 0.7:
+        return f"{merchant} {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d} CARD {rng.randint(1000, 9999)}"
+    return merchant
+
+
+def random_expense(rng):
+    merchant, category, typical = rng.choice(MERCHANTS)
+    amount = round(max(0.5, rng.gauss(typical, typical * 0.35)), 2)
+    return merchant_description(rng, merchant), category, amount
+
+
+def generate_user_data(user_id, n_transactions, seed=42, anchor=None, years=3, n_accounts=4, n_mappings=None):
+    """
+    Insert accounts, categories, budgets, mappings and n_transactions incomes/expenses
+    for user_id using bulk inserts. Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+    span_days = years * 365
+
+    for name in EXPENSE_CATEGORIES:
+        db.session.add(Category(user_id=user_id, name=name))
+
+    account_ids = []
+    for i in range(n_accounts):
+        acc_type = ['checking', 'savings', 'credit', 'cash'][i % 4]
+        account = Account(user_id=user_id, name=f"Bench {acc_type.title()} {i + 1}",
+                          balance=round(rng.uniform(500, 20000), 2), type=acc_type, is_manual=True)
+        db.session.add(account)
+        db.session.flush()
+        account_ids.append(account.id)
+
+    # Budgets for every category over the covered months
+    months = sorted({(anchor - timedelta(days=d)).strftime('%Y-%m') for d in range(0, span_days, 28)})
+    budget_rows = [
+        {'user_id': user_id, 'category': cat, 'amount': round(rng.uniform(100, 900), 2), 'month': m}
+        for m in months for cat in EXPENSE_CATEGORIES
+    ]
+    db.session.execute(Budget.__table__.insert(), budget_rows)
+
+    # ~90% expenses, ~10% incomes
+    n_incomes = max(1, n_transactions // 10)
+    n_expenses = n_transactions - n_incomes
+    descriptions = {}
+    chunk = []
+    for i in range(n_expenses):
+        desc, category, amount = random_expense(rng)
+        descriptions.setdefault(desc.lower(), category)
+        chunk.append({
+            'user_id': user_id,
+            'account_id': rng.choice(account_ids),
+            'amount': amount,
+            'category': category,
+            'description': desc,
+            'date': anchor - timedelta(days=rng.randrange(span_days)),
+            'simplefin_id': f"bench_e_{seed}_{i}",
+        })
+        if len(chunk) >= 10000:
+            db.session.execute(Expense.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(Expense.__table__.insert(), chunk)
+
+    chunk = []
+    for i in range(n_incomes):
+        source = rng.choice(INCOME_SOURCES)
+        amount = round(rng.uniform(1500, 4000), 2) if 'PAY' in source or 'DEP' in source else round(rng.uniform(5, 300), 2)
+        chunk.append({
+            'user_id': user_id,
+            'account_id': rng.choice(account_ids),
+            'amount': amount,
+            'source': source,
+            'category': 'Income',
+            'date': anchor - timedelta(days=rng.randrange(span_days)),
+            'simplefin_id': f"bench_i_{seed}_{i}",
+        })
+        if len(chunk) >= 10000:
+            db.session.execute(Income.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(Income.__table__.insert(), chunk)
+
+    # Learned mappings, one per distinct description as the write paths create them
+    keywords = list(descriptions.items())
+    if n_mappings is not None:
+        keywords = keywords[:n_mappings]
+    mapping_rows = [
+        {'user_id': user_id, 'keyword': kw, 'category': cat, 'count': rng.randint(1, 20)}
+        for kw, cat in keywords
+    ]
+    for start in range(0, len(mapping_rows), 10000):
+        db.session.execute(CategoryMapping.__table__.insert(), mapping_rows[start:start + 10000])
+
+    db.session.commit()
+    return {
+        'accounts': len(account_ids),
+        'budgets': len(budget_rows),
+        'expenses': n_expenses,
+        'incomes': n_incomes,
+        'mappings': len(mapping_rows),
+    }
+
+
+def generate_csv(n_rows, seed, anchor=None):
+    """A bank CSV export as bytes (Date, Description, Amount)."""
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+    lines = ['Date,Description,Amount']
+    for _ in range(n_rows):
+        dt = anchor - timedelta(days=rng.randrange(90))
+        if rng.random() < 0.9:
+            desc, _, amount = random_expense(rng)
+            amount = -amount
+        else:
+            desc, amount = rng.choice(INCOME_SOURCES), round(rng.uniform(50, 3000), 2)
+        lines.append(f"{dt.strftime('%m/%d/%Y')},\"{desc}\",{amount:.2f}")
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def generate_ofx(n_rows, seed, anchor=None):
+    """An SGML OFX bank statement as bytes."""
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+    txns = []
+    for i in range(n_rows):
+        dt = anchor - timedelta(days=rng.randrange(90))
+        if rng.random() < 0.9:
+            desc, _, amount = random_expense(rng)
+            amount, trntype = -amount, 'DEBIT'
+        else:
+            desc, amount, trntype = rng.choice(INCOME_SOURCES), round(rng.uniform(50, 3000), 2), 'CREDIT'
+        desc = desc.replace('&', 'and')
+        txns.append(
+            f"<STMTTRN><TRNTYPE>{trntype}<DTPOSTED>{dt.strftime('%Y%m%d')}<TRNAMT>{amount:.2f}"
+            f"<FITID>bench{seed}x{i}<NAME>{desc}</STMTTRN>"
+        )
+    start = (anchor - timedelta(days=90)).strftime('%Y%m%d')
+    end = anchor.strftime('%Y%m%d')
+    body = (
+        "OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nSECURITY:NONE\nENCODING:USASCII\n"
+        "CHARSET:1252\nCOMPRESSION:NONE\nOLDFILEUID:NONE\nNEWFILEUID:NONE\n\n"
+        "<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>"
+        f"<DTSERVER>{end}<LANGUAGE>ENG</SONRS></SIGNONMSGSRSV1>"
+        "<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS>"
+        "<STMTRS><CURDEF>USD<BANKACCTFROM><BANKID>000000001<ACCTID>123456789<ACCTTYPE>CHECKING</BANKACCTFROM>"
+        f"<BANKTRANLIST><DTSTART>{start}<DTEND>{end}\n" + '\n'.join(txns) + "\n</BANKTRANLIST>"
+        f"<LEDGERBAL><BALAMT>1000.00<DTASOF>{end}</LEDGERBAL>"
+        "</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+    )
+    return body.encode('ascii', 'replace')
+
+
+def generate_bridge_accounts(n_accounts, txns_per_account, seed, batch=0, anchor=None):
+    """A SimpleFin /accounts payload. Each batch number yields new transaction ids."""
+    rng = random.Random(seed * 1000 + batch)
+    anchor = anchor or date.today()
+    accounts = []
+    for a in range(n_accounts):
+        transactions = []
+        for t in range(txns_per_account):
+            dt = anchor - timedelta(days=rng.randrange(30))
+            if rng.random() < 0.9:
+                desc, _, amount = random_expense(rng)
+                amount = -amount
+            else:
+                desc, amount = rng.choice(INCOME_SOURCES), round(rng.uniform(50, 3000), 2)
+            posted = int((dt - date(1970, 1, 1)).total_seconds())
+            transactions.append({
+                'id': f"sfb{seed}_{batch}_{a}_{t}",
+                'posted': posted,
+                'amount': f"{amount:.2f}",
+                'description': desc,
+                'payee': desc,
+            })
+        accounts.append({
+            'id': f"ACT-bench-{a}",
+            'name': ['Everyday Checking', 'High Yield Savings', 'Rewards Credit Card'][a % 3],
+            'currency': 'USD',
+            'balance': f"{rng.uniform(100, 10000):.2f}",
+            'transactions': transactions,
+        })
+    return {'errors': [], 'accounts': accounts}
@@ -0,0 +1,290 @@
+"""
+Load-test harness: N concurrent simulated users against a real gunicorn.
+
+For each worker configuration it seeds a SQLite file with a few users (see
+datagen), starts gunicorn with gunicorn_config.py plus overrides, and lets
+every simulated user replay page-load sequences (dashboard, transactions,
+budget, forecast) mixed with manual entries, CSV imports and SimpleFin syncs
+against a local mock bridge. Reports p50/p95/p99 latency, throughput and
+error / "database is locked" rates per configuration as JSON.
+
+    python -m benchmarks.loadtest --users 20 --duration 30 --configs sync:5,gthread:2x8
+"""
+from benchmarks.datagen import generate_user_data, generate_csv, random_expense
+from benchmarks.mock_bridge import MockBridge
+from datetime import datetime, timezone, date
+import requests
+import subprocess
+import threading
+import argparse
+import tempfile
+import platform
+import random
+import shutil
+import socket
+import json
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (weight, requests). Each request is (method, path) and is issued in order,
+# like the page's JS does on load.
+SCENARIOS = {
+    'dashboard': (30, [('GET', '/api/dashboard')]),
+    'transactions': (20, [('GET', '/api/categories'), ('GET', '/api/incomes'),
+                          ('GET', '/api/expenses'), ('GET', '/api/accounts')]),
+    'budget': (15, [('GET', '/api/categories'), ('GET', '/api/budget/status'),
+                    ('GET', '/api/budget/projection')]),
+    'forecast': (10, [('GET', '/api/forecast')]),
+    'goals': (5, [('GET', '/api/goals')]),
+    'add_expense': (12, [('POST', '/api/expenses')]),
+    'import_csv': (5, [('POST', '/api/transactions/import')]),
+    'sync': (3, [('POST', '/api/simplefin/sync')]),
+}
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 2)
+
+
+def parse_config(spec):
+    """'sync:4' -> sync worker class, 4 workers; 'gthread:2x8' -> 2 workers x 8 threads."""
+    worker_class, _, size = spec.partition(':')
+    workers, _, threads = (size or '1').partition('x')
+    return {'name': spec, 'worker_class': worker_class, 'workers': int(workers), 'threads': int(threads or 1)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed_database(db_path, n_users, n_transactions, seed):
+    """Create the schema and n_users users with seeded history. Returns usernames."""
+    from app import create_app
+    from models import db, User
+    from werkzeug.security import generate_password_hash
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'SECRET_KEY': 'load-test'})
+    usernames = []
+    with app.app_context():
+        password_hash = generate_password_hash('load')
+        for u in range(n_users):
+            user = User(username=f'load{u}', password_hash=password_hash)
+            db.session.add(user)
+            db.session.commit()
+            generate_user_data(user.id, n_transactions, seed=seed + u)
+            usernames.append(user.username)
+    return usernames
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # scenario -> [latency seconds]
+        self.requests = 0
+        self.errors = 0
+        self.lock_errors = 0
+        self.error_examples = []
+
+    def record(self, scenario, elapsed, ok, locked, example=None):
+        with self._lock:
+            self.samples.setdefault(scenario, []).append(elapsed)
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+                if example and len(self.error_examples) < 5:
+                    self.error_examples.append(example)
+            if locked:
+                self.lock_errors += 1
+
+
+def simulated_user(base_url, username, deadline, stats, seed, think_time):
+    rng = random.Random(seed)
+    session = requests.Session()
+    token = session.post(f'{base_url}/auth/login', json={'username': username, 'password': 'load'},
+                         timeout=30).json()['token']
+    session.headers['Authorization'] = f'Bearer {token}'
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[n][0] for n in names]
+    month = date.today().strftime('%Y-%m')
+    iteration = 0
+
+    while time.monotonic() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        for method, path in SCENARIOS[scenario][1]:
+            kwargs = {'timeout': 120}
+            if path == '/api/budget/status':
+                path = f'{path}?month={month}'
+            elif path == '/api/expenses':
+                if method == 'POST':
+                    desc, category, amount = random_expense(rng)
+                    kwargs['json'] = {'amount': amount, 'category': category, 'description': desc,
+                                      'date': date.today().isoformat()}
+            elif path == '/api/transactions/import':
+                content = generate_csv(50, seed=seed * 10000 + iteration)
+                kwargs['files'] = {'file': ('load.csv', content, 'text/csv')}
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, **kwargs)
+                body = response.text if response.status_code >= 400 else ''
+                ok = response.status_code < 400
+                locked = 'locked' in body.lower()
+                example = f'{method} {path} -> {response.status_code} {body[:120]}' if not ok else None
+            except requests.RequestException as e:
+                ok, locked, example = False, False, f'{method} {path} -> {e}'
+            stats.record(scenario, time.perf_counter() - start, ok, locked, example)
+        iteration += 1
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+
+
+def run_config(config, args, db_template, usernames, workdir, bridge):
+    # Every configuration starts from the same seeded database
+    db_path = os.path.join(workdir, f"load_{config['worker_class']}_{config['workers']}x{config['threads']}.db")
+    shutil.copyfile(db_template, db_path)
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{db_path}',
+               SIMPLEFIN_TOKEN=bridge.access_url,
+               SECRET_KEY='load-test-secret-key-not-for-production',
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               PYTHONPATH=ROOT)
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', args.gunicorn_config,
+           '--bind', f'127.0.0.1:{port}',
+           '--workers', str(config['workers']),
+           '--worker-class', config['worker_class'],
+           '--threads', str(config['threads']),
+           '--timeout', '120',
+           '--access-logfile', '/dev/null',
+           'app:create_app()']
+    log = open(os.path.join(workdir, f"gunicorn_{port}.log"), 'w')
+    # Run from the scratch dir so the app's logs/ folder lands there, not in the checkout
+    server = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(300):
+            try:
+                if requests.get(f'{base_url}/health', timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited early, see {log.name}")
+            time.sleep(0.1)
+
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(target=simulated_user,
+                             args=(base_url, usernames[i % len(usernames)], deadline, stats,
+                                   args.seed * 1000 + i, args.think_time),
+                             daemon=True)
+            for i in range(args.users)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+    # 500 pages don't carry the exception text, so count lock failures from the server log
+    with open(log.name) as f:
+        logged_lock_errors = sum(1 for line in f
+                                 if line.startswith('sqlalchemy.exc.OperationalError') and 'database is locked' in line)
+    lock_errors = max(stats.lock_errors, logged_lock_errors)
+
+    all_samples = sorted(s for samples in stats.samples.values() for s in samples)
+    return {
+        'config': config,
+        'users': args.users,
+        'duration_s': round(elapsed, 2),
+        'requests': stats.requests,
+        'throughput_rps': round(stats.requests / elapsed, 2) if elapsed else None,
+        'error_rate': round(stats.errors / stats.requests, 4) if stats.requests else None,
+        'lock_errors': lock_errors,
+        'lock_error_rate': round(lock_errors / stats.requests, 4) if stats.requests else None,
+        'p50_ms': percentile(all_samples, 50),
+        'p95_ms': percentile(all_samples, 95),
+        'p99_ms': percentile(all_samples, 99),
+        'scenarios': {
+            name: {
+                'requests': len(samples),
+                'p50_ms': percentile(sorted(samples), 50),
+                'p95_ms': percentile(sorted(samples), 95),
+                'p99_ms': percentile(sorted(samples), 99),
+            }
+            for name, samples in sorted(stats.samples.items())
+        },
+        'error_examples': stats.error_examples,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the finance tracker under gunicorn.')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+    parser.add_argument('--accounts', type=int, default=4, help='Distinct login users the simulated users share')
+    parser.add_argument('--transactions', type=int, default=5000, help='Seeded transactions per login user')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per configuration')
+    parser.add_argument('--think-time', type=float, default=0.2, help='Max random pause between page loads')
+    parser.add_argument('--configs', default='sync:4,gthread:2x4',
+                        help='Comma-separated worker_class:workers[xthreads] (e.g. sync:5,gthread:2x8)')
+    parser.add_argument('--gunicorn-config', default=os.path.join(ROOT, 'gunicorn_config.py'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='JSON output path (default benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    started = datetime.now(timezone.utc)
+    workdir = tempfile.mkdtemp(prefix='finance-load-')
+    bridge = MockBridge(n_accounts=2, txns_per_account=25, seed=args.seed).start()
+    results = []
+    try:
+        db_template = os.path.join(workdir, 'template.db')
+        usernames = seed_database(db_template, args.accounts, args.transactions, args.seed)
+        for spec in args.configs.split(','):
+            config = parse_config(spec)
+            print(f"[{spec}] {args.users} users for {args.duration:.0f}s...", file=sys.stderr)
+            result = run_config(config, args, db_template, usernames, workdir, bridge)
+            results.append(result)
+            print(f"[{spec}] {result['throughput_rps']} req/s  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+                  f"p99 {result['p99_ms']} ms  errors {result['error_rate']}  locked {result['lock_error_rate']}",
+                  file=sys.stderr)
+    finally:
+        bridge.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'started_at': started.isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'transactions_per_user': args.transactions,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"load-{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
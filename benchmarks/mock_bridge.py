@@ -0,0 +1,66 @@
+"""
+A local stand-in for the SimpleFin bridge, so sync can be benchmarked
+without network access. Serves GET <base>/accounts from datagen.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.datagen import generate_bridge_accounts
+import threading
+import json
+
+
+class MockBridge:
+    """
+    Runs on 127.0.0.1 in a background thread. Each /accounts call returns a
+    fresh batch of transaction ids unless fixed_batch is set, so repeated
+    syncs measure inserts rather than the duplicate-skip path.
+    """
+
+    def __init__(self, n_accounts=3, txns_per_account=200, seed=42, fixed_batch=None):
+        self.n_accounts = n_accounts
+        self.txns_per_account = txns_per_account
+        self.seed = seed
+        self.fixed_batch = fixed_batch
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def next_payload(self):
+        with self._lock:
+            batch = self.fixed_batch if self.fixed_batch is not None else self.calls
+            self.calls += 1
+        return generate_bridge_accounts(self.n_accounts, self.txns_per_account, self.seed, batch=batch)
+
+    @property
+    def access_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/simplefin"
+
+    def start(self):
+        bridge = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith('/simplefin/accounts'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(bridge.next_payload()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,229 @@
+"""
+Benchmark suite for the API hot paths.
+
+Builds a throwaway SQLite database per dataset size, fills it with seeded
+synthetic data (see datagen), then times each case through the Flask test
+client. Results are written as JSON so runs can be diffed over time.
+
+    python -m benchmarks.run --sizes 10000,100000,1000000 --repeats 5
+"""
+from app import create_app
+from utils import auto_categorize
+from benchmarks.datagen import generate_user_data, generate_csv, generate_ofx, MERCHANTS, merchant_description
+from benchmarks.mock_bridge import MockBridge
+from datetime import datetime, timezone
+import argparse
+import io
+import platform
+import statistics
+import subprocess
+import tempfile
+import random
+import logging
+import shutil
+import json
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fresh interpreter: imports + create_app against an existing, current database
+COLD_START_SCRIPT = "from app import create_app; create_app({'SQLALCHEMY_DATABASE_URI': %r})"
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p95_ms': round(ordered[p95_index] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchEnv:
+    """One app + database + authenticated user holding n_transactions of history."""
+
+    def __init__(self, n_transactions, seed, workdir):
+        self.n_transactions = n_transactions
+        self.seed = seed
+        self.db_path = os.path.join(workdir, f'bench_{n_transactions}.db')
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'benchmark-secret-key-not-for-production',
+            'METRICS_DIR': os.path.join(workdir, 'metrics'),
+        })
+        self.app.logger.setLevel(logging.WARNING)
+        self.client = self.app.test_client()
+        self.client.post('/auth/register', json={'username': 'bench', 'password': 'bench'})
+        token = self.client.post('/auth/login', json={'username': 'bench', 'password': 'bench'}).get_json()['token']
+        self.headers = {'Authorization': f'Bearer {token}'}
+        with self.app.app_context():
+            from models import User, Account
+            self.user_id = User.query.filter_by(username='bench').first().id
+            start = time.perf_counter()
+            self.counts = generate_user_data(self.user_id, n_transactions, seed=seed)
+            self.generate_seconds = time.perf_counter() - start
+            self.account_id = Account.query.filter_by(user_id=self.user_id).first().id
+
+    def get(self, url):
+        response = self.client.get(url, headers=self.headers)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+
+    def post(self, url, **kwargs):
+        response = self.client.post(url, headers=self.headers, **kwargs)
+        assert response.status_code == 200, (url, response.status_code, response.get_data(as_text=True)[:200])
+        return response
+
+
+def build_cases(env, args, bridge):
+    """name -> callable(iteration). Each callable performs one timed operation."""
+    month = datetime.now().strftime('%Y-%m')
+    year_ago = f"{datetime.now().year - 1}-{datetime.now().strftime('%m-%d')}"
+
+    def import_csv(i):
+        content = generate_csv(args.import_rows, seed=env.seed * 100 + i)
+        env.post('/api/transactions/import', data={
+            'file': (io.BytesIO(content), 'bench.csv'),
+            'account_id': str(env.account_id),
+        }, content_type='multipart/form-data')
+
+    def import_ofx(i):
+        content = generate_ofx(args.import_rows, seed=env.seed * 100 + i)
+        env.post('/api/transactions/import', data={
+            'file': (io.BytesIO(content), 'bench.ofx'),
+        }, content_type='multipart/form-data')
+
+    rng = random.Random(env.seed)
+    descriptions = [merchant_description(rng, rng.choice(MERCHANTS)[0]) for _ in range(args.categorize_batch)]
+
+    def categorize(i):
+        with env.app.app_context():
+            for desc in descriptions:
+                auto_categorize(desc, env.user_id)
+
+    def cold_start(fast):
+        script = COLD_START_SCRIPT % f'sqlite:///{env.db_path}'
+        environ = dict(os.environ, FAST_START='1' if fast else '0', PYTHONPATH=ROOT)
+        workdir = os.path.dirname(env.db_path)
+        return lambda i: subprocess.run([sys.executable, '-c', script], env=environ, cwd=workdir,
+                                        check=True, capture_output=True)
+
+    return {
+        'summary': lambda i: env.get('/api/summary'),
+        'summary_last_year': lambda i: env.get(f'/api/summary?start_date={year_ago}'),
+        'expenses_by_category': lambda i: env.get('/api/expenses/by-category'),
+        'dashboard': lambda i: env.get('/api/dashboard'),
+        'budget_status': lambda i: env.get(f'/api/budget/status?month={month}'),
+        'forecast': lambda i: env.get('/api/forecast'),
+        'networth_history_day': lambda i: env.get('/api/networth/history?bucket=day'),
+        'export_csv': lambda i: env.get('/api/export/transactions'),
+        'import_csv': import_csv,
+        'import_ofx': import_ofx,
+        'auto_categorize': categorize,
+        'simplefin_sync': lambda i: env.post('/api/simplefin/sync'),
+        'cold_start': cold_start(False),
+        'cold_start_fast': cold_start(True),
+    }
+
+
+def run_size(n_transactions, args, workdir, bridge):
+    env = BenchEnv(n_transactions, args.seed, workdir)
+    print(f"[{n_transactions}] generated {env.counts} in {env.generate_seconds:.1f}s", file=sys.stderr)
+    results = []
+    for name, case in build_cases(env, args, bridge).items():
+        if args.only and name not in args.only:
+            continue
+        case(-1)  # warm-up (also fills SQLite's page cache)
+        samples = []
+        for i in range(args.repeats):
+            start = time.perf_counter()
+            case(i)
+            samples.append(time.perf_counter() - start)
+        result = {'size': n_transactions, 'case': name, **summarize(samples)}
+        if name == 'auto_categorize':
+            result['calls_per_run'] = args.categorize_batch
+        elif name.startswith('import_'):
+            result['rows_per_run'] = args.import_rows
+        elif name == 'simplefin_sync':
+            result['txns_per_run'] = args.sync_accounts * args.sync_txns
+        results.append(result)
+        print(f"[{n_transactions}] {name:22s} median {result['median_ms']:10.2f} ms  p95 {result['p95_ms']:10.2f} ms",
+              file=sys.stderr)
+    return {'size': n_transactions, 'generated': env.counts, 'generate_seconds': round(env.generate_seconds, 2)}, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the finance tracker API hot paths.')
+    parser.add_argument('--sizes', default='10000', help='Comma-separated transaction counts per user')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--import-rows', type=int, default=200, help='Rows per CSV/OFX import run')
+    parser.add_argument('--categorize-batch', type=int, default=200, help='auto_categorize calls per run')
+    parser.add_argument('--sync-accounts', type=int, default=3)
+    parser.add_argument('--sync-txns', type=int, default=50, help='Transactions per account per sync')
+    parser.add_argument('--only', type=lambda s: s.split(','), default=None, help='Comma-separated case names')
+    parser.add_argument('--output', default=None, help='JSON output path (default benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--keep-db', action='store_true', help='Keep the generated databases')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    started = datetime.now(timezone.utc)
+    workdir = tempfile.mkdtemp(prefix='finance-bench-')
+    bridge = MockBridge(n_accounts=args.sync_accounts, txns_per_account=args.sync_txns, seed=args.seed).start()
+    previous_token = os.environ.get('SIMPLEFIN_TOKEN')
+    os.environ['SIMPLEFIN_TOKEN'] = bridge.access_url
+
+    datasets, results = [], []
+    try:
+        for size in sizes:
+            dataset, size_results = run_size(size, args, workdir, bridge)
+            datasets.append(dataset)
+            results.extend(size_results)
+    finally:
+        bridge.stop()
+        if previous_token is None:
+            os.environ.pop('SIMPLEFIN_TOKEN', None)
+        else:
+            os.environ['SIMPLEFIN_TOKEN'] = previous_token
+        if args.keep_db:
+            print(f"Databases kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'started_at': started.isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeats': args.repeats,
+        },
+        'datasets': datasets,
+        'results': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"bench-{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
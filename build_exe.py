@@ -22,6 +22,10 @@ def convert_favicon():
 
 def build_exe():
     ico_path = convert_favicon()
+
+    print("Building static assets...")
+    from assets import build_assets
+    build_assets(os.path.join(os.getcwd(), 'static'))
     
     # Use pyinstaller from the same venv or install location
     if os.name == 'nt':
@@ -46,6 +50,8 @@ def build_exe():
         "--hidden-import=flask_sqlalchemy",
         "--hidden-import=flask_migrate",
         "--hidden-import=flasgger",
+        "--hidden-import=waitress",
+        "--hidden-import=desktop",
         "--hidden-import=cryptography",
         "--hidden-import=sqlalchemy.sql.functions",
         "app.py"
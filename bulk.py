@@ -0,0 +1,193 @@
+"""
+Filter-driven bulk mutations on expenses and incomes.
+
+Each operation is one set-based UPDATE or DELETE over the rows matching a
+filter (dates, description pattern, category, account, ids). Before writing,
+one grouped SELECT sums the matched amounts per (account, date). Those sums
+drive the net account balance updates and checkpoint shifts, one per
+account or (account, date) rather than per row. These Core-level writes skip
+the flush hooks, so the data version is bumped here too. Archived rows are
+read-only, so a filter that matches any of them is refused (ArchivedRowsError)
+instead of silently changing only the recent ones.
+"""
+from models import db, Income, Expense, Account, bump_data_version
+from utils import learn_category_mappings
+from ledger import adjust_balance, shift_checkpoints_many
+from archive import ARCHIVES, archive_cutoff
+import classifier
+from sqlalchemy import func, update, delete
+from datetime import datetime, timedelta
+
+# kind -> (model, text column searched by the description filter, balance sign)
+KINDS = {
+    'expense': (Expense, 'description', -1),
+    'income': (Income, 'source', 1),
+}
+
+ACTIONS = ('recategorize', 'delete', 'move_account', 'redate')
+
+
+class BulkError(ValueError):
+    pass
+
+
+class ArchivedRowsError(BulkError):
+    pass
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise BulkError(f'{field} must be YYYY-MM-DD')
+
+
+def _like_pattern(pattern):
+    """Case-insensitive substring match; '*' matches anything."""
+    escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%' + escaped.replace('*', '%') + '%'
+
+
+def build_conditions(kind, user_id, spec, model=None):
+    """
+    WHERE clauses for a filter spec, on the kind's hot table unless another
+    model (its archive) is given. At least one criterion is required.
+    """
+    default, text_column, _ = KINDS[kind]
+    model = model or default
+    if not isinstance(spec, dict):
+        raise BulkError('filter must be an object')
+    conditions = []
+    if spec.get('start_date'):
+        conditions.append(model.date >= _parse_date(spec['start_date'], 'start_date'))
+    if spec.get('end_date'):
+        conditions.append(model.date <= _parse_date(spec['end_date'], 'end_date'))
+    if spec.get('description'):
+        conditions.append(getattr(model, text_column).ilike(_like_pattern(str(spec['description'])), escape='\\'))
+    if spec.get('category'):
+        if kind != 'expense':
+            raise BulkError('category filter applies to expenses only')
+        conditions.append(model.category == spec['category'])
+    if 'account_id' in spec:
+        # null selects transactions not linked to any account
+        conditions.append(model.account_id.is_(None) if spec['account_id'] is None
+                          else model.account_id == spec['account_id'])
+    if spec.get('ids'):
+        if not isinstance(spec['ids'], list):
+            raise BulkError('ids must be an array')
+        conditions.append(model.id.in_(spec['ids']))
+    if not conditions:
+        raise BulkError('filter needs at least one criterion')
+    return [model.user_id == user_id] + conditions
+
+
+def _owned_account(user_id, account_id):
+    if account_id is None:
+        return None
+    if not db.session.query(Account.id).filter_by(id=account_id, user_id=user_id).first():
+        raise BulkError('Account not found')
+    return account_id
+
+
+def _grouped_sums(model, conditions):
+    """[(account_id, date, total, count)] for matched rows linked to an account."""
+    return db.session.query(model.account_id, model.date, func.sum(model.amount), func.count()).filter(
+        *conditions, model.account_id.isnot(None)
+    ).group_by(model.account_id, model.date).all()
+
+
+def _apply_deltas(balance_deltas, checkpoint_deltas):
+    connection = db.session.connection()
+    for account_id, delta in balance_deltas.items():
+        adjust_balance(connection, account_id, delta)
+    shift_checkpoints_many(connection, checkpoint_deltas)
+
+
+def _execute(statement):
+    # No in-session objects to keep in sync; skip the evaluate/fetch pass
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def _archived_matches(kind, user_id, spec):
+    model = KINDS[kind][0]
+    cutoff = archive_cutoff(model)
+    if cutoff is None or (spec.get('start_date') and _parse_date(spec['start_date'], 'start_date') >= cutoff):
+        return 0
+    archive = ARCHIVES[model]
+    return db.session.query(func.count(archive.id)).filter(*build_conditions(kind, user_id, spec, archive)).scalar()
+
+
+def _add(deltas, key, value):
+    deltas[key] = deltas.get(key, 0) + value
+
+
+def run_bulk(kind, user_id, action, spec, params, dry_run=False):
+    """Apply action to every row matching spec. Returns the number of rows affected."""
+    if action not in ACTIONS:
+        raise BulkError(f"action must be one of: {', '.join(ACTIONS)}")
+    model, text_column, sign = KINDS[kind]
+    conditions = build_conditions(kind, user_id, spec)
+
+    # Validate the action's parameters before touching anything
+    if action == 'recategorize':
+        if kind != 'expense':
+            raise BulkError('recategorize applies to expenses only')
+        category = params.get('category')
+        if not isinstance(category, str) or not category.strip():
+            raise BulkError('category is required')
+    elif action == 'move_account':
+        if 'account_id' not in params:
+            raise BulkError('account_id is required (null to unlink)')
+        target = _owned_account(user_id, params['account_id'])
+    elif action == 'redate':
+        new_date = _parse_date(params['date'], 'date') if params.get('date') else None
+        try:
+            shift = int(params.get('shift_days', 0))
+        except (TypeError, ValueError):
+            raise BulkError('shift_days must be an integer')
+        if (new_date is None) == (not shift):
+            raise BulkError('Give exactly one of date or shift_days')
+
+    archived = _archived_matches(kind, user_id, spec)
+    if archived:
+        raise ArchivedRowsError(f'{archived} matching {kind}s are archived and read-only; '
+                                f'narrow the filter (e.g. a later start_date)')
+
+    if dry_run:
+        return db.session.query(func.count(model.id)).filter(*conditions).scalar()
+
+    balance_deltas, checkpoint_deltas = {}, {}
+    if action == 'recategorize':
+        previous = db.session.query(model.description, model.category).filter(*conditions).distinct().all()
+        affected = _execute(update(model).where(*conditions).values(category=category, category_fallback=False))
+        learn_category_mappings(user_id, list(dict.fromkeys((d, category) for d, _ in previous)))
+        classifier.learn(user_id, [(d, category, old) for d, old in previous])
+
+    elif action == 'delete':
+        for account_id, day, total, _ in _grouped_sums(model, conditions):
+            _add(balance_deltas, account_id, -sign * total)
+            _add(checkpoint_deltas, (account_id, day), -sign * total)
+        affected = _execute(delete(model).where(*conditions))
+
+    elif action == 'move_account':
+        for account_id, day, total, _ in _grouped_sums(model, conditions):
+            _add(balance_deltas, account_id, -sign * total)
+            _add(checkpoint_deltas, (account_id, day), -sign * total)
+        if target is not None:
+            for day, total in db.session.query(model.date, func.sum(model.amount)).filter(*conditions).group_by(model.date):
+                _add(balance_deltas, target, sign * total)
+                _add(checkpoint_deltas, (target, day), sign * total)
+        affected = _execute(update(model).where(*conditions).values(account_id=target))
+
+    else:  # redate: balances are unchanged, only the checkpoints a row counts towards
+        for account_id, day, total, _ in _grouped_sums(model, conditions):
+            moved_to = new_date or day + timedelta(days=shift)
+            _add(checkpoint_deltas, (account_id, day), -sign * total)
+            _add(checkpoint_deltas, (account_id, moved_to), sign * total)
+        value = new_date if new_date else func.date(model.date, f'{shift:+d} days')
+        affected = _execute(update(model).where(*conditions).values(date=value))
+
+    _apply_deltas(balance_deltas, checkpoint_deltas)
+    if affected:
+        bump_data_version(user_id)
+    return affected
@@ -0,0 +1,174 @@
+"""
+Maintenance jobs for learned categorization.
+
+compact_mappings folds CategoryMapping rows learned from raw descriptions
+(one per store number, card suffix or reference id) into one row per
+merchant key (see utils.normalize_merchant). Each merged row keeps the
+category with the highest total count.
+
+recategorize_other re-applies the current mappings to expenses still in
+the import/sync fallback 'Other' (Expense.category_fallback), in id-ordered
+chunks, archived ones included since they are still listed. Any other
+category, 'Other' included, was chosen by the user or a mapping and is never
+touched.
+"""
+from models import db, CategoryMapping, Expense, ExpenseArchive, User, bump_data_version
+from utils import normalize_merchant, FALLBACK_CATEGORY
+from sharding import use_shard
+from sqlalchemy import update, delete
+import click
+
+CHUNK_SIZE = 500
+
+
+class CategoryMatcher:
+    """
+    A user's mappings loaded once, matching with the same rules as
+    auto_categorize (exact merchant key, then the first mapping whose keyword
+    appears in the description). Results are memoized per merchant key.
+    """
+
+    def __init__(self, user_id):
+        rows = db.session.query(CategoryMapping.keyword, CategoryMapping.category).filter(
+            CategoryMapping.user_id == user_id
+        ).order_by(CategoryMapping.id).all()
+        self.exact = {}
+        for keyword, category in rows:
+            self.exact.setdefault(keyword, category)
+        self.ordered = rows
+        self._memo = {}
+
+    def match(self, description):
+        if not description:
+            return FALLBACK_CATEGORY
+        key = normalize_merchant(description)
+        raw = description.lower().strip()
+        memo_key = (key, raw)
+        if memo_key not in self._memo:
+            category = self.exact.get(key)
+            if category is None:
+                category = next((c for k, c in self.ordered if k in key or k in raw), FALLBACK_CATEGORY)
+            self._memo[memo_key] = category
+        return self._memo[memo_key]
+
+
+class CliProgress:
+    """Progress reporter for running a job function synchronously from the CLI."""
+
+    def __init__(self, label):
+        self.label = label
+
+    def update(self, done, total=None, force=False):
+        if force or (total and done == total):
+            click.echo(f'{self.label}: {done}/{total if total is not None else "?"}')
+
+
+def compact_mappings(progress, user_id):
+    rows = db.session.query(CategoryMapping.id, CategoryMapping.keyword, CategoryMapping.category,
+                            CategoryMapping.count).filter(CategoryMapping.user_id == user_id) \
+        .order_by(CategoryMapping.id).all()
+    groups = {}
+    for row in rows:
+        groups.setdefault(normalize_merchant(row.keyword), []).append(row)
+
+    updates, deletes = [], []
+    for key, members in groups.items():
+        if len(members) == 1 and members[0].keyword == key:
+            continue
+        totals, latest = {}, {}
+        for m in members:
+            totals[m.category] = totals.get(m.category, 0) + (m.count or 1)
+            latest[m.category] = m.id
+        # Most used category wins; ties go to the most recently learned
+        category = max(totals, key=lambda c: (totals[c], latest[c]))
+        updates.append({'id': members[0].id, 'keyword': key, 'category': category, 'count': totals[category]})
+        deletes.extend(m.id for m in members[1:])
+
+    total = len(updates)
+    progress.update(0, total, force=True)
+    for start in range(0, total, CHUNK_SIZE):
+        chunk = updates[start:start + CHUNK_SIZE]
+        db.session.execute(update(CategoryMapping), chunk)
+        db.session.commit()
+        progress.update(start + len(chunk), total)
+    for start in range(0, len(deletes), CHUNK_SIZE):
+        db.session.execute(delete(CategoryMapping).where(CategoryMapping.id.in_(deletes[start:start + CHUNK_SIZE]))
+                           .execution_options(synchronize_session=False))
+    if updates:
+        bump_data_version(user_id)
+    db.session.commit()
+    progress.update(total, total, force=True)
+    return {'mappings_before': len(rows), 'mappings_after': len(groups), 'merged': len(deletes)}
+
+
+def recategorize_other(progress, user_id):
+    matcher = CategoryMatcher(user_id)
+    bases = [(model, db.session.query(model.id, model.description).filter(
+        model.user_id == user_id, model.category_fallback.is_(True)
+    )) for model in (Expense, ExpenseArchive)]
+    total = sum(base.count() for _, base in bases)
+    progress.update(0, total, force=True)
+
+    scanned, by_category = 0, {}
+    for model, base in bases:
+        last_id = 0
+        while True:
+            rows = base.filter(model.id > last_id).order_by(model.id).limit(CHUNK_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            ids_by_category = {}
+            for row in rows:
+                category = matcher.match(row.description)
+                if category != FALLBACK_CATEGORY:
+                    ids_by_category.setdefault(category, []).append(row.id)
+            for category, ids in ids_by_category.items():
+                # Re-checking the flag skips rows the user changed since they were read
+                changed = db.session.execute(
+                    update(model).where(model.id.in_(ids), model.category_fallback.is_(True))
+                    .values(category=category, category_fallback=False).execution_options(synchronize_session=False)
+                ).rowcount
+                by_category[category] = by_category.get(category, 0) + changed
+            if ids_by_category:
+                bump_data_version(user_id)
+            db.session.commit()
+            scanned += len(rows)
+            progress.update(scanned, total)
+
+    progress.update(scanned, total, force=True)
+    return {'scanned': scanned, 'recategorized': sum(by_category.values()), 'by_category': by_category}
+
+
+def init_categorization(app):
+    """Register the compact-mappings, recategorize-other and train-classifier CLI commands."""
+
+    @app.cli.command('compact-mappings')
+    @click.option('--user-id', type=int, default=None, help='Only compact this user\'s mappings')
+    def compact_mappings_command(user_id):
+        """Merge category mappings down to one row per merchant key."""
+        user_ids = [user_id] if user_id else [u.id for u in db.session.query(User.id)]
+        for uid in user_ids:
+            use_shard(uid)
+            result = compact_mappings(CliProgress(f'user {uid}'), uid)
+            click.echo(f"user {uid}: {result['mappings_before']} -> {result['mappings_after']} mappings")
+
+    @app.cli.command('recategorize-other')
+    @click.option('--user-id', type=int, default=None, help='Only this user\'s expenses')
+    def recategorize_other_command(user_id):
+        """Re-apply current mappings to expenses still in the fallback 'Other'."""
+        user_ids = [user_id] if user_id else [u.id for u in db.session.query(User.id)]
+        for uid in user_ids:
+            use_shard(uid)
+            result = recategorize_other(CliProgress(f'user {uid}'), uid)
+            click.echo(f"user {uid}: {result['recategorized']} of {result['scanned']} recategorized")
+
+    @app.cli.command('train-classifier')
+    @click.option('--user-id', type=int, default=None, help='Only train this user\'s model')
+    def train_classifier_command(user_id):
+        """Rebuild per-user category classifiers from categorized history."""
+        from classifier import train_from_history
+        user_ids = [user_id] if user_id else [u.id for u in db.session.query(User.id)]
+        for uid in user_ids:
+            use_shard(uid)
+            result = train_from_history(CliProgress(f'user {uid}'), uid)
+            click.echo(f"user {uid}: trained on {result['trained']} expenses")
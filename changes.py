@@ -0,0 +1,171 @@
+"""
+Per-user change feed for incremental sync.
+
+Triggers on every user-visible table keep change_log holding one row per
+changed entity: its latest operation (upsert or delete) under a new,
+strictly increasing seq. Like the full-text index, this covers every write
+path (ORM, bulk updates, imports, sync) without application hooks, and the
+log stays as small as the set of rows ever touched.
+
+GET /api/changes?since=<seq> returns what changed after seq: the current
+state of upserted rows and the ids of deleted ones, plus the seq to ask from
+next time. Clients start with since=0 (everything, the log is backfilled when
+first created). Moving rows to the archive tables is not a delete: archived
+rows are still readable.
+
+`flask prune-changes` drops delete markers older than CHANGE_TOMBSTONE_DAYS.
+A client whose seq is older than a pruned marker (or ahead of the log, as
+after a shard split) is told to reset: refetch everything and continue from
+the returned seq.
+"""
+from models import (db, ChangeLog, ChangeHorizon, Account, MonthlyIncome, Income, Expense, Goal, Budget,
+                    Category, CategoryMapping)
+from archive import ARCHIVES, history
+from sharding import each_shard
+from sqlalchemy import text, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+import click
+
+# table -> model whose to_dict() is sent for upserts
+CHANGE_SOURCES = {
+    'account': Account,
+    'monthly_income': MonthlyIncome,
+    'income': Income,
+    'expense': Expense,
+    'goal': Goal,
+    'budget': Budget,
+    'category': Category,
+    'category_mapping': CategoryMapping,
+}
+
+# hot table -> archive table its rows move to
+_ARCHIVE_TABLES = {model.__tablename__: archive.__tablename__ for model, archive in ARCHIVES.items()}
+
+DEFAULT_TOMBSTONE_DAYS = 90
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+def _record(table, row, op, condition=''):
+    return (
+        f"DELETE FROM change_log WHERE entity = '{table}' AND entity_id = {row}.id{condition}; "
+        f"INSERT INTO change_log (user_id, entity, entity_id, op, changed_at) "
+        f"SELECT {row}.user_id, '{table}', {row}.id, '{op}', CURRENT_TIMESTAMP WHERE 1{condition}; "
+    )
+
+
+def trigger_ddl(table):
+    archive = _ARCHIVE_TABLES.get(table)
+    # A row being archived is copied to the archive table before it is deleted
+    moved = f' AND NOT EXISTS (SELECT 1 FROM {archive} WHERE id = old.id)' if archive else ''
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_ai AFTER INSERT ON {table} BEGIN "
+        f"{_record(table, 'new', 'upsert')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_au AFTER UPDATE ON {table} BEGIN "
+        f"{_record(table, 'new', 'upsert')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_ad AFTER DELETE ON {table} BEGIN "
+        f"{_record(table, 'old', 'delete', moved)}END",
+    ]
+
+
+def init_change_triggers(app, engine=None):
+    """Create the change triggers if missing; log every existing row of a table when its triggers are new."""
+    with app.app_context():
+        engine = engine or db.engine
+        with engine.begin() as conn:
+            for table in CHANGE_SOURCES:
+                existed = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name=:name"),
+                    {'name': f'{table}_changes_ai'}
+                ).first() is not None
+                for statement in trigger_ddl(table):
+                    conn.execute(text(statement))
+                if not existed:
+                    sources = [table] + ([_ARCHIVE_TABLES[table]] if table in _ARCHIVE_TABLES else [])
+                    for source in sources:
+                        conn.execute(text(
+                            f"INSERT OR IGNORE INTO change_log (user_id, entity, entity_id, op) "
+                            f"SELECT user_id, '{table}', id, 'upsert' FROM {source}"
+                        ))
+
+
+def current_seq(user_id):
+    return db.session.query(func.max(ChangeLog.seq)).filter(ChangeLog.user_id == user_id).scalar() or 0
+
+
+def reset_horizon(connection, user_id):
+    """Make clients that synced against another copy of this user's log reset (see sharding.split_user)."""
+    seq = connection.execute(select(func.max(ChangeLog.seq)).where(ChangeLog.user_id == user_id)).scalar() or 0
+    stmt = sqlite_insert(ChangeHorizon.__table__).values(user_id=user_id, pruned_through=seq)
+    connection.execute(stmt.on_conflict_do_update(index_elements=['user_id'], set_={'pruned_through': seq}))
+
+
+def _rows(table, user_id, ids):
+    model = CHANGE_SOURCES[table]
+    source = history(model) if model in ARCHIVES else model
+    return db.session.query(source).filter(source.user_id == user_id, source.id.in_(ids)).all()
+
+
+def changes_since(user_id, since, limit=DEFAULT_LIMIT):
+    """
+    Changes after `since`, oldest first, at most `limit` entities. Returns
+    {'seq', 'has_more', 'reset', 'changes': {table: {'upserted': [...], 'deleted': [...]}}}.
+    """
+    horizon = db.session.query(ChangeHorizon.pruned_through).filter_by(user_id=user_id).scalar() or 0
+    # Pruning may have removed the newest entries; never send a client below the horizon
+    latest = max(current_seq(user_id), horizon)
+    if since < horizon or since > latest:
+        return {'seq': latest, 'has_more': False, 'reset': True, 'changes': {}}
+
+    entries = db.session.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op).filter(
+        ChangeLog.user_id == user_id, ChangeLog.seq > since
+    ).order_by(ChangeLog.seq).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    upserted, changes = {}, {}
+    for seq, entity, entity_id, op in entries:
+        bucket = changes.setdefault(entity, {'upserted': [], 'deleted': []})
+        if op == 'delete':
+            bucket['deleted'].append(entity_id)
+        else:
+            upserted.setdefault(entity, []).append(entity_id)
+    for entity, ids in upserted.items():
+        changes[entity]['upserted'] = [row.to_dict() for row in _rows(entity, user_id, ids)]
+    return {
+        'seq': entries[-1].seq if entries else since,
+        'has_more': has_more,
+        'reset': False,
+        'changes': changes,
+    }
+
+
+def prune_tombstones(days=DEFAULT_TOMBSTONE_DAYS):
+    """Drop delete markers older than `days`, raising each affected user's horizon. Returns the number dropped."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    old = (ChangeLog.op == 'delete', ChangeLog.changed_at < cutoff)
+    for user_id, seq in db.session.query(ChangeLog.user_id, func.max(ChangeLog.seq)).filter(*old) \
+            .group_by(ChangeLog.user_id).all():
+        stmt = sqlite_insert(ChangeHorizon.__table__).values(user_id=user_id, pruned_through=seq)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'pruned_through': func.max(ChangeHorizon.__table__.c.pruned_through, seq)}
+        ))
+    pruned = ChangeLog.query.filter(*old).delete(synchronize_session=False)
+    db.session.commit()
+    return pruned
+
+
+def init_changes(app):
+    """Register the prune-changes CLI command."""
+
+    @app.cli.command('prune-changes')
+    @click.option('--days', type=int, default=None,
+                  help=f'Keep delete markers this many days (default CHANGE_TOMBSTONE_DAYS, {DEFAULT_TOMBSTONE_DAYS})')
+    def prune_changes_command(days):
+        """Drop old delete markers from the change feed."""
+        if days is None:
+            days = app.config.get('CHANGE_TOMBSTONE_DAYS', DEFAULT_TOMBSTONE_DAYS)
+        total = sum(prune_tombstones(days) for _ in each_shard())
+        click.echo(f'{total} delete markers pruned')
@@ -0,0 +1,310 @@
+"""
+Optional per-user statistical categorizer.
+
+A multinomial naive Bayes model over hashed features of the merchant key:
+word unigrams and bigrams plus character 3-grams, folded into N_FEATURES
+buckets so the model never grows with vocabulary. Per user it is a
+(categories x N_FEATURES) count matrix plus per-category document counts,
+stored compressed in CategoryModel. Categorization events are only queued
+as CategoryExample rows (one INSERT per request); fold_pending applies them
+to the stored model in batches: once LEARN_BATCH_SIZE are queued, before an
+import or sync is classified, and on retraining. Predictions include the
+queued events without writing them.
+
+Learned mappings still win. The classifier fills in what auto_categorize
+leaves in 'Other' (batch prediction over whole imports and syncs) and scores
+/api/categories/suggest. It needs NumPy; without it, or with
+CATEGORY_CLASSIFIER off, every entry point is a no-op.
+"""
+from flask import current_app
+from models import db, CategoryModel, CategoryExample, Expense, bump_data_version
+from utils import normalize_merchant, FALLBACK_CATEGORY
+from sqlalchemy import update, insert, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import zlib
+import json
+import io
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+N_FEATURES = 1 << 12
+ALPHA = 1.0  # Laplace smoothing
+MIN_PROBABILITY = 0.6  # Below this a prediction is not applied automatically
+MIN_COVERAGE = 0.5  # Share of a description's features the model must have seen
+MODEL_CACHE_SIZE = 64
+CHUNK_SIZE = 500
+LEARN_BATCH_SIZE = 200  # Queued events that trigger a fold into the stored model
+
+
+def enabled():
+    return np is not None and current_app.config.get('CATEGORY_CLASSIFIER', True)
+
+
+def features(description):
+    """{bucket: count} for one description."""
+    key = normalize_merchant(description)
+    words = key.split()
+    tokens = [f'w:{w}' for w in words]
+    tokens += [f'b:{a} {b}' for a, b in zip(words, words[1:])]
+    padded = f' {key} '
+    tokens += [f'c:{padded[i:i + 3]}' for i in range(len(padded) - 2)]
+    counts = {}
+    for token in tokens:
+        bucket = zlib.crc32(token.encode()) % N_FEATURES
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class NaiveBayes:
+    def __init__(self, labels=None, counts=None, docs=None):
+        self.labels = list(labels or [])
+        self.counts = counts if counts is not None else np.zeros((0, N_FEATURES), dtype=np.float32)
+        self.docs = docs if docs is not None else np.zeros(0, dtype=np.float32)
+        self._log_probs = None
+
+    def _row(self, label):
+        if label not in self.labels:
+            self.labels.append(label)
+            self.counts = np.vstack([self.counts, np.zeros((1, N_FEATURES), dtype=np.float32)])
+            self.docs = np.append(self.docs, np.float32(0))
+        return self.labels.index(label)
+
+    def partial_fit(self, examples):
+        """examples: [(description, category, previous category or None)]."""
+        for description, category, previous in examples:
+            feats = features(description)
+            if not feats:
+                continue
+            idx = np.fromiter(feats.keys(), dtype=np.int64)
+            val = np.fromiter(feats.values(), dtype=np.float32)
+            if previous and previous in self.labels and previous != category:
+                row = self.labels.index(previous)
+                self.counts[row, idx] = np.maximum(self.counts[row, idx] - val, 0)
+                self.docs[row] = max(self.docs[row] - 1, 0)
+            row = self._row(category)
+            self.counts[row, idx] += val
+            self.docs[row] += 1
+        self._log_probs = None
+
+    def predict(self, descriptions):
+        """
+        [(category, probability)] per description; (None, 0.0) when untrained
+        or when too little of the description was ever seen in training.
+        """
+        if not self.labels or self.docs.sum() == 0:
+            return [(None, 0.0)] * len(descriptions)
+        if self._log_probs is None:
+            totals = self.counts.sum(axis=1, keepdims=True)
+            log_probs = np.log(self.counts + ALPHA) - np.log(totals + ALPHA * N_FEATURES)
+            prior = np.where(self.docs > 0, np.log(np.maximum(self.docs, 1e-9) / self.docs.sum()), -np.inf)
+            seen = (self.counts.sum(axis=0) > 0).astype(np.float32)
+            self._log_probs = (log_probs.T.astype(np.float32), prior.astype(np.float32), seen)
+        log_probs, prior, seen = self._log_probs
+
+        results = []
+        for start in range(0, len(descriptions), CHUNK_SIZE):
+            chunk = descriptions[start:start + CHUNK_SIZE]
+            X = np.zeros((len(chunk), N_FEATURES), dtype=np.float32)
+            for i, description in enumerate(chunk):
+                for bucket, count in features(description).items():
+                    X[i, bucket] = count
+            scores = X @ log_probs + prior
+            scores -= scores.max(axis=1, keepdims=True)
+            probs = np.exp(scores)
+            probs /= probs.sum(axis=1, keepdims=True)
+            best = probs.argmax(axis=1)
+            coverage = (X @ seen) / np.maximum(X.sum(axis=1), 1)
+            results.extend((self.labels[b], float(probs[i, b])) if coverage[i] >= MIN_COVERAGE else (None, 0.0)
+                           for i, b in enumerate(best))
+        return results
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, counts=self.counts, docs=self.docs)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, labels, data):
+        arrays = np.load(io.BytesIO(data))
+        return cls(labels, arrays['counts'].astype(np.float32), arrays['docs'].astype(np.float32))
+
+
+# user_id -> (version, model); each worker keeps recently used models decoded
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def _cache(user_id, version, model):
+    with _models_lock:
+        _models[user_id] = (version, model)
+        _models.move_to_end(user_id)
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+
+
+def load_model(user_id):
+    """(version, model) for a user; version 0 means nothing stored yet."""
+    version = db.session.query(CategoryModel.version).filter_by(user_id=user_id).scalar()
+    if version is None:
+        return 0, NaiveBayes()
+    with _models_lock:
+        cached = _models.get(user_id)
+    if cached and cached[0] == version:
+        return cached
+    row = db.session.query(CategoryModel.labels, CategoryModel.weights).filter_by(user_id=user_id).one()
+    model = NaiveBayes.from_bytes(json.loads(row.labels), row.weights)
+    _cache(user_id, version, model)
+    return version, model
+
+
+def _store(user_id, version, model):
+    """Write the model if nobody else has since it was loaded. Returns success."""
+    values = {'labels': json.dumps(model.labels), 'weights': model.to_bytes(),
+              'version': version + 1, 'updated_at': datetime.utcnow()}
+    if version == 0:
+        # Another worker may have created the row meanwhile; treat that as a conflict
+        result = db.session.execute(
+            sqlite_insert(CategoryModel).values(user_id=user_id, **values).on_conflict_do_nothing()
+        )
+    else:
+        result = db.session.execute(
+            update(CategoryModel).where(CategoryModel.user_id == user_id, CategoryModel.version == version)
+            .values(**values).execution_options(synchronize_session=False)
+        )
+    # Not cached here: the caller's transaction may still roll back
+    return bool(result.rowcount)
+
+
+def _pending(user_id):
+    return db.session.query(CategoryExample.id, CategoryExample.description, CategoryExample.category,
+                            CategoryExample.previous).filter(CategoryExample.user_id == user_id) \
+        .order_by(CategoryExample.id).all()
+
+
+def _with_pending(model, rows):
+    model = NaiveBayes(model.labels, model.counts.copy(), model.docs.copy())
+    model.partial_fit([(r.description, r.category, r.previous) for r in rows])
+    return model
+
+
+def learn(user_id, examples):
+    """
+    Record categorization events: [(description, category, previous category or None)].
+    Queued in the caller's transaction; the stored model is only rewritten
+    once LEARN_BATCH_SIZE events are waiting.
+    """
+    if not enabled():
+        return
+    examples = [e for e in examples if e[0] and e[1] and e[1] != e[2]]
+    if not examples:
+        return
+    db.session.execute(insert(CategoryExample), [
+        {'user_id': user_id, 'description': d, 'category': c, 'previous': p} for d, c, p in examples
+    ])
+    queued = db.session.query(func.count(CategoryExample.id)).filter(CategoryExample.user_id == user_id).scalar()
+    if queued >= LEARN_BATCH_SIZE:
+        fold_pending(user_id)
+
+
+def fold_pending(user_id):
+    """
+    Apply every queued event to the stored model with one load, fit and write,
+    in the caller's transaction. On a concurrent write it is retried once
+    against the fresh model, then left queued. Returns the number applied.
+    """
+    if not enabled():
+        return 0
+    for _ in range(2):
+        rows = _pending(user_id)
+        if not rows:
+            return 0
+        version, model = load_model(user_id)
+        if _store(user_id, version, _with_pending(model, rows)):
+            db.session.execute(
+                delete(CategoryExample).where(CategoryExample.user_id == user_id, CategoryExample.id <= rows[-1].id)
+                .execution_options(synchronize_session=False)
+            )
+            return len(rows)
+    return 0
+
+
+def predict(user_id, descriptions):
+    """[(category, probability)] per description, in order."""
+    if not enabled() or not descriptions:
+        return [(None, 0.0)] * len(descriptions)
+    model = load_model(user_id)[1]
+    rows = _pending(user_id)
+    if rows:
+        model = _with_pending(model, rows)  # Not stored: reads never write
+    return model.predict(descriptions)
+
+
+def classify_uncategorized(user_id, after_id):
+    """
+    Batch-predict expenses with id > after_id that mappings left in the
+    fallback 'Other' (a just-finished import or sync) and apply confident predictions with
+    one UPDATE per category. Returns the number recategorized.
+    """
+    if not enabled():
+        return 0
+    db.session.flush()
+    fold_pending(user_id)
+    rows = db.session.query(Expense.id, Expense.description).filter(
+        Expense.user_id == user_id, Expense.id > after_id, Expense.category_fallback.is_(True)
+    ).all()
+    if not rows:
+        return 0
+    ids_by_category = {}
+    for row, (category, probability) in zip(rows, predict(user_id, [r.description for r in rows])):
+        if category and category != FALLBACK_CATEGORY and probability >= MIN_PROBABILITY:
+            ids_by_category.setdefault(category, []).append(row.id)
+    changed = 0
+    for category, ids in ids_by_category.items():
+        changed += db.session.execute(
+            update(Expense).where(Expense.id.in_(ids)).values(category=category, category_fallback=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if changed:
+        bump_data_version(user_id)
+    return changed
+
+
+def train_from_history(progress, user_id):
+    """Rebuild a user's model from every expense outside 'Other'."""
+    if not enabled():
+        return {'trained': 0, 'enabled': False}
+    base = db.session.query(Expense.id, Expense.description, Expense.category).filter(
+        Expense.user_id == user_id, Expense.category != FALLBACK_CATEGORY
+    )
+    total = base.count()
+    progress.update(0, total, force=True)
+    # Events queued so far are already reflected in the expenses read below
+    queued = db.session.query(func.max(CategoryExample.id)).filter(CategoryExample.user_id == user_id).scalar()
+    model = NaiveBayes()
+    trained, last_id = 0, 0
+    while True:
+        rows = base.filter(Expense.id > last_id).order_by(Expense.id).limit(CHUNK_SIZE).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        model.partial_fit([(r.description, r.category, None) for r in rows if r.description])
+        trained += len(rows)
+        progress.update(trained, total)
+
+    version, _ = load_model(user_id)
+    if not _store(user_id, version, model):
+        raise RuntimeError('Model changed during training; try again')
+    if queued is not None:
+        db.session.execute(
+            delete(CategoryExample).where(CategoryExample.user_id == user_id, CategoryExample.id <= queued)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    progress.update(trained, total, force=True)
+    return {'trained': trained, 'categories': len(model.labels)}
@@ -0,0 +1,196 @@
+"""
+Cross-source duplicate detection.
+
+The same bank transaction can arrive via SimpleFin (bank id), OFX (ofx_<id>),
+CSV (content hash) or manual entry, each with its own id scheme. Rows are
+indexed in memory by (amount in cents, date bucket) with buckets one window
+wide, so each row only compares against the same amount in its own and the
+two neighbouring buckets: near-linear in the number of rows.
+
+Only rows from different sources on compatible accounts (equal, or either
+unset) are paired, and each row joins at most one pair, closest dates first.
+"""
+from models import db, Income, Expense, Account, DuplicateCandidate, to_money
+from ledger import post_to_account
+from sharding import use_shard
+from datetime import date, datetime
+import click
+import re
+
+DEFAULT_WINDOW_DAYS = 3
+
+# Lower wins when choosing which row of a pair to keep
+SOURCE_PRIORITY = {'simplefin': 0, 'ofx': 1, 'csv': 2, 'manual': 3}
+
+MODELS = {'expense': Expense, 'income': Income}
+
+_CSV_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def source_of(external_id):
+    if not external_id:
+        return 'manual'
+    if external_id.startswith('ofx_'):
+        return 'ofx'
+    if _CSV_ID.fullmatch(external_id):
+        return 'csv'
+    return 'simplefin'
+
+
+def _ordinal(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value.toordinal()
+
+
+def find_pairs(rows, window_days=DEFAULT_WINDOW_DAYS, probe_ids=None):
+    """
+    rows: iterable of (id, account_id, amount, date, external_id).
+    probe_ids: if given, only look for matches of these rows (ingest mode).
+    Returns [(primary_id, duplicate_id, day_gap)], one pair per row at most.
+    """
+    width = window_days + 1
+    entries = []
+    index = {}
+    for row_id, account_id, amount, day, external_id in rows:
+        entry = (row_id, account_id, int(to_money(amount).scaleb(2)), _ordinal(day), source_of(external_id))
+        entries.append(entry)
+        index.setdefault((entry[2], entry[3] // width), []).append(entry)
+
+    candidates = set()
+    for entry in entries:
+        row_id, account_id, cents, day, source = entry
+        if probe_ids is not None and row_id not in probe_ids:
+            continue
+        bucket = day // width
+        for b in (bucket - 1, bucket, bucket + 1):
+            for other in index.get((cents, b), ()):
+                if other[0] == row_id or other[4] == source:
+                    continue
+                gap = abs(other[3] - day)
+                if gap > window_days:
+                    continue
+                if account_id and other[1] and account_id != other[1]:
+                    continue
+                keep, drop = sorted((entry, other), key=lambda e: (SOURCE_PRIORITY[e[4]], e[0]))
+                candidates.add((gap, keep[0], drop[0]))
+
+    pairs = []
+    used = set()
+    for gap, keep_id, drop_id in sorted(candidates):
+        if keep_id in used or drop_id in used:
+            continue
+        used.update((keep_id, drop_id))
+        pairs.append((keep_id, drop_id, gap))
+    return pairs
+
+
+def detect_duplicates(user_id, kind, new_after_id=None, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Record pending DuplicateCandidate rows for one user and kind. With
+    new_after_id, only rows with a larger id (just ingested) are probed and
+    only the date range around them is loaded. Returns the number recorded.
+    """
+    model = MODELS[kind]
+    columns = (model.id, model.account_id, model.amount, model.date, model.simplefin_id)
+    probe_ids = None
+    query = db.session.query(*columns).filter(model.user_id == user_id)
+
+    if new_after_id is not None:
+        new_rows = query.filter(model.id > new_after_id).all()
+        if not new_rows:
+            return 0
+        probe_ids = {r.id for r in new_rows}
+        lo = min(_ordinal(r.date) for r in new_rows) - window_days
+        hi = max(_ordinal(r.date) for r in new_rows) + window_days
+        query = query.filter(model.date >= date.fromordinal(lo), model.date <= date.fromordinal(hi))
+
+    pairs = find_pairs(query.all(), window_days, probe_ids)
+    if not pairs:
+        return 0
+
+    known = {
+        (p, d) for p, d in db.session.query(DuplicateCandidate.primary_id, DuplicateCandidate.duplicate_id).filter(
+            DuplicateCandidate.user_id == user_id, DuplicateCandidate.kind == kind
+        )
+    }
+    rows = [
+        {'user_id': user_id, 'kind': kind, 'primary_id': keep_id, 'duplicate_id': drop_id,
+         'day_gap': gap, 'status': 'pending', 'created_at': datetime.utcnow()}
+        for keep_id, drop_id, gap in pairs if (keep_id, drop_id) not in known
+    ]
+    if rows:
+        db.session.execute(DuplicateCandidate.__table__.insert(), rows)
+    return len(rows)
+
+
+def max_ids():
+    """Current max expense/income ids, taken before an ingest to scope detection to new rows."""
+    return {kind: db.session.query(db.func.max(model.id)).scalar() or 0 for kind, model in MODELS.items()}
+
+
+def detect_after_ingest(user_id, before_ids, window_days=DEFAULT_WINDOW_DAYS):
+    db.session.flush()
+    return sum(detect_duplicates(user_id, kind, before_ids[kind], window_days) for kind in MODELS)
+
+
+def is_merged_duplicate(user_id, external_id):
+    """True if the user merged away a row with this external id, so it must not be re-imported."""
+    if not external_id:
+        return False
+    return db.session.query(DuplicateCandidate.id).filter_by(
+        user_id=user_id, duplicate_external_id=external_id, status='merged'
+    ).first() is not None
+
+
+def merge_candidate(candidate):
+    """
+    Delete the duplicate row, keeping the primary. A category the user set on the
+    duplicate carries over if the primary is uncategorized, and a manual account's
+    stored balance is corrected for the removed row.
+    """
+    model = MODELS[candidate.kind]
+    primary = model.query.get(candidate.primary_id)
+    duplicate = model.query.get(candidate.duplicate_id)
+    if duplicate is not None:
+        if primary is not None and candidate.kind == 'expense' and primary.category == 'Other' \
+                and duplicate.category != 'Other':
+            primary.category = duplicate.category
+            primary.category_fallback = False
+        if duplicate.account_id:
+            account = Account.query.get(duplicate.account_id)
+            if account and account.is_manual:
+                sign = -1 if candidate.kind == 'income' else 1
+                post_to_account(db.session.connection(), account.id, duplicate.date, sign * duplicate.amount)
+        candidate.duplicate_external_id = duplicate.simplefin_id
+        db.session.delete(duplicate)
+    candidate.status = 'merged'
+    # Other pending pairs that referenced the removed row are moot
+    DuplicateCandidate.query.filter(
+        DuplicateCandidate.kind == candidate.kind,
+        DuplicateCandidate.status == 'pending',
+        DuplicateCandidate.id != candidate.id,
+        db.or_(DuplicateCandidate.primary_id == candidate.duplicate_id,
+               DuplicateCandidate.duplicate_id == candidate.duplicate_id)
+    ).update({DuplicateCandidate.status: 'ignored'}, synchronize_session=False)
+
+
+def init_dedupe(app):
+    """Register the scan-duplicates CLI command."""
+
+    @app.cli.command('scan-duplicates')
+    @click.option('--user-id', type=int, default=None, help='Only scan this user')
+    @click.option('--window', type=int, default=DEFAULT_WINDOW_DAYS, help='Max days between matching rows')
+    def scan_duplicates_command(user_id, window):
+        """Find cross-source duplicate transactions in existing data."""
+        from models import User
+        user_ids = [user_id] if user_id else [u.id for u in db.session.query(User.id)]
+        total = 0
+        for uid in user_ids:
+            use_shard(uid)
+            found = sum(detect_duplicates(uid, kind, window_days=window) for kind in MODELS)
+            total += found
+            if found:
+                click.echo(f"user {uid}: {found} new duplicate candidates")
+            db.session.commit()
+        click.echo(f"{total} new duplicate candidates")
@@ -11,7 +11,19 @@ workers = multiprocessing.cpu_count() * 2 + 1
 forwarded_allow_ips = '*'
 secure_scheme_headers = {'X-FORWARDED-PROTO': 'https'}
 
+# Fast start: build the app once in the master (schema check, warm-up) and
+# fork workers from it, and defer Swagger until /apidocs is first opened.
+preload_app = True
+raw_env = ['FAST_START=1']
+
 # Log settings
 accesslog = '-'
 errorlog = '-'
 loglevel = 'info'
+
+# Metrics: every worker writes its samples to a shared directory that
+# /metrics merges. Clear snapshots from the previous run before forking.
+# (gunicorn runs from the project root, so the app modules are importable.)
+def on_starting(server):
+    from metrics import reset_metrics_dir
+    reset_metrics_dir()
@@ -0,0 +1,64 @@
+"""
+Desktop (frozen build) server.
+
+Runs the app on waitress, a multi-threaded production WSGI server, and
+opens the browser once /health answers instead of after a fixed delay. If
+another copy is already serving on the port, the browser is pointed at it.
+"""
+from waitress import create_server
+import urllib.request
+import webbrowser
+import threading
+import time
+
+DEFAULT_PORT = 5000
+DEFAULT_THREADS = 8
+READY_TIMEOUT = 30.0
+
+# Static files are revalidated by ETag after this; the exe is replaced as a whole on upgrade
+STATIC_MAX_AGE = 3600
+
+
+def is_healthy(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(f'{url}/health', timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_healthy(url, timeout=interval * 10):
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _open_when_ready(app, url, started):
+    if wait_until_ready(url):
+        app.logger.info(f'Server ready in {(time.perf_counter() - started) * 1000:.0f} ms, opening {url}')
+        webbrowser.open(url)
+    else:
+        app.logger.error(f'Server did not become ready within {READY_TIMEOUT:.0f}s; not opening the browser')
+
+
+def run_desktop(app, host='127.0.0.1', port=DEFAULT_PORT, threads=DEFAULT_THREADS, open_browser=True):
+    """Serve app until interrupted."""
+    started = time.perf_counter()
+    url = f'http://{host}:{port}'
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    try:
+        server = create_server(app, host=host, port=port, threads=threads, ident='FinanceTracker')
+    except OSError:
+        if is_healthy(url):
+            app.logger.info(f'Already running at {url}')
+            if open_browser:
+                webbrowser.open(url)
+            return
+        raise
+
+    if open_browser:
+        threading.Thread(target=_open_when_ready, args=(app, url, started), daemon=True).start()
+    server.run()
@@ -0,0 +1,165 @@
+"""
+SQLite FTS5 full-text index over Expense.description and Income.source.
+
+The two virtual tables are external-content tables over `expense` and
+`income`, kept in sync by triggers, so every write path (ORM, bulk inserts,
+imports, sync) is covered without application hooks. The archive tables
+(see archive.py) have their own indexes, searched when the date range
+reaches archived history. When the SQLite build lacks FTS5, search falls
+back to a LIKE scan.
+"""
+from models import db, MoneyFloat
+from archive import ARCHIVES, archive_cutoff
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import OperationalError
+import re
+
+# table -> indexed column
+FTS_SOURCES = {
+    'expense': 'description',
+    'income': 'source',
+    'expense_archive': 'description',
+    'income_archive': 'source',
+}
+
+# archive table -> hot model
+_ARCHIVED = {archive.__tablename__: model for model, archive in ARCHIVES.items()}
+
+_fts_available = {}
+
+
+def _ddl(table, column):
+    fts = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    ]
+
+
+def init_fulltext(app, engine=None):
+    """Create the FTS tables and triggers if missing; index existing rows on first creation."""
+    with app.app_context():
+        engine = engine or db.engine
+        try:
+            with engine.begin() as conn:
+                for table, column in FTS_SOURCES.items():
+                    existed = conn.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                        {'name': f'{table}_fts'}
+                    ).first() is not None
+                    for statement in _ddl(table, column):
+                        conn.execute(text(statement))
+                    if not existed:
+                        conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+            _fts_available[engine.url.render_as_string()] = True
+        except OperationalError as e:
+            app.logger.warning(f'Full-text search unavailable (SQLite built without FTS5?): {e}')
+            _fts_available[engine.url.render_as_string()] = False
+
+
+def fts_available():
+    engine = db.session.get_bind()  # The user's shard when sharded
+    key = engine.url.render_as_string()
+    if key not in _fts_available:
+        # Schema setup was skipped this process (already current); probe once
+        if engine.dialect.name != 'sqlite':
+            return False
+        with engine.connect() as conn:
+            _fts_available[key] = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='expense_fts'")
+            ).first() is not None
+    return _fts_available[key]
+
+
+def build_match_query(query):
+    """Turn free text into a safe FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+def search_transactions(user_id, query, kind='all', start_date=None, end_date=None,
+                        min_amount=None, max_amount=None, category=None, limit=50, offset=0):
+    """
+    Ranked search over one user's expenses and incomes. Returns up to `limit`
+    dicts ordered by relevance (bm25), then most recent first.
+    """
+    use_fts = fts_available()
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+    if use_fts:
+        params['match'] = build_match_query(query)
+        if not params['match']:
+            return []  # No word characters: nothing FTS can match
+    else:
+        # The raw text, so punctuation-only queries still match; %, _ and \ literally, as typed
+        needle = query.strip().lower()
+        if not needle:
+            return []
+        escaped = needle.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params['like'] = f"%{escaped}%"
+
+    selects = []
+    for table, column in FTS_SOURCES.items():
+        model = _ARCHIVED.get(table)
+        row_type = model.__tablename__ if model is not None else table
+        if kind != 'all' and kind != row_type:
+            continue
+        if model is not None:
+            cutoff = archive_cutoff(model)
+            if cutoff is None or (start_date and start_date >= cutoff):
+                continue  # Nothing archived in range
+        filters = ['t.user_id = :user_id']
+        if start_date:
+            filters.append('t.date >= :start_date')
+            params['start_date'] = start_date.isoformat()
+        if end_date:
+            filters.append('t.date <= :end_date')
+            params['end_date'] = end_date.isoformat()
+        if min_amount is not None:
+            filters.append('t.amount >= :min_amount')
+            params['min_amount'] = min_amount
+        if max_amount is not None:
+            filters.append('t.amount <= :max_amount')
+            params['max_amount'] = max_amount
+        if category:
+            filters.append('t.category = :category')
+            params['category'] = category
+
+        if use_fts:
+            selects.append(
+                f"SELECT '{row_type}' AS type, t.id, t.account_id, t.amount, t.category, "
+                f"t.{column} AS description, t.date, bm25({table}_fts) AS rank "
+                f"FROM {table}_fts JOIN {table} t ON t.id = {table}_fts.rowid "
+                f"WHERE {table}_fts MATCH :match AND {' AND '.join(filters)}"
+            )
+        else:
+            selects.append(
+                f"SELECT '{row_type}' AS type, t.id, t.account_id, t.amount, t.category, "
+                f"t.{column} AS description, t.date, 0 AS rank "
+                f"FROM {table} t WHERE lower(t.{column}) LIKE :like ESCAPE '\\' AND {' AND '.join(filters)}"
+            )
+    if not selects:
+        return []
+
+    sql = ' UNION ALL '.join(selects) + ' ORDER BY rank, date DESC, id DESC LIMIT :limit OFFSET :offset'
+    # Amounts are stored in cents; let the Money type convert bounds and results
+    statement = text(sql).bindparams(
+        *[bindparam(name, type_=MoneyFloat()) for name in ('min_amount', 'max_amount') if name in params]
+    ).columns(amount=MoneyFloat())
+    rows = db.session.execute(statement, params).mappings().all()
+    return [{
+        'type': r['type'],
+        'id': r['id'],
+        'account_id': r['account_id'],
+        'amount': r['amount'],
+        'category': r['category'],
+        'description': r['description'],
+        'date': r['date'],
+        'score': round(-float(r['rank']), 4),
+    } for r in rows]
@@ -0,0 +1,170 @@
+"""
+Background jobs.
+
+A job runs in a daemon thread of the process that started it, with its own
+app context and session. Status and progress live in the Job table, so any
+gunicorn worker can answer GET /api/jobs/<id>. A user has at most one active
+job of each kind; starting another returns the active one. A job whose
+progress hasn't moved in STALE_AFTER is assumed lost with its process.
+Progress is written on a connection of its own and never commits the job's
+work; a job commits its own transactions, and reports progress between them.
+
+GET /api/jobs/<id>/events streams a job's progress as Server-Sent Events
+(see job_events): the stream polls the Job row, so it works from any worker,
+and ends after STREAM_MAX_SECONDS so a sync worker is never held past its
+timeout; clients reconnect until they receive `done` or `failed`.
+"""
+from flask import current_app
+from models import db, Job
+from sharding import use_shard
+from datetime import datetime, timedelta
+import threading
+import json
+import time
+
+STALE_AFTER = timedelta(minutes=10)
+
+# Progress writes are throttled to one per interval
+PROGRESS_INTERVAL = timedelta(seconds=0.5)
+
+STREAM_POLL_SECONDS = 0.25
+STREAM_HEARTBEAT_SECONDS = 10
+STREAM_MAX_SECONDS = 25  # Below gunicorn's default 30 s worker timeout
+STREAM_RETRY_MS = 500
+
+
+class JobProgress:
+    """Handed to the job function to report progress."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = None
+
+    def update(self, done, total=None, force=False):
+        now = datetime.utcnow()
+        if not force and self._last_write and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        values = {'done': done, 'updated_at': now}
+        if total is not None:
+            values['total'] = total
+        self._write(values)
+
+    def stage(self, name, detail=None, done=0, total=None):
+        """Enter a new stage (always written); detail is any JSON-serializable value."""
+        values = {'stage': name, 'detail': json.dumps(detail) if detail is not None else None,
+                  'done': done, 'total': total, 'updated_at': datetime.utcnow()}
+        self._last_write = values['updated_at']
+        self._write(values)
+
+    def _write(self, values):
+        # On a connection of its own: committing db.session would also commit
+        # the job's unfinished work. Call between the job's own transactions,
+        # as SQLite would make this wait on the job's write lock.
+        table = Job.__table__
+        with db.session.get_bind(mapper=Job).begin() as connection:
+            connection.execute(table.update().where(table.c.id == self.job_id).values(**values))
+
+
+class NullProgress:
+    """Progress reporter for running a job function inline, within a request."""
+
+    def update(self, done, total=None, force=False):
+        pass
+
+    def stage(self, name, detail=None, done=0, total=None):
+        pass
+
+
+def active_job(user_id, kind):
+    job = Job.query.filter(Job.user_id == user_id, Job.kind == kind,
+                           Job.status.in_(('queued', 'running'))).order_by(Job.id.desc()).first()
+    if job and job.updated_at and datetime.utcnow() - job.updated_at > STALE_AFTER:
+        job.status = 'failed'
+        job.error = 'Lost (no progress)'
+        db.session.commit()
+        return None
+    return job
+
+
+def _run(app, user_id, job_id, target, args):
+    with app.app_context():
+        if user_id is not None:
+            use_shard(user_id)
+        progress = JobProgress(job_id)
+        try:
+            Job.query.filter_by(id=job_id).update({'status': 'running', 'updated_at': datetime.utcnow()})
+            db.session.commit()
+            result = target(progress, *args)
+            Job.query.filter_by(id=job_id).update({
+                'status': 'done', 'result': json.dumps(result), 'updated_at': datetime.utcnow()
+            })
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception(f'Job {job_id} failed')
+            Job.query.filter_by(id=job_id).update({
+                'status': 'failed', 'error': str(e)[:500], 'updated_at': datetime.utcnow()
+            })
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def _event(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def job_events(job_id, user_id):
+    """
+    Server-Sent Events for one job: `progress` whenever its status, stage or
+    counts change, then `done` or `failed` with the full job. Yields nothing
+    more once the job is finished or after STREAM_MAX_SECONDS.
+    """
+    started = last_sent = time.monotonic()
+    last = None
+    yield f'retry: {STREAM_RETRY_MS}\n\n'
+    while True:
+        job = Job.query.filter_by(id=job_id, user_id=user_id).first()
+        if job is None:
+            yield _event('failed', {'id': job_id, 'error': 'Job not found'})
+            return
+        state = job.to_dict()
+        db.session.rollback()  # End the read so the next poll sees new commits
+        if state['status'] in ('queued', 'running') and state['updated_at'] and \
+                datetime.utcnow() - datetime.fromisoformat(state['updated_at']) > STALE_AFTER:
+            state.update(status='failed', error='Lost (no progress)')
+        if state['status'] in ('done', 'failed'):
+            yield _event(state['status'], state, state['updated_at'])
+            return
+        snapshot = (state['status'], state['stage'], state['done'], state['total'], state['detail'])
+        now = time.monotonic()
+        if snapshot != last:
+            last, last_sent = snapshot, now
+            yield _event('progress', state, state['updated_at'])
+        elif now - last_sent >= STREAM_HEARTBEAT_SECONDS:
+            last_sent = now
+            yield ': keep-alive\n\n'
+        if now - started >= STREAM_MAX_SECONDS:
+            return
+        time.sleep(STREAM_POLL_SECONDS)
+
+
+def start_job(user_id, kind, target, *args):
+    """
+    Run target(progress, *args) in the background and return its Job row. The
+    return value of target (JSON-serializable) becomes the job result.
+    """
+    existing = active_job(user_id, kind)
+    if existing:
+        return existing
+    job = Job(user_id=user_id, kind=kind, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    threading.Thread(target=_run, args=(app, user_id, job.id, target, args), daemon=True, name=f'job-{job.id}').start()
+    return job
@@ -0,0 +1,272 @@
+"""
+Ledger-derived account balances.
+
+The balance of an account at the end of any date is the nearest
+BalanceCheckpoint plus the signed sum of the incomes (+) and expenses (-)
+posted between the checkpoint and that date, so an as-of query only sums
+at most one month of transactions.
+
+Checkpoints are built backwards from the stored Account.balance and rolled
+forward as months close by `flask update-checkpoints` (and reconcile-balances);
+as-of reads never write, and only fall back to longer sums when that has not
+run. Checkpoints move only together with the stored balance: whoever adjusts
+an account's balance for a transaction (post_to_account, the batch and bulk
+endpoints, sync) also shifts the checkpoints on or after its date, so rows
+on other users' or synced accounts whose balance is left alone never cause
+drift. `flask reconcile-balances` reports (and optionally fixes) drift
+between the stored balance and the ledger.
+
+Amounts are whole cents (Decimal in Python), so sums and drift are exact.
+Stored balances only change through adjust_balance's atomic in-database
+UPDATE, never a read-modify-write in Python.
+"""
+from models import db, Account, Income, Expense, BalanceCheckpoint, to_money
+from archive import history
+from sharding import each_shard
+from sqlalchemy import func, select, bindparam
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import click
+
+ZERO = Decimal('0.00')
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _month_end(d):
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _last_closed_month_end(today=None):
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def net_between(account_id, after=None, through=None):
+    """Signed ledger movement for dates in (after, through]; None means unbounded."""
+    totals = []
+    since = after + timedelta(days=1) if after is not None else None
+    for model in (history(Income, since), history(Expense, since)):
+        query = db.session.query(func.sum(model.amount)).filter(model.account_id == account_id)
+        if after is not None:
+            query = query.filter(model.date > after)
+        if through is not None:
+            query = query.filter(model.date <= through)
+        totals.append(query.scalar() or ZERO)
+    return totals[0] - totals[1]
+
+
+def _monthly_nets(account_id):
+    nets = {}
+    for model, sign in ((history(Income), 1), (history(Expense), -1)):
+        rows = db.session.query(func.strftime('%Y-%m', model.date), func.sum(model.amount)).filter(
+            model.account_id == account_id
+        ).group_by(func.strftime('%Y-%m', model.date)).all()
+        for month, total in rows:
+            if month:
+                nets[month] = nets.get(month, ZERO) + sign * (total or ZERO)
+    return nets
+
+
+def rebuild_checkpoints(account, today=None):
+    """
+    Replace an account's checkpoints with month-end balances derived backwards
+    from its stored balance. Returns the number of checkpoints written.
+    """
+    last_closed = _last_closed_month_end(today)
+    nets = _monthly_nets(account.id)
+    closed_key = last_closed.strftime('%Y-%m')
+
+    # Everything posted after the last closed month is already in the stored balance
+    balance = (account.balance or ZERO) - sum((v for m, v in nets.items() if m > closed_key), ZERO)
+    first_key = min([m for m in nets if m <= closed_key] or [closed_key])
+
+    rows = []
+    month_end = last_closed
+    while month_end.strftime('%Y-%m') >= first_key:
+        rows.append({'account_id': account.id, 'user_id': account.user_id,
+                     'date': month_end, 'balance': balance})
+        balance -= nets.get(month_end.strftime('%Y-%m'), ZERO)
+        month_end = month_end.replace(day=1) - timedelta(days=1)
+
+    BalanceCheckpoint.query.filter_by(account_id=account.id).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(BalanceCheckpoint.__table__.insert(), rows)
+    return len(rows)
+
+
+def ensure_checkpoints(account, today=None):
+    """Build checkpoints if missing and roll them forward to the last closed month."""
+    latest = BalanceCheckpoint.query.filter_by(account_id=account.id).order_by(
+        BalanceCheckpoint.date.desc()
+    ).first()
+    if latest is None:
+        rebuild_checkpoints(account, today)
+        return
+
+    last_closed = _last_closed_month_end(today)
+    prev_date, balance = latest.date, latest.balance
+    rows = []
+    while prev_date < last_closed:
+        month_end = _month_end(prev_date + timedelta(days=1))
+        balance += net_between(account.id, prev_date, month_end)
+        rows.append({'account_id': account.id, 'user_id': account.user_id,
+                     'date': month_end, 'balance': balance})
+        prev_date = month_end
+    if rows:
+        db.session.execute(BalanceCheckpoint.__table__.insert(), rows)
+
+
+def balance_as_of(account, as_of):
+    """
+    Balance at the end of `as_of`: nearest checkpoint plus the delta sum since it.
+    Read-only; the sum is bounded by a month once update-checkpoints has run.
+    """
+    before = BalanceCheckpoint.query.filter(
+        BalanceCheckpoint.account_id == account.id,
+        BalanceCheckpoint.date <= as_of
+    ).order_by(BalanceCheckpoint.date.desc()).first()
+    if before:
+        return before.balance + net_between(account.id, before.date, as_of)
+
+    after = BalanceCheckpoint.query.filter(
+        BalanceCheckpoint.account_id == account.id,
+        BalanceCheckpoint.date > as_of
+    ).order_by(BalanceCheckpoint.date.asc()).first()
+    if after:
+        return after.balance - net_between(account.id, as_of, after.date)
+    return (account.balance or ZERO) - net_between(account.id, as_of, None)
+
+
+def ledger_balance(account, today=None):
+    """Current balance implied by the checkpoints and every transaction after them."""
+    ensure_checkpoints(account, today)
+    latest = BalanceCheckpoint.query.filter_by(account_id=account.id).order_by(
+        BalanceCheckpoint.date.desc()
+    ).first()
+    return latest.balance + net_between(account.id, latest.date, None)
+
+
+def reconcile(user_id=None, fix=None):
+    """
+    Compare stored and ledger balances for every account (of one user, if given).
+    fix='ledger' overwrites the stored balance with the ledger's; fix='stored'
+    rebuilds checkpoints from the stored balance. Returns one report per account.
+    """
+    query = Account.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    reports = []
+    for account in query.order_by(Account.id).all():
+        stored = account.balance or ZERO
+        ledger = ledger_balance(account)
+        drift = stored - ledger
+        drifted = drift != 0
+        if drifted and fix == 'ledger':
+            account.balance = ledger
+        elif drifted and fix == 'stored':
+            rebuild_checkpoints(account)
+        reports.append({
+            'account_id': account.id,
+            'user_id': account.user_id,
+            'name': account.name,
+            'stored': stored,
+            'ledger': ledger,
+            'drift': drift,
+            'drifted': drifted,
+        })
+    db.session.commit()
+    return reports
+
+
+def adjust_balance(connection, account_id, delta):
+    """Add delta to an account's stored balance in one UPDATE, safe against concurrent writers."""
+    if not account_id or not delta:
+        return
+    connection.execute(
+        Account.__table__.update().where(Account.__table__.c.id == account_id)
+        .values(balance=Account.__table__.c.balance + to_money(delta))
+    )
+
+
+def shift_checkpoints(connection, account_id, from_date, delta):
+    """Apply a ledger change on from_date to every checkpoint on or after it."""
+    if not account_id or not delta:
+        return
+    connection.execute(
+        BalanceCheckpoint.__table__.update().where(
+            BalanceCheckpoint.__table__.c.account_id == account_id,
+            BalanceCheckpoint.__table__.c.date >= _as_date(from_date)
+        ).values(balance=BalanceCheckpoint.__table__.c.balance + delta)
+    )
+
+
+def post_to_account(connection, account_id, day, delta):
+    """Move an account's stored balance by delta and its checkpoints on or after day with it."""
+    adjust_balance(connection, account_id, delta)
+    shift_checkpoints(connection, account_id, day, delta)
+
+
+def shift_checkpoints_many(connection, deltas):
+    """
+    Apply many ledger changes, {(account_id, date): delta}, with one SELECT of the
+    affected checkpoints and one executemany UPDATE, however many rows changed.
+    """
+    changes = {}
+    for (account_id, day), delta in deltas.items():
+        if account_id and day is not None and delta:
+            changes.setdefault(account_id, []).append((_as_date(day), delta))
+    if not changes:
+        return
+    table = BalanceCheckpoint.__table__
+    since = min(day for rows in changes.values() for day, _ in rows)
+    checkpoints = connection.execute(
+        select(table.c.id, table.c.account_id, table.c.date)
+        .where(table.c.account_id.in_(changes), table.c.date >= since)
+    ).all()
+    params = []
+    for checkpoint_id, account_id, checkpoint_date in checkpoints:
+        shift = sum((delta for day, delta in changes[account_id] if day <= checkpoint_date), ZERO)
+        if shift:
+            params.append({'checkpoint_id': checkpoint_id, 'shift': shift})
+    if params:
+        connection.execute(
+            table.update().where(table.c.id == bindparam('checkpoint_id'))
+            .values(balance=table.c.balance + bindparam('shift')),
+            params
+        )
+
+
+def init_ledger(app):
+    """Register the update-checkpoints and reconcile-balances CLI commands."""
+
+    @app.cli.command('update-checkpoints')
+    @click.option('--user-id', type=int, default=None, help='Only update this user\'s accounts')
+    def update_checkpoints_command(user_id):
+        """Build missing balance checkpoints and roll them forward to the last closed month."""
+        count = 0
+        for uid in each_shard(user_id):
+            query = Account.query if uid is None else Account.query.filter_by(user_id=uid)
+            for account in query.all():
+                ensure_checkpoints(account)
+                count += 1
+            db.session.commit()
+        click.echo(f'Checkpoints up to date for {count} accounts')
+
+    @app.cli.command('reconcile-balances')
+    @click.option('--user-id', type=int, default=None, help='Only check this user\'s accounts')
+    @click.option('--fix', type=click.Choice(['ledger', 'stored']), default=None,
+                  help='ledger: overwrite drifted stored balances; stored: rebuild checkpoints from them')
+    def reconcile_balances_command(user_id, fix):
+        """Detect drift between stored account balances and the transaction ledger."""
+        reports = []
+        for uid in each_shard(user_id):
+            reports.extend(reconcile(user_id=uid, fix=fix))
+        drifted = [r for r in reports if r['drifted']]
+        for r in reports:
+            flag = 'DRIFT' if r['drifted'] else 'ok'
+            click.echo(f"[{flag:5s}] account {r['account_id']} ({r['name']}, user {r['user_id']}): "
+                       f"stored {r['stored']:.2f} ledger {r['ledger']:.2f} drift {r['drift']:+.2f}")
+        click.echo(f"{len(drifted)} of {len(reports)} accounts drifted" + (f" (fixed: {fix})" if fix and drifted else ''))
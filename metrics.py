@@ -0,0 +1,240 @@
+"""
+Lightweight Prometheus-style metrics.
+
+Each process keeps its samples in memory and periodically writes a snapshot
+to METRICS_DIR/<pid>.json. The /metrics endpoint merges every snapshot in
+that directory, so counters and histograms aggregate across gunicorn workers.
+"""
+from flask import g, request, has_request_context, request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+import threading
+import json
+import time
+import os
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'finance_requests_total': ('counter', 'HTTP requests by endpoint, method and status', None),
+    'finance_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint', LATENCY_BUCKETS),
+    'finance_request_queries': ('histogram', 'SQL statements executed per request', QUERY_COUNT_BUCKETS),
+    'finance_request_query_seconds': ('histogram', 'Time spent in SQL per request', LATENCY_BUCKETS),
+    'finance_stage_duration_seconds': ('histogram', 'Duration of sync and import stages', LATENCY_BUCKETS),
+}
+
+FLUSH_INTERVAL = 1.0
+
+
+def default_metrics_dir():
+    # Matches Flask's instance_path for a non-frozen checkout, so the gunicorn
+    # master can clear it before workers start.
+    base = os.path.dirname(os.path.abspath(__file__))
+    return os.environ.get('METRICS_DIR', os.path.join(base, 'instance', 'metrics'))
+
+
+class MetricsRegistry:
+    """In-process metric storage. Keys are (name, sorted label items)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.metrics_dir = None
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                # [per-bucket counts..., sum, count]
+                hist = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[k[0], dict(k[1]), v] for k, v in self.counters.items()],
+                'histograms': [[k[0], dict(k[1]), list(v)] for k, v in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Write this process's snapshot (at most once per FLUSH_INTERVAL unless forced)."""
+        if not self.metrics_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        path = os.path.join(self.metrics_dir, f'{os.getpid()}.json')
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # Metrics must never break a request
+
+
+registry = MetricsRegistry()
+
+
+def reset_metrics_dir(path=None):
+    """Remove snapshots left by previous runs. Call once before workers start."""
+    path = path or default_metrics_dir()
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+def collect(metrics_dir):
+    """Merge every worker snapshot in metrics_dir into one set of samples."""
+    counters = {}
+    histograms = {}
+    for name in os.listdir(metrics_dir) if os.path.isdir(metrics_dir) else []:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name)) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, value in snap.get('counters', []):
+            key = (metric, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for metric, labels, values in snap.get('histograms', []):
+            key = (metric, tuple(sorted(labels.items())))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = values
+    return counters, histograms
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    escaped = []
+    for k, v in items:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{k}="{v}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def render(counters, histograms):
+    """Render merged samples in the Prometheus text exposition format."""
+    lines = []
+    for name, (mtype, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {mtype}')
+        if mtype == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        else:
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def observe_stage(operation, stage, seconds):
+    registry.observe('finance_stage_duration_seconds', {'operation': operation, 'stage': stage}, seconds)
+
+
+@contextmanager
+def timed_stage(operation, stage):
+    """Record how long one stage of a sync or import takes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(operation, stage, time.perf_counter() - start)
+
+
+def _on_request_started(sender, **extra):
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_time = 0.0
+
+
+def _on_request_finished(sender, response, **extra):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    labels = {'endpoint': endpoint, 'method': request.method}
+    registry.inc('finance_requests_total', {**labels, 'status': response.status_code})
+    registry.observe('finance_request_duration_seconds', labels, time.perf_counter() - start)
+    registry.observe('finance_request_queries', labels, g.pop('metrics_queries', 0))
+    registry.observe('finance_request_query_seconds', labels, g.pop('metrics_query_time', 0.0))
+    registry.flush()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_query_time += elapsed
+
+
+def init_metrics(app):
+    """Hook request signals and SQL cursor events, and register /metrics."""
+    metrics_dir = app.config.get('METRICS_DIR') or default_metrics_dir()
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        registry.metrics_dir = metrics_dir
+    except OSError:
+        app.logger.warning(f'Metrics directory {metrics_dir} is not writable; /metrics covers this process only')
+
+    request_started.connect(_on_request_started, app)
+    request_finished.connect(_on_request_finished, app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if registry.metrics_dir:
+            registry.flush(force=True)
+            counters, histograms = collect(registry.metrics_dir)
+        else:
+            snap = registry.snapshot()
+            counters = {(m, tuple(sorted(l.items()))): v for m, l, v in snap['counters']}
+            histograms = {(m, tuple(sorted(l.items()))): v for m, l, v in snap['histograms']}
+        return render(counters, histograms), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
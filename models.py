@@ -1,13 +1,75 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, type_coerce, Integer, Float
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
+import json
 
-db = SQLAlchemy()
+class RoutingSession(FlaskSession):
+    """Session that lets the shard router (see sharding.py) pick per-user engines."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        router = current_app.extensions.get('shards') if bind is None and has_app_context() else None
+        if router is not None:
+            engine = router.bind_for(self, mapper, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+CENT = Decimal('0.01')
+
+def to_money(value):
+    """Decimal rounded half-up to whole cents; floats go through their shortest repr."""
+    if isinstance(value, Decimal):
+        return value.quantize(CENT, ROUND_HALF_UP)
+    return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+class Money(TypeDecorator):
+    """
+    Money stored as integer cents, so SQLite sums and compares exact integers.
+    Python sees Decimal with two places; binds accept Decimal, float, int or str.
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int(to_money(value).scaleb(2))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return Decimal(int(value)).scaleb(-2)
+
+    def coerce_compared_value(self, op, value):
+        # amount * 2 or amount / 2 scale by a plain number, not by cents
+        if op in (operators.mul, operators.truediv, operators.floordiv):
+            return Integer() if isinstance(value, int) else Float()
+        return self
+
+class MoneyFloat(Money):
+    """Money read back as float, for list projections that skip Decimal."""
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / 100
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(120), nullable=False)
     simplefin_token = db.Column(db.String(200), nullable=True) # Token for SimpleFin API
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())  # Set with `flask set-admin`
     incomes = db.relationship('Income', backref='user', lazy=True)
     expenses = db.relationship('Expense', backref='user', lazy=True)
     goals = db.relationship('Goal', backref='user', lazy=True)
@@ -24,15 +86,31 @@ class Account(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     simplefin_id = db.Column(db.String(100), nullable=True) # Null for manual accounts
     name = db.Column(db.String(100), nullable=False)
-    balance = db.Column(db.Numeric(10, 2), default=0.00)
+    balance = db.Column(Money, default=0)
     type = db.Column(db.String(50), default='checking') # checking, savings, credit, cash
     is_manual = db.Column(db.Boolean, default=True)
     last_synced = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'balance': float(self.balance),
+            'type': self.type,
+            'is_manual': self.is_manual,
+            'last_synced': self.last_synced.isoformat() if self.last_synced else None
+        }
+
+    @classmethod
+    def list_columns(cls):
+        """Columns selected by list endpoints (same keys as to_dict)"""
+        return (cls.id, cls.name, type_coerce(cls.balance, MoneyFloat).label('balance'),
+                cls.type, cls.is_manual, cls.last_synced)
+
 class MonthlyIncome(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     month = db.Column(db.String(7), nullable=False) # Format: YYYY-MM
 
     def to_dict(self):
@@ -47,12 +125,17 @@ class Income(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=True)
-    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     source = db.Column(db.String(100), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     category = db.Column(db.String(50), default='Income')
     simplefin_id = db.Column(db.String(100), unique=True, nullable=True)  # To avoid duplicates from sync
 
+    # Covers per-user, per-account date-ordered aggregates (net worth, ledger sums).
+    # AUTOINCREMENT: ids of deleted or archived rows are never handed out again.
+    __table_args__ = (db.Index('ix_income_user_account_date', 'user_id', 'account_id', 'date', 'amount'),
+                      {'sqlite_autoincrement': True})
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -64,15 +147,29 @@ class Income(db.Model):
             'category': self.category
         }
 
+    @classmethod
+    def list_columns(cls, source=None):
+        """Columns selected by list endpoints (same keys as to_dict); source may be an alias such as archive.history"""
+        e = source if source is not None else cls
+        return (e.id, e.user_id, e.account_id, type_coerce(e.amount, MoneyFloat).label('amount'),
+                e.source, e.date, e.category)
+
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=True)
-    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     category = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200), nullable=True)  # For categorization learning
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     simplefin_id = db.Column(db.String(100), unique=True, nullable=True)  # To avoid duplicates from sync
+    # True while category is the import/sync fallback rather than anyone's choice
+    category_fallback = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    # Covers per-user, per-account date-ordered aggregates (net worth, ledger sums).
+    # AUTOINCREMENT: ids of deleted or archived rows are never handed out again.
+    __table_args__ = (db.Index('ix_expense_user_account_date', 'user_id', 'account_id', 'date', 'amount'),
+                      {'sqlite_autoincrement': True})
 
     def to_dict(self):
         return {
@@ -85,22 +182,54 @@ class Expense(db.Model):
             'date': self.date.isoformat()
         }
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'amount': self.amount,
-            'category': self.category,
-            'description': self.description,
-            'date': self.date.isoformat()
-        }
+    @classmethod
+    def list_columns(cls, source=None):
+        """Columns selected by list endpoints (same keys as to_dict); source may be an alias such as archive.history"""
+        e = source if source is not None else cls
+        return (e.id, e.user_id, e.account_id, type_coerce(e.amount, MoneyFloat).label('amount'),
+                e.category, e.description, e.date)
+
+class IncomeArchive(db.Model):
+    """Incomes moved out of the hot table by archive.py (same columns, same ids)"""
+    __tablename__ = 'income_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=True)
+    amount = db.Column(Money, nullable=False)
+    source = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    category = db.Column(db.String(50), default='Income')
+    simplefin_id = db.Column(db.String(100), nullable=True, index=True)
+
+    __table_args__ = (db.Index('ix_income_archive_user_account_date', 'user_id', 'account_id', 'date', 'amount'),)
+
+class ExpenseArchive(db.Model):
+    """Expenses moved out of the hot table by archive.py (same columns, same ids)"""
+    __tablename__ = 'expense_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=True)
+    amount = db.Column(Money, nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.String(200), nullable=True)
+    date = db.Column(db.Date, nullable=False)
+    simplefin_id = db.Column(db.String(100), nullable=True, index=True)
+    category_fallback = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    __table_args__ = (db.Index('ix_expense_archive_user_account_date', 'user_id', 'account_id', 'date', 'amount'),)
+
+class ArchiveState(db.Model):
+    """Per hot table: every archived row is dated before `cutoff`"""
+    table = db.Column(db.String(50), primary_key=True)
+    cutoff = db.Column(db.Date, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Goal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
-    target_amount = db.Column(db.Numeric(10, 2), nullable=False)
-    current_amount = db.Column(db.Numeric(10, 2), default=0.0)
+    target_amount = db.Column(Money, nullable=False)
+    current_amount = db.Column(Money, default=0)
     deadline = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -115,11 +244,19 @@ class Goal(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+    @classmethod
+    def list_columns(cls):
+        """Columns selected by list endpoints (same keys as to_dict)"""
+        return (cls.id, cls.user_id, cls.description,
+                type_coerce(cls.target_amount, MoneyFloat).label('target_amount'),
+                type_coerce(cls.current_amount, MoneyFloat).label('current_amount'),
+                cls.deadline, cls.created_at)
+
 class Budget(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     month = db.Column(db.String(7), nullable=False) # Format: YYYY-MM
     
     def to_dict(self):
@@ -160,6 +297,163 @@ class Category(db.Model):
             'name': self.name
         }
 
+class BalanceCheckpoint(db.Model):
+    """Ledger-derived balance of an account at the end of `date` (one row per month end)"""
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    balance = db.Column(Money, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('account_id', 'date', name='uq_checkpoint_account_date'),)
+
+    def to_dict(self):
+        return {
+            'account_id': self.account_id,
+            'date': self.date.isoformat(),
+            'balance': float(self.balance)
+        }
+
+class DuplicateCandidate(db.Model):
+    """A suspected cross-source duplicate pair of expenses or incomes"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'expense' or 'income'
+    primary_id = db.Column(db.Integer, nullable=False)  # Row that is kept
+    duplicate_id = db.Column(db.Integer, nullable=False)  # Row removed on merge
+    duplicate_external_id = db.Column(db.String(100), nullable=True, index=True)  # Blocks re-import once merged
+    day_gap = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, merged, ignored
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('kind', 'primary_id', 'duplicate_id', name='uq_duplicate_pair'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'primary_id': self.primary_id,
+            'duplicate_id': self.duplicate_id,
+            'day_gap': self.day_gap,
+            'status': self.status,
+            'created_at': self.created_at.isoformat()
+        }
+
+class Job(db.Model):
+    """A background job and its progress, readable from any worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Null for system-wide jobs
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed
+    done = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    stage = db.Column(db.String(50), nullable=True)  # Current step, e.g. fetch, process, commit
+    detail = db.Column(db.Text, nullable=True)  # JSON, stage-specific (e.g. per-account counts)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'stage': self.stage,
+            'detail': json.loads(self.detail) if self.detail else None,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class CategoryModel(db.Model):
+    """Per-user naive Bayes categorizer state (see classifier.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    labels = db.Column(db.Text, nullable=False)  # JSON list, one per weight row
+    weights = db.Column(db.LargeBinary, nullable=False)  # np.savez_compressed counts
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CategoryExample(db.Model):
+    """Categorization event not yet folded into the user's CategoryModel (see classifier.py)"""
+    __tablename__ = 'category_example'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    description = db.Column(db.String(200), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    previous = db.Column(db.String(100), nullable=True)  # Category it replaced, if any
+
+class ChangeLog(db.Model):
+    """Latest change to each user-visible row, in commit order (see changes.py)"""
+    __tablename__ = 'change_log'
+    seq = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entity = db.Column(db.String(30), nullable=False)  # Table name of the changed row
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(6), nullable=False)  # upsert, delete
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+    # Written by triggers. AUTOINCREMENT: seq never goes backwards, even after pruning.
+    __table_args__ = (db.UniqueConstraint('entity', 'entity_id', name='uq_change_log_entity'),
+                      db.Index('ix_change_log_user_seq', 'user_id', 'seq'),
+                      {'sqlite_autoincrement': True})
+
+class ChangeHorizon(db.Model):
+    """Per user: deletes up to this seq were pruned from the change log"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    pruned_through = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    """A data migration already applied to this database (see startup.MIGRATIONS)"""
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DataVersion(db.Model):
+    """Per-user counter bumped on every write, used to derive ETags for read endpoints"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def bump_data_version(user_ids, connection=None):
+    """Increment the data version of each given user (in the current transaction)."""
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    conn = connection if connection is not None else db.session
+    for uid in set(user_ids):
+        stmt = sqlite_insert(DataVersion.__table__).values(user_id=uid, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'version': DataVersion.__table__.c.version + 1}
+        )
+        conn.execute(stmt)
+
+def ensure_indexes(engine=None, tables=None):
+    """create_all() skips indexes on tables that already exist; add any that are missing."""
+    for table in tables or db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine or db.engine, checkfirst=True)
+
+def get_data_version(user_id):
+    version = db.session.query(DataVersion.version).filter_by(user_id=user_id).scalar()
+    return version or 0
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions_after_flush(session, flush_context):
+    # Any flushed row owned by a user invalidates that user's cached reads.
+    # Bulk query.update()/delete() calls bypass the flush and must call
+    # bump_data_version() themselves.
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (DataVersion, Job)):
+            continue  # Bookkeeping rows don't change what the user sees
+        uid = getattr(obj, 'user_id', None)
+        if uid is not None:
+            user_ids.add(uid)
+    if user_ids:
+        bump_data_version(user_ids, session.connection())
+
 # Predefined expense categories
 EXPENSE_CATEGORIES = [
     'Housing',
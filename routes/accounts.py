@@ -1,23 +1,51 @@
 from flask import Blueprint, request, jsonify
-from models import db, Account
+from models import db, Account, BalanceCheckpoint
 from routes.auth import token_required
+from utils import etag_cached
+from ledger import balance_as_of
 from datetime import datetime
 
 accounts_bp = Blueprint('accounts', __name__, url_prefix='/api/accounts')
 
 @accounts_bp.route('', methods=['GET'])
 @token_required
+@etag_cached
 def get_accounts(current_user_id):
+    rows = db.session.query(*Account.list_columns()).filter(Account.user_id == current_user_id).all()
+    return jsonify([r._asdict() for r in rows]), 200
+
+@accounts_bp.route('/balances', methods=['GET'])
+@token_required
+def get_balances_as_of(current_user_id):
+    """
+    Get every account's ledger balance at the end of a past date
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: as_of
+        in: query
+        type: string
+        format: date
+        required: true
+    responses:
+      200:
+        description: Per-account balances and their total
+      400:
+        description: Missing or invalid date
+    """
+    try:
+        as_of = datetime.strptime(request.args.get('as_of', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'message': 'as_of must be a date (YYYY-MM-DD)'}), 400
+
     accounts = Account.query.filter_by(user_id=current_user_id).all()
-    
-    return jsonify([{
-        'id': a.id,
-        'name': a.name,
-        'balance': float(a.balance),
-        'type': a.type,
-        'is_manual': a.is_manual,
-        'last_synced': a.last_synced.isoformat() if a.last_synced else None
-    } for a in accounts]), 200
+    balances = [{'id': a.id, 'name': a.name, 'balance': balance_as_of(a, as_of)} for a in accounts]
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'accounts': balances,
+        'total': round(sum(b['balance'] for b in balances), 2)
+    }), 200
 
 @accounts_bp.route('', methods=['POST'])
 @token_required
@@ -82,6 +110,7 @@ def delete_account(current_user_id, id):
     # Cascade delete is configured in DB, but SQLAlchemy might need help if not db.ForeignKey with ON DELETE CASCADE
     # We defined ondelete='CASCADE' in models, so simple delete should work.
     
+    BalanceCheckpoint.query.filter_by(account_id=account.id).delete(synchronize_session=False)
     db.session.delete(account)
     db.session.commit()
     return jsonify({'message': 'Account deleted'}), 200
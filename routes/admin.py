@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, current_app, jsonify
+from routes.auth import admin_required
+from backup import database_files, stream_archive, archive_name
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+
+@admin_bp.route('/backup', methods=['GET'])
+@admin_required
+def download_backup(current_user_id):
+    """
+    Stream a consistent backup of every database as a .tar.gz
+    ---
+    security:
+      - Bearer: []
+    produces:
+      - application/gzip
+    responses:
+      200:
+        description: The archive, streamed while the online snapshots are taken
+      403:
+        description: Not an admin (see `flask set-admin`)
+      501:
+        description: The database is not a file-based SQLite database
+    """
+    try:
+        files = database_files(current_app._get_current_object())
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 501
+    return Response(stream_archive(files), mimetype='application/gzip', headers={
+        'Content-Disposition': f'attachment; filename={archive_name()}',
+        'Cache-Control': 'no-store',
+    })
@@ -0,0 +1,158 @@
+from flask import Blueprint, request, jsonify
+from models import db, Expense, Account
+from routes.auth import token_required
+from utils import etag_cached, BUCKETS, bucket_expr, bucket_start, next_bucket, previous_bucket
+from archive import history
+from sqlalchemy import func, select, type_coerce, Integer
+from datetime import date, datetime
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+GROUPS = ('category', 'account')
+
+# Buckets shown when no start_date is given, ending with the current one
+DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+MAX_BUCKETS = 400
+
+def _delta(values, previous):
+    delta = [v - p for v, p in zip(values, previous)]
+    pct = [round(d * 100 / p, 1) if p else None for d, p in zip(delta, previous)]
+    return delta, pct
+
+def _dollars(cents):
+    return [c / 100 for c in cents]
+
+def compute_timeseries(user_id, bucket, group, start, end):
+    """
+    Spending per bucket per category or account, from one grouped query.
+    The bucket before `start` is read too, so the first bucket has a delta.
+    Sums stay in integer cents until the output, so deltas are exact.
+    """
+    first = bucket_start(start, bucket)
+    baseline = previous_bucket(first, bucket)
+    source = history(Expense, baseline)
+
+    bucket_key = bucket_expr(source.date, bucket)
+    if group == 'category':
+        key, name = source.category, source.category
+    else:
+        key, name = source.account_id, func.coalesce(Account.name, 'No account')
+    query = select(
+        bucket_key.label('bucket'),
+        key.label('key'),
+        name.label('name'),
+        type_coerce(func.sum(source.amount), Integer).label('cents')
+    ).where(source.user_id == user_id, source.date >= baseline, source.date <= end)
+    if group == 'account':
+        query = query.outerjoin(Account, Account.id == source.account_id)
+    rows = db.session.execute(query.group_by(bucket_key, key, name)).all()
+
+    labels = []
+    d = first
+    while d <= end:
+        labels.append(d.isoformat())
+        d = next_bucket(d, bucket)
+    axis = [baseline.isoformat()] + labels
+
+    names, cells = {}, {}
+    for row in rows:
+        names[row.key] = row.name
+        cells.setdefault(row.key, {})[row.bucket] = row.cents
+
+    series = []
+    for series_key, by_bucket in cells.items():
+        values = [by_bucket.get(label, 0) for label in axis]
+        if not any(values[1:]):
+            continue  # Only spent in the baseline bucket
+        delta, pct = _delta(values[1:], values[:-1])
+        series.append({
+            'key': series_key,
+            'label': names[series_key],
+            'data': _dollars(values[1:]),
+            'delta': _dollars(delta),
+            'delta_pct': pct,
+            'total': sum(values[1:]) / 100,
+        })
+    series.sort(key=lambda s: (-s['total'], s['label']))
+
+    totals = [sum(by_bucket.get(label, 0) for by_bucket in cells.values()) for label in axis]
+    delta, pct = _delta(totals[1:], totals[:-1])
+    return {
+        'bucket': bucket,
+        'group': group,
+        'labels': labels,
+        'datasets': series,
+        'total': {'data': _dollars(totals[1:]), 'delta': _dollars(delta), 'delta_pct': pct},
+    }
+
+@analytics_bp.route('/timeseries', methods=['GET'])
+@token_required
+@etag_cached
+def get_timeseries(current_user_id):
+    """
+    Spending per day, week or month, broken down by category or account
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: bucket
+        in: query
+        type: string
+        enum: [day, week, month]
+        default: month
+      - name: group
+        in: query
+        type: string
+        enum: [category, account]
+        default: category
+      - name: start_date
+        in: query
+        type: string
+        format: date
+        description: First bucket is the one containing this date (default 30 days, 12 weeks or 12 months back)
+      - name: end_date
+        in: query
+        type: string
+        format: date
+        description: Defaults to today
+    responses:
+      200:
+        description: >
+          Columnar series ready for Chart.js: labels (bucket start dates) and
+          datasets, one per category or account, each with data, delta and
+          delta_pct against the previous bucket (null when that was 0) and
+          total, largest first; total holds the same arrays summed over all
+          datasets.
+      400:
+        description: Invalid bucket, group or dates, or more than 400 buckets
+    """
+    bucket = request.args.get('bucket', 'month')
+    group = request.args.get('group', 'category')
+    if bucket not in BUCKETS:
+        return jsonify({'message': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    if group not in GROUPS:
+        return jsonify({'message': f"group must be one of {', '.join(GROUPS)}"}), 400
+
+    try:
+        end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+            if request.args.get('end_date') else date.today()
+        if request.args.get('start_date'):
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        else:
+            start = bucket_start(end, bucket)
+            for _ in range(DEFAULT_PERIODS[bucket] - 1):
+                start = previous_bucket(start, bucket)
+    except ValueError:
+        return jsonify({'message': 'start_date and end_date must be dates (YYYY-MM-DD)'}), 400
+    if start > end:
+        return jsonify({'message': 'start_date must not be after end_date'}), 400
+
+    buckets = 0
+    d = bucket_start(start, bucket)
+    while d <= end and buckets <= MAX_BUCKETS:
+        buckets += 1
+        d = next_bucket(d, bucket)
+    if buckets > MAX_BUCKETS:
+        return jsonify({'message': f'At most {MAX_BUCKETS} buckets; use a larger bucket or a shorter range'}), 400
+
+    return jsonify(compute_timeseries(current_user_id, bucket, group, start, end)), 200
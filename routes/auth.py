@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from models import db, User
+from sharding import use_shard
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
@@ -107,5 +108,17 @@ def token_required(f):
         except Exception as e:
             return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
         
+        use_shard(current_user_id)
+        return f(current_user_id, *args, **kwargs)
+    return decorated
+
+def admin_required(f):
+    """token_required, limited to users granted admin rights with `flask set-admin`."""
+    @wraps(f)
+    @token_required
+    def decorated(current_user_id, *args, **kwargs):
+        user = db.session.get(User, current_user_id)
+        if user is None or not user.is_admin:
+            return jsonify({'message': 'Admin access required'}), 403
         return f(current_user_id, *args, **kwargs)
     return decorated
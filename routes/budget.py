@@ -3,6 +3,7 @@ from models import db, Budget, Income, Expense, MonthlyIncome
 from datetime import datetime, timedelta
 from routes.auth import token_required
 from sqlalchemy import func
+from archive import history
 
 budget_bp = Blueprint('budget', __name__, url_prefix='/api/budget')
 
@@ -141,7 +142,7 @@ def get_projection(current_user_id):
     num_months = len(distinct_months)
     divisor = max(num_months, 1)
     
-    monthly_average = total_income / float(divisor)
+    monthly_average = float(total_income) / divisor
     
     return jsonify({
         'projected_income': round(monthly_average, 2),
@@ -179,14 +180,15 @@ def get_status(current_user_id):
     budget_map = {b.category: b.amount for b in budgets}
     
     # Get all expenses for this month
+    source = history(Expense, start_date)
     expenses = db.session.query(
-        Expense.category, 
-        func.sum(Expense.amount)
+        source.category, 
+        func.sum(source.amount)
     ).filter(
-        Expense.user_id == current_user_id,
-        Expense.date >= start_date,
-        Expense.date < end_date
-    ).group_by(Expense.category).all()
+        source.user_id == current_user_id,
+        source.date >= start_date,
+        source.date < end_date
+    ).group_by(source.category).all()
     
     actual_map = {cat: amt for cat, amt in expenses}
     
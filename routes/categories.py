@@ -1,11 +1,16 @@
 from flask import Blueprint, request, jsonify
 from models import db, Category, CategoryMapping, EXPENSE_CATEGORIES, Expense, Budget
 from routes.auth import token_required
+from utils import etag_cached, normalize_merchant
+from jobs import start_job
+from categorization import compact_mappings, recategorize_other
+import classifier
 
 categories_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 
 @categories_bp.route('', methods=['GET'])
 @token_required
+@etag_cached
 def get_categories(current_user_id):
     """
     Get list of user-defined categories. Seeds default if none exist.
@@ -40,8 +45,10 @@ def get_categories_extended(current_user_id):
       200:
         description: List of category objects
     """
-    categories = Category.query.filter_by(user_id=current_user_id).all()
-    return jsonify([c.to_dict() for c in categories]), 200
+    rows = db.session.query(Category.id, Category.user_id, Category.name).filter(
+        Category.user_id == current_user_id
+    ).all()
+    return jsonify([r._asdict() for r in rows]), 200
 
 @categories_bp.route('', methods=['POST'])
 @token_required
@@ -187,7 +194,8 @@ def suggest_category(current_user_id):
         description: Suggested category
     """
     data = request.get_json()
-    description = data.get('description', '').lower().strip()
+    raw = data.get('description', '').lower().strip()
+    description = normalize_merchant(raw)
     
     if not description:
         return jsonify({'suggested_category': None}), 200
@@ -204,7 +212,63 @@ def suggest_category(current_user_id):
     # Look for partial match
     mappings = CategoryMapping.query.filter_by(user_id=current_user_id).all()
     for m in mappings:
-        if m.keyword in description or description in m.keyword:
+        if m.keyword in description or m.keyword in raw or description in m.keyword:
             return jsonify({'suggested_category': m.category, 'confidence': 'medium'}), 200
+
+    # Fall back to the statistical model, if enabled and trained
+    category, probability = classifier.predict(current_user_id, [raw])[0]
+    if category:
+        confidence = 'high' if probability >= 0.9 else 'medium' if probability >= classifier.MIN_PROBABILITY else 'low'
+        return jsonify({'suggested_category': category, 'confidence': confidence,
+                        'score': round(probability, 4)}), 200
     
     return jsonify({'suggested_category': None, 'confidence': None}), 200
+
+@categories_bp.route('/mappings/compact', methods=['POST'])
+@token_required
+def compact_category_mappings(current_user_id):
+    """
+    Start a background job merging learned mappings down to one per merchant
+    ---
+    security:
+      - Bearer: []
+    responses:
+      202:
+        description: Job started (or the one already running); poll /api/jobs/{id}
+    """
+    job = start_job(current_user_id, 'compact_mappings', compact_mappings, current_user_id)
+    return jsonify(job.to_dict()), 202
+
+@categories_bp.route('/recategorize-other', methods=['POST'])
+@token_required
+def recategorize_other_expenses(current_user_id):
+    """
+    Start a background job applying current mappings to expenses still in 'Other'
+    ---
+    security:
+      - Bearer: []
+    responses:
+      202:
+        description: Job started (or the one already running); poll /api/jobs/{id} for progress
+    """
+    job = start_job(current_user_id, 'recategorize_other', recategorize_other, current_user_id)
+    return jsonify(job.to_dict()), 202
+
+@categories_bp.route('/classifier/train', methods=['POST'])
+@token_required
+def train_category_classifier(current_user_id):
+    """
+    Start a background job rebuilding the user's category classifier from history
+    ---
+    security:
+      - Bearer: []
+    responses:
+      202:
+        description: Job started (or the one already running); poll /api/jobs/{id}
+      409:
+        description: The classifier is disabled or NumPy is not installed
+    """
+    if not classifier.enabled():
+        return jsonify({'message': 'Category classifier is not available'}), 409
+    job = start_job(current_user_id, 'train_classifier', classifier.train_from_history, current_user_id)
+    return jsonify(job.to_dict()), 202
@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from routes.auth import token_required
+from changes import changes_since, DEFAULT_LIMIT, MAX_LIMIT
+
+changes_bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+
+@changes_bp.route('', methods=['GET'])
+@token_required
+def get_changes(current_user_id):
+    """
+    Rows changed since a previous sync
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: since
+        in: query
+        type: integer
+        default: 0
+        description: seq returned by the previous call (0 for everything)
+      - name: limit
+        in: query
+        type: integer
+        default: 500
+        description: Max changed rows per response (up to 2000)
+    responses:
+      200:
+        description: >
+          changes maps each table (account, income, expense, budget, goal,
+          category, category_mapping, monthly_income) to its upserted rows and
+          deleted ids. Call again with the returned seq; has_more means more
+          are waiting. reset means the client must refetch everything and
+          continue from seq.
+      400:
+        description: Invalid since or limit
+    """
+    # Parsed explicitly: type=int would turn since=abc into 0, a silent full resync
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        since, limit = -1, 0
+    if since < 0 or not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'message': f'since must be >= 0 and limit between 1 and {MAX_LIMIT}'}), 400
+    return jsonify(changes_since(current_user_id, since, limit)), 200
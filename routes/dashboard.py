@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify
+from models import db, Income, Expense, Goal, Account
+from routes.auth import token_required
+from utils import etag_cached
+from archive import history
+from datetime import datetime
+from sqlalchemy import func
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+@dashboard_bp.route('', methods=['GET'])
+@token_required
+@etag_cached
+def get_dashboard(current_user_id):
+    """
+    Get everything the dashboard needs in one round trip
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: start_date
+        in: query
+        type: string
+        format: date
+      - name: end_date
+        in: query
+        type: string
+        format: date
+    responses:
+      200:
+        description: Summary, category breakdown, goals and accounts
+    """
+    dt_start = _parse_date(request.args.get('start_date'))
+    dt_end = _parse_date(request.args.get('end_date'))
+
+    incomes, expenses = history(Income, dt_start), history(Expense, dt_start)
+    income_query = db.session.query(func.sum(incomes.amount)).filter(incomes.user_id == current_user_id)
+    expense_query = db.session.query(expenses.category, func.sum(expenses.amount)).filter(
+        expenses.user_id == current_user_id
+    )
+    if dt_start:
+        income_query = income_query.filter(incomes.date >= dt_start)
+        expense_query = expense_query.filter(expenses.date >= dt_start)
+    if dt_end:
+        income_query = income_query.filter(incomes.date <= dt_end)
+        expense_query = expense_query.filter(expenses.date <= dt_end)
+
+    total_income = income_query.scalar() or 0
+    # The expense total is derived from the per-category sums instead of a second aggregate
+    breakdown = {cat: amt for cat, amt in expense_query.group_by(expenses.category).all()}
+    total_expense = sum(breakdown.values())
+
+    goals = db.session.query(*Goal.list_columns()).filter(Goal.user_id == current_user_id).all()
+    accounts = db.session.query(*Account.list_columns()).filter(Account.user_id == current_user_id).all()
+
+    return jsonify({
+        'summary': {
+            'total_income': total_income,
+            'total_expense': total_expense
+        },
+        'by_category': breakdown,
+        'goals': [g._asdict() for g in goals],
+        'accounts': [a._asdict() for a in accounts]
+    }), 200
@@ -0,0 +1,142 @@
+from flask import Blueprint, request, jsonify
+from models import db, DuplicateCandidate
+from routes.auth import token_required
+from dedupe import MODELS, DEFAULT_WINDOW_DAYS, detect_duplicates, merge_candidate, source_of
+
+duplicates_bp = Blueprint('duplicates', __name__, url_prefix='/api/duplicates')
+
+
+def _describe(row, kind):
+    return {
+        'id': row.id,
+        'account_id': row.account_id,
+        'amount': float(row.amount),
+        'date': row.date.isoformat(),
+        'description': row.description if kind == 'expense' else row.source,
+        'category': row.category if kind == 'expense' else None,
+        'source': source_of(row.simplefin_id)
+    }
+
+
+@duplicates_bp.route('', methods=['GET'])
+@token_required
+def get_duplicates(current_user_id):
+    """
+    List pending duplicate candidates
+    ---
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Candidate pairs with the kept (primary) and duplicate transactions
+    """
+    candidates = DuplicateCandidate.query.filter_by(user_id=current_user_id, status='pending') \
+        .order_by(DuplicateCandidate.id).all()
+
+    rows = {}
+    for kind, model in MODELS.items():
+        ids = {i for c in candidates if c.kind == kind for i in (c.primary_id, c.duplicate_id)}
+        if ids:
+            for row in model.query.filter(model.user_id == current_user_id, model.id.in_(ids)):
+                rows[(kind, row.id)] = row
+
+    result = []
+    for c in candidates:
+        primary = rows.get((c.kind, c.primary_id))
+        duplicate = rows.get((c.kind, c.duplicate_id))
+        if primary is None or duplicate is None:
+            continue  # One side was deleted since detection
+        item = c.to_dict()
+        item['primary'] = _describe(primary, c.kind)
+        item['duplicate'] = _describe(duplicate, c.kind)
+        result.append(item)
+    return jsonify(result), 200
+
+
+@duplicates_bp.route('/scan', methods=['POST'])
+@token_required
+def scan_duplicates(current_user_id):
+    """
+    Scan all existing transactions for cross-source duplicates
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            window_days:
+              type: integer
+              description: Max days between matching transactions (default 3)
+    responses:
+      200:
+        description: Number of new candidates found
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        window = int(data.get('window_days', DEFAULT_WINDOW_DAYS))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'window_days must be an integer'}), 400
+    if not 0 <= window <= 30:
+        return jsonify({'message': 'window_days must be between 0 and 30'}), 400
+
+    found = {kind: detect_duplicates(current_user_id, kind, window_days=window) for kind in MODELS}
+    db.session.commit()
+    return jsonify({'found': sum(found.values()), 'by_kind': found}), 200
+
+
+@duplicates_bp.route('/<int:id>/merge', methods=['POST'])
+@token_required
+def merge_duplicate(current_user_id, id):
+    """
+    Merge a candidate pair, deleting the duplicate transaction
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Duplicate removed
+      404:
+        description: Candidate not found
+    """
+    candidate = DuplicateCandidate.query.filter_by(id=id, user_id=current_user_id, status='pending').first()
+    if not candidate:
+        return jsonify({'message': 'Duplicate candidate not found'}), 404
+    merge_candidate(candidate)
+    db.session.commit()
+    return jsonify({'message': 'Duplicate merged', 'kept_id': candidate.primary_id}), 200
+
+
+@duplicates_bp.route('/<int:id>/ignore', methods=['POST'])
+@token_required
+def ignore_duplicate(current_user_id, id):
+    """
+    Mark a candidate pair as not a duplicate so it is never suggested again
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Candidate ignored
+      404:
+        description: Candidate not found
+    """
+    candidate = DuplicateCandidate.query.filter_by(id=id, user_id=current_user_id, status='pending').first()
+    if not candidate:
+        return jsonify({'message': 'Duplicate candidate not found'}), 404
+    candidate.status = 'ignored'
+    db.session.commit()
+    return jsonify({'message': 'Duplicate ignored'}), 200
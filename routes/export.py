@@ -1,8 +1,9 @@
 import io
 import csv
 from flask import Blueprint, make_response, request
-from models import Income, Expense
+from models import db, Income, Expense
 from routes.auth import token_required
+from archive import history
 
 export_bp = Blueprint('export', __name__, url_prefix='/api/export')
 
@@ -12,28 +13,33 @@ def export_transactions(current_user_id):
     """
     Export all transactions (income and expenses) to CSV
     """
-    incomes = Income.query.filter_by(user_id=current_user_id).order_by(Income.date.desc()).all()
-    expenses = Expense.query.filter_by(user_id=current_user_id).order_by(Expense.date.desc()).all()
+    income, expense = history(Income), history(Expense)
+    incomes = db.session.query(income.date, income.amount, income.category, income.source).filter(
+        income.user_id == current_user_id
+    ).all()
+    expenses = db.session.query(expense.date, expense.amount, expense.category, expense.description).filter(
+        expense.user_id == current_user_id
+    ).all()
     
     # Combine and sort
     all_txns = []
     
-    for inc in incomes:
+    for inc_date, amount, category, source in incomes:
         all_txns.append({
-            'date': inc.date,
+            'date': inc_date,
             'type': 'Income',
-            'amount': inc.amount,
-            'category': inc.category,
-            'description': inc.source
+            'amount': amount,
+            'category': category,
+            'description': source
         })
         
-    for exp in expenses:
+    for exp_date, amount, category, description in expenses:
         all_txns.append({
-            'date': exp.date,
+            'date': exp_date,
             'type': 'Expense',
-            'amount': -exp.amount,
-            'category': exp.category,
-            'description': exp.description or ''
+            'amount': -amount,
+            'category': category,
+            'description': description or ''
         })
         
     all_txns.sort(key=lambda x: x['date'], reverse=True)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, Goal
 from routes.auth import token_required
+from utils import etag_cached
 from datetime import datetime
 
 goals_bp = Blueprint('goals', __name__, url_prefix='/api/goals')
@@ -45,6 +46,7 @@ def add_goal(current_user_id):
 
 @goals_bp.route('', methods=['GET'])
 @token_required
+@etag_cached
 def get_goals(current_user_id):
     """
     Get all goals for user
@@ -55,8 +57,8 @@ def get_goals(current_user_id):
       200:
         description: List of goals
     """
-    goals = Goal.query.filter_by(user_id=current_user_id).all()
-    return jsonify([g.to_dict() for g in goals]), 200
+    rows = db.session.query(*Goal.list_columns()).filter(Goal.user_id == current_user_id).all()
+    return jsonify([r._asdict() for r in rows]), 200
 
 @goals_bp.route('/<int:goal_id>', methods=['PUT'])
 @token_required
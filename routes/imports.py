@@ -1,78 +1,89 @@
 from flask import Blueprint, request, jsonify
-from models import db, Income, Expense
+from models import db, Income, Expense, Account, to_money
 from routes.auth import token_required
-from utils import auto_categorize
+from utils import match_category, FALLBACK_CATEGORY
+from ledger import adjust_balance, shift_checkpoints_many
 from datetime import datetime
 import io
 import csv
 import hashlib
 from ofxparse import OfxParser
+from metrics import timed_stage
+from dedupe import max_ids, detect_after_ingest, is_merged_duplicate
+from classifier import classify_uncategorized
+from archive import is_archived
+from jobs import start_job, active_job, NullProgress
 
 imports_bp = Blueprint('imports', __name__, url_prefix='/api/transactions')
 
-def process_ofx(content, user_id):
-    imported = 0
+IMPORT_FORMATS = ('.csv', '.ofx', '.qfx')
+IMPORT_CHUNK_SIZE = 200
+
+def _is_duplicate(user_id, unique_id, seen):
+    if unique_id in seen:
+        return True
+    seen.add(unique_id)
+    return Expense.query.filter_by(simplefin_id=unique_id).first() or \
+        Income.query.filter_by(simplefin_id=unique_id).first() or \
+        is_merged_duplicate(user_id, unique_id) or is_archived(user_id, unique_id)
+
+def process_ofx(content, user_id, progress=None):
+    """New rows of an OFX/QFX file, built but not added to the session. Returns (items, duplicates)."""
+    progress = progress or NullProgress()
+    items, seen = [], set()
     duplicates = 0
     try:
         ofx = OfxParser.parse(io.BytesIO(content))
+        total = sum(len(account.statement.transactions) for account in ofx.accounts)
+        done = 0
         for account in ofx.accounts:
             for tx in account.statement.transactions:
+                if done and done % IMPORT_CHUNK_SIZE == 0:
+                    progress.stage('process', {'imported': len(items), 'duplicates': duplicates}, done, total)
+                done += 1
                 # Use OFX unique ID
                 unique_id = f"ofx_{tx.id}"
                 
-                exists = Expense.query.filter_by(simplefin_id=unique_id).first() or \
-                         Income.query.filter_by(simplefin_id=unique_id).first()
-                if exists:
+                if _is_duplicate(user_id, unique_id, seen):
                     duplicates += 1
                     continue
                 
                 desc = tx.payee or tx.memo or 'Unknown OFX Transaction'
-                category = auto_categorize(desc, user_id)
+                category = match_category(desc, user_id)
                 
                 if tx.amount < 0:
-                    new_item = Expense(user_id=user_id, amount=abs(tx.amount), category=category, description=desc, date=tx.date.date(), simplefin_id=unique_id)
+                    new_item = Expense(user_id=user_id, amount=abs(tx.amount), category=category or FALLBACK_CATEGORY,
+                                       category_fallback=category is None, description=desc, date=tx.date.date(), simplefin_id=unique_id)
                 else:
                     new_item = Income(user_id=user_id, amount=tx.amount, source=desc, date=tx.date.date(), simplefin_id=unique_id)
-                db.session.add(new_item)
-                imported += 1
+                items.append(new_item)
     except Exception as e:
         print(f"Error parsing OFX: {e}")
-    return imported, duplicates
+    return items, duplicates
 
-    
-    if imported > 0 and account_id:
-        from models import Account
-        # Update Account Balance
-        account = Account.query.filter_by(id=account_id, user_id=user_id).first()
-        if account:
-            # Calculate net change from this import
-            # We need to sum the amounts of the *newly added* items
-            # Since we just added them to session, we can iterate them, 
-            # but db.session.new might contain other things.
-            # Simpler: Accumulate net_amount during the loop.
-            pass
-
-    return imported, duplicates
-
-def process_csv(content, user_id, account_id=None):
+def process_csv(content, user_id, account_id=None, progress=None):
+    """New rows of a CSV file, built but not added to the session. Returns (items, duplicates)."""
+    progress = progress or NullProgress()
     stream = io.StringIO(content.decode('utf-8'))
     reader = csv.DictReader(stream)
     
     headers = reader.fieldnames
-    if not headers: return 0, 0
+    if not headers: return [], 0
 
     date_col = next((h for h in headers if 'date' in h.lower()), None)
     desc_col = next((h for h in headers if any(k in h.lower() for k in ['desc', 'payee', 'memo', 'name'])), None)
     amount_col = next((h for h in headers if any(k in h.lower() for k in ['amount', 'value', 'total', 'price'])), None)
 
     if not date_col or not desc_col or not amount_col:
-        return 0, 0
+        return [], 0
 
-    imported = 0
+    rows = list(reader)
+    items, seen = [], set()
     duplicates = 0
-    net_import_amount = 0.0
 
-    for row in reader:
+    for index, row in enumerate(rows):
+        if index and index % IMPORT_CHUNK_SIZE == 0:
+            progress.stage('process', {'imported': len(items), 'duplicates': duplicates}, index, len(rows))
         try:
             date_str = row[date_col]
             desc = row[desc_col]
@@ -92,34 +103,72 @@ def process_csv(content, user_id, account_id=None):
             raw_id = f"csv_{dt}_{desc}_{amount}_{user_id}"
             unique_id = hashlib.sha256(raw_id.encode()).hexdigest()[:32]
 
-            exists = Expense.query.filter_by(simplefin_id=unique_id).first() or \
-                     Income.query.filter_by(simplefin_id=unique_id).first()
-            if exists:
+            if _is_duplicate(user_id, unique_id, seen):
                 duplicates += 1
                 continue
 
-            category = auto_categorize(desc, user_id)
+            category = match_category(desc, user_id)
             if amount < 0:
-                new_item = Expense(user_id=user_id, amount=abs(amount), category=category, description=desc, date=dt, simplefin_id=unique_id, account_id=account_id)
-                net_import_amount += amount # amount is negative
+                new_item = Expense(user_id=user_id, amount=abs(amount), category=category or FALLBACK_CATEGORY,
+                                   category_fallback=category is None, description=desc, date=dt, simplefin_id=unique_id, account_id=account_id)
             else:
                 new_item = Income(user_id=user_id, amount=amount, source=desc, date=dt, simplefin_id=unique_id, account_id=account_id)
-                net_import_amount += amount
             
-            db.session.add(new_item)
-            imported += 1
+            items.append(new_item)
         except: continue
-        
-    if imported > 0 and account_id:
-        from models import Account
-        account = Account.query.get(account_id)
-        if account and account.user_id == user_id:
-            # For manual accounts, imports essentially "replay" history, so we add the net amount.
-            # User can always manually correct the final balance in Settings if this assumption is wrong.
-            account.balance = float(account.balance) + net_import_amount
-            account.last_synced = datetime.utcnow()
-    
-    return imported, duplicates
+
+    progress.stage('process', {'imported': len(items), 'duplicates': duplicates}, len(rows), len(rows))
+    return items, duplicates
+
+def save_import(items, user_id, account_id=None):
+    """Add imported rows to the session and move the target account's balance by their net amount."""
+    db.session.add_all(items)
+    account = Account.query.get(account_id) if account_id else None
+    # For manual accounts, imports essentially "replay" history, so we add the net amount.
+    # User can always manually correct the final balance in Settings if this assumption is wrong.
+    linked = [i for i in items if i.account_id == account_id]  # OFX rows carry no account
+    if linked and account is not None and account.user_id == user_id:
+        by_day = {}
+        for item in linked:
+            delta = to_money(item.amount) if isinstance(item, Income) else -to_money(item.amount)
+            by_day[(account_id, item.date)] = by_day.get((account_id, item.date), 0) + delta
+        connection = db.session.connection()
+        adjust_balance(connection, account_id, sum(by_day.values()))
+        shift_checkpoints_many(connection, by_day)
+        account.last_synced = datetime.utcnow()
+
+def run_import(progress, user_id, filename, content, account_id=None):
+    """
+    Import a CSV, OFX or QFX file. Reports process (rows done/total, with
+    imported and duplicate counts) and commit stages.
+
+    The process stage only reads; every write (rows, balance, categories,
+    duplicate candidates) happens after the last progress report and is
+    committed at once, so a failed import leaves nothing behind.
+    """
+    before_ids = max_ids()
+    if filename.endswith(('.ofx', '.qfx')):
+        # OFX usually contains account info, so we might ignore account_id or use it as fallback
+        with timed_stage('import_ofx', 'process'):
+            items, duplicates = process_ofx(content, user_id, progress)
+    else:
+        with timed_stage('import_csv', 'process'):
+            items, duplicates = process_csv(content, user_id, account_id, progress)
+    imported = len(items)
+
+    progress.stage('commit', {'imported': imported, 'duplicates': duplicates})
+    save_import(items, user_id, account_id)
+    with timed_stage('import', 'classify'):
+        classify_uncategorized(user_id, before_ids['expense'])
+    with timed_stage('import', 'dedupe'):
+        possible_duplicates = detect_after_ingest(user_id, before_ids)
+    with timed_stage('import', 'commit'):
+        db.session.commit()
+    return {
+        "message": f"Successfully imported {imported} transactions.",
+        "duplicates": duplicates,
+        "possible_duplicates": possible_duplicates
+    }
 
 @imports_bp.route('/import', methods=['POST'])
 @token_required
@@ -134,9 +183,20 @@ def import_transactions(current_user_id):
         in: formData
         type: file
         required: true
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: >
+          Import in the background and return the job at once; follow it
+          with GET /api/jobs/{id}/events
     responses:
       200:
         description: Transactions imported
+      202:
+        description: Import started; body is the job
+      409:
+        description: Another import of this user is still running
     """
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
@@ -158,18 +218,14 @@ def import_transactions(current_user_id):
         return jsonify({"error": "No file selected"}), 400
 
     filename = file.filename.lower()
-    content = file.read()
-    
-    if filename.endswith(('.ofx', '.qfx')):
-        # OFX usually contains account info, so we might ignore account_id or use it as fallback
-        imported, duplicates = process_ofx(content, current_user_id) 
-    elif filename.endswith('.csv'):
-        imported, duplicates = process_csv(content, current_user_id, account_id)
-    else:
+    if not filename.endswith(IMPORT_FORMATS):
         return jsonify({"error": "Unsupported file format. Please use CSV, OFX, or QFX."}), 400
+    content = file.read()
 
-    db.session.commit()
-    return jsonify({
-        "message": f"Successfully imported {imported} transactions.",
-        "duplicates": duplicates
-    }), 200
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        if active_job(current_user_id, 'import'):
+            return jsonify({"error": "An import is already running"}), 409
+        job = start_job(current_user_id, 'import', run_import, current_user_id, filename, content, account_id)
+        return jsonify(job.to_dict()), 202
+
+    return jsonify(run_import(NullProgress(), current_user_id, filename, content, account_id)), 200
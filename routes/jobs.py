@@ -0,0 +1,74 @@
+from flask import Blueprint, Response, jsonify, stream_with_context
+from models import Job
+from routes.auth import token_required
+from jobs import job_events
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+@jobs_bp.route('', methods=['GET'])
+@token_required
+def get_jobs(current_user_id):
+    """
+    List the user's recent background jobs
+    ---
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: The 20 most recent jobs, newest first
+    """
+    jobs = Job.query.filter_by(user_id=current_user_id).order_by(Job.id.desc()).limit(20).all()
+    return jsonify([j.to_dict() for j in jobs]), 200
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@token_required
+def get_job(current_user_id, job_id):
+    """
+    Get a background job's status and progress
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: job_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Job status, done/total progress and result
+      404:
+        description: Job not found
+    """
+    job = Job.query.filter_by(id=job_id, user_id=current_user_id).first()
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@jobs_bp.route('/<int:job_id>/events', methods=['GET'])
+@token_required
+def get_job_events(current_user_id, job_id):
+    """
+    Stream a background job's progress as Server-Sent Events
+    ---
+    security:
+      - Bearer: []
+    produces:
+      - text/event-stream
+    parameters:
+      - name: job_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: >
+          `progress` events (status, stage, done/total, stage detail) as the
+          job advances, then one `done` or `failed` event with the result.
+          The stream closes after about 25 seconds; reconnect until the job
+          has finished.
+    """
+    return Response(stream_with_context(job_events(job_id, current_user_id)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,143 @@
+from flask import Blueprint, request, jsonify
+from models import db, Income, Expense, Account
+from routes.auth import token_required
+from utils import etag_cached, cached_for_version, BUCKETS, bucket_expr, bucket_start, next_bucket
+from archive import history
+from sqlalchemy import func, select, union_all
+from datetime import date, datetime
+
+networth_bp = Blueprint('networth', __name__, url_prefix='/api/networth')
+
+def compute_networth_history(user_id, bucket):
+    """
+    Per-account balances at the end of each bucket, anchored on the stored
+    account balances: balance(b) = stored - (total movement - running movement through b).
+    The running sums are SQL window functions, so Python only fills the axis.
+    """
+    # Collapse to one row per account and day first, so the bucket
+    # expression runs over days rather than every transaction.
+    income, expense = history(Income), history(Expense)
+    incomes = select(
+        income.account_id.label('account_id'),
+        income.date.label('day'),
+        func.sum(income.amount).label('amount')
+    ).where(income.user_id == user_id, income.account_id.isnot(None)).group_by(income.account_id, income.date)
+    expenses = select(
+        expense.account_id.label('account_id'),
+        expense.date.label('day'),
+        (-func.sum(expense.amount)).label('amount')
+    ).where(expense.user_id == user_id, expense.account_id.isnot(None)).group_by(expense.account_id, expense.date)
+    ledger = union_all(incomes, expenses).subquery()
+
+    bucket_key = bucket_expr(ledger.c.day, bucket)
+    per_bucket = select(
+        ledger.c.account_id,
+        bucket_key.label('bucket'),
+        func.sum(ledger.c.amount).label('net')
+    ).group_by(ledger.c.account_id, bucket_key).subquery()
+
+    total_net = func.sum(per_bucket.c.net).over(partition_by=per_bucket.c.account_id)
+    running_net = func.sum(per_bucket.c.net).over(
+        partition_by=per_bucket.c.account_id, order_by=per_bucket.c.bucket
+    )
+    rows = db.session.execute(
+        select(
+            per_bucket.c.account_id,
+            per_bucket.c.bucket,
+            per_bucket.c.net,
+            (Account.balance - (total_net - running_net)).label('balance')
+        ).join(Account, Account.id == per_bucket.c.account_id)
+        .where(Account.user_id == user_id)
+        .order_by(per_bucket.c.bucket)
+    ).all()
+
+    accounts = db.session.query(Account.id, Account.name, Account.balance).filter(
+        Account.user_id == user_id
+    ).order_by(Account.id).all()
+
+    by_account = {a.id: {} for a in accounts}
+    opening = {a.id: a.balance or 0 for a in accounts}
+    for account_id, bucket_key, net, balance in rows:
+        if not by_account[account_id]:
+            # Balance before the account's first movement
+            opening[account_id] = balance - net
+        by_account[account_id][bucket_key] = balance
+
+    today_bucket = bucket_start(date.today(), bucket)
+    if rows:
+        first = datetime.strptime(rows[0].bucket, '%Y-%m-%d').date()
+        last = max(datetime.strptime(rows[-1].bucket, '%Y-%m-%d').date(), today_bucket)
+    else:
+        first = last = today_bucket
+
+    labels = []
+    current = dict(opening)
+    series = {a.id: [] for a in accounts}
+    net_worth = []
+    d = first
+    while d <= last:
+        key = d.isoformat()
+        labels.append(key)
+        for a in accounts:
+            if key in by_account[a.id]:
+                current[a.id] = by_account[a.id][key]
+            series[a.id].append(float(current[a.id]))
+        net_worth.append(float(sum(current.values())))
+        d = next_bucket(d, bucket)
+
+    return {
+        'bucket': bucket,
+        'labels': labels,
+        'net_worth': net_worth,
+        'accounts': [{'id': a.id, 'name': a.name, 'balances': series[a.id]} for a in accounts]
+    }
+
+@networth_bp.route('/history', methods=['GET'])
+@token_required
+@etag_cached
+def get_networth_history(current_user_id):
+    """
+    Historical net worth (and per-account balances) per day, week or month
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: bucket
+        in: query
+        type: string
+        enum: [day, week, month]
+        default: month
+      - name: start_date
+        in: query
+        type: string
+        format: date
+        description: Only return buckets on or after this date
+    responses:
+      200:
+        description: Columnar series ready for charting
+      400:
+        description: Invalid bucket
+    """
+    bucket = request.args.get('bucket', 'month')
+    if bucket not in BUCKETS:
+        return jsonify({'message': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+
+    # The axis runs to today's bucket, so a new bucket starts a new entry
+    history = cached_for_version(current_user_id, ('networth', bucket, bucket_start(date.today(), bucket)),
+                                 lambda: compute_networth_history(current_user_id, bucket))
+
+    start_date = request.args.get('start_date')
+    if start_date:
+        try:
+            start_key = bucket_start(datetime.strptime(start_date, '%Y-%m-%d').date(), bucket).isoformat()
+        except ValueError:
+            return jsonify({'message': 'start_date must be a date (YYYY-MM-DD)'}), 400
+        skip = next((i for i, label in enumerate(history['labels']) if label >= start_key), len(history['labels']))
+        history = {
+            'bucket': bucket,
+            'labels': history['labels'][skip:],
+            'net_worth': history['net_worth'][skip:],
+            'accounts': [{**a, 'balances': a['balances'][skip:]} for a in history['accounts']]
+        }
+
+    return jsonify(history), 200
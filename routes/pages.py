@@ -1,31 +1,32 @@
-from flask import Blueprint, render_template
+from flask import Blueprint
+from assets import render_page
 
 pages_bp = Blueprint('pages', __name__)
 
 @pages_bp.route('/')
 def index():
-    return render_template('index.html')
+    return render_page('index.html')
 
 @pages_bp.route('/login')
 def login():
-    return render_template('login.html')
+    return render_page('login.html')
 
 @pages_bp.route('/transactions')
 def transactions():
-    return render_template('transactions.html')
+    return render_page('transactions.html')
 
 @pages_bp.route('/goals')
 def goals():
-    return render_template('goals.html')
+    return render_page('goals.html')
 
 @pages_bp.route('/settings')
 def settings():
-    return render_template('settings.html')
+    return render_page('settings.html')
     
 @pages_bp.route('/budget')
 def budget_page():
-    return render_template('budget.html')
+    return render_page('budget.html')
 
 @pages_bp.route('/forecast')
 def forecast_page():
-    return render_template('forecast.html')
+    return render_page('forecast.html')
@@ -0,0 +1,94 @@
+from flask import Blueprint, request, jsonify
+from routes.auth import token_required
+from fulltext import search_transactions
+from datetime import datetime
+import math
+
+search_bp = Blueprint('search', __name__, url_prefix='/api/transactions')
+
+MAX_PER_PAGE = 200
+
+def _amount(name):
+    if not request.args.get(name):
+        return None
+    value = float(request.args[name])
+    if not math.isfinite(value):
+        raise ValueError(f'{name} must be finite')
+    return value
+
+@search_bp.route('/search', methods=['GET'])
+@token_required
+def search(current_user_id):
+    """
+    Full-text search over expense descriptions and income sources
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+      - name: type
+        in: query
+        type: string
+        enum: [all, expense, income]
+      - name: start_date
+        in: query
+        type: string
+        format: date
+      - name: end_date
+        in: query
+        type: string
+        format: date
+      - name: min_amount
+        in: query
+        type: number
+      - name: max_amount
+        in: query
+        type: number
+      - name: category
+        in: query
+        type: string
+      - name: page
+        in: query
+        type: integer
+      - name: per_page
+        in: query
+        type: integer
+    responses:
+      200:
+        description: Ranked, paginated matches
+      400:
+        description: Invalid parameters
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'q is required'}), 400
+
+    kind = request.args.get('type', 'all')
+    if kind not in ('all', 'expense', 'income'):
+        return jsonify({'message': 'type must be all, expense or income'}), 400
+
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+        min_amount = _amount('min_amount')
+        max_amount = _amount('max_amount')
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), MAX_PER_PAGE)
+    except ValueError:
+        return jsonify({'message': 'Invalid date, amount or paging parameter'}), 400
+
+    # Fetch one extra row to know whether another page exists
+    results = search_transactions(
+        current_user_id, query, kind=kind, start_date=start_date, end_date=end_date,
+        min_amount=min_amount, max_amount=max_amount, category=request.args.get('category') or None,
+        limit=per_page + 1, offset=(page - 1) * per_page
+    )
+    return jsonify({
+        'results': results[:per_page],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(results) > per_page
+    }), 200
@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
-from models import db, User
+from models import db, User, to_money
 from functools import wraps
 from cryptography.fernet import Fernet
 import jwt
 import os
 import requests
 import base64
+import time
+from metrics import timed_stage, observe_stage
+from dedupe import max_ids, detect_after_ingest, is_merged_duplicate
+from classifier import classify_uncategorized
+from archive import is_archived
+from ledger import shift_checkpoints_many
+from jobs import start_job, NullProgress
 
 simplefin_bp = Blueprint('simplefin', __name__, url_prefix='/api/simplefin')
 
@@ -164,6 +171,187 @@ def disconnect(current_user_id):
     
     return jsonify({'message': 'SimpleFin disconnected'}), 200
 
+class SyncError(Exception):
+    """SimpleFin answered the accounts request with an error status."""
+
+    def __init__(self, status, details):
+        super().__init__(f'SimpleFin returned {status}: {details[:200]}')
+        self.status = status
+        self.details = details
+
+def run_sync(progress, user_id, access_url):
+    """
+    Fetch the last 30 days from SimpleFin and store new accounts and
+    transactions. Reports fetch, process (per account), classify, dedupe and
+    commit stages to progress. Each account is committed with its
+    transactions before its progress is written, so a failed sync keeps the
+    accounts already done (re-syncing skips them by simplefin_id).
+    """
+    from models import Income, Expense, Account
+    from datetime import datetime, timedelta
+    from utils import match_category, FALLBACK_CATEGORY
+
+    current_app.logger.info(f"[SimpleFin] Syncing with access URL: {access_url[:20]}...")
+
+    # Calculate date range (last 30 days)
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=30)
+
+    # SimpleFin access URL format: https://.../simplefin
+    # Append date range to get transactions embedded in accounts
+    # SimpleFin expects start-date and end-date params (sometimes start_date/end_date)
+    # Using standard 'start-date' based on common SimpleFin usage
+    accounts_url = f"{access_url}/accounts?start-date={int(start_date.timestamp())}&end-date={int(end_date.timestamp())}"
+
+    progress.stage('fetch')
+    with timed_stage('sync', 'fetch'):
+        response = requests.get(accounts_url, timeout=30)
+
+    current_app.logger.info(f"[SimpleFin] Sync response status: {response.status_code}")
+
+    if response.status_code != 200:
+        raise SyncError(response.status_code, response.text[:500] if response.text else 'No details')
+
+    data = response.json()
+    accounts = data.get('accounts', [])
+    synced_count = 0
+    synced_accounts = []
+
+    before_ids = max_ids()
+    process_start = time.perf_counter()
+    progress.stage('process', {'accounts': synced_accounts}, 0, len(accounts))
+    for account_data in accounts:
+        # 1. Upsert Account
+        acc_id = account_data.get('id')
+        acc_name = account_data.get('name') or 'Unnamed Account'
+        acc_currency = account_data.get('currency', 'USD')
+        acc_balance_str = account_data.get('balance', '0')
+
+        try:
+            acc_balance = to_money(acc_balance_str)
+        except:
+            acc_balance = 0
+
+        # Determine type guess
+        acc_type = 'checking'
+        lower_name = acc_name.lower()
+        if 'saving' in lower_name: acc_type = 'savings'
+        elif 'credit' in lower_name or 'card' in lower_name: acc_type = 'credit'
+        elif 'cash' in lower_name: acc_type = 'cash'
+        elif 'invest' in lower_name or 'broker' in lower_name: acc_type = 'investment'
+
+        db_account = Account.query.filter_by(simplefin_id=str(acc_id), user_id=user_id).first()
+        if not db_account:
+            db_account = Account(
+                user_id=user_id,
+                simplefin_id=str(acc_id),
+                name=acc_name,
+                balance=acc_balance,
+                type=acc_type,
+                is_manual=False,
+                last_synced=datetime.utcnow()
+            )
+            db.session.add(db_account)
+            db.session.flush() # Get ID
+        else:
+            db_account.balance = acc_balance
+            db_account.last_synced = datetime.utcnow()
+            db_account.name = acc_name # Update name if changed
+
+        # 2. Process Transactions
+        new_count = skipped_count = 0
+        checkpoint_deltas = {}
+        transactions = account_data.get('transactions', [])
+        for txn in transactions:
+            txn_id = txn.get('id')
+            if not txn_id:
+                continue
+
+            # Check if already exists in either table
+            existing_income = Income.query.filter_by(simplefin_id=txn_id).first()
+            existing_expense = Expense.query.filter_by(simplefin_id=txn_id).first()
+
+            if existing_income or existing_expense or is_merged_duplicate(user_id, txn_id) or is_archived(user_id, txn_id):
+                skipped_count += 1
+                continue
+
+            try:
+                amount = to_money(txn.get('amount', 0))
+            except:
+                continue
+
+            timestamp = txn.get('posted')
+            txn_date = datetime.fromtimestamp(timestamp) if timestamp else datetime.utcnow()
+            description = txn.get('payee') or txn.get('description') or 'Unknown Transaction'
+            if amount:
+                key = (db_account.id, txn_date.date())
+                checkpoint_deltas[key] = checkpoint_deltas.get(key, 0) + amount
+
+            if amount > 0:
+                # Income
+                new_income = Income(
+                    user_id=user_id,
+                    account_id=db_account.id, # Link to account
+                    amount=amount,
+                    source=description,
+                    date=txn_date,
+                    simplefin_id=txn_id
+                )
+                db.session.add(new_income)
+                new_count += 1
+
+            elif amount < 0:
+                # Expense
+                mapped_category = match_category(description, user_id)
+
+                new_expense = Expense(
+                    user_id=user_id,
+                    account_id=db_account.id, # Link to account
+                    amount=abs(amount),
+                    category=mapped_category or FALLBACK_CATEGORY,
+                    category_fallback=mapped_category is None,
+                    description=description,
+                    date=txn_date,
+                    simplefin_id=txn_id
+                )
+                db.session.add(new_expense)
+                new_count += 1
+        # The bank's balance (stored above) includes these; move the checkpoints with it
+        shift_checkpoints_many(db.session.connection(), checkpoint_deltas)
+        synced_count += new_count
+        synced_accounts.append({'id': db_account.id, 'name': acc_name, 'new': new_count, 'skipped': skipped_count})
+        db.session.commit()
+        progress.stage('process', {'accounts': synced_accounts}, len(synced_accounts), len(accounts))
+    observe_stage('sync', 'process', time.perf_counter() - process_start)
+
+    progress.stage('classify')
+    with timed_stage('sync', 'classify'):
+        classify_uncategorized(user_id, before_ids['expense'])
+        db.session.commit()
+    progress.stage('dedupe')
+    with timed_stage('sync', 'dedupe'):
+        possible_duplicates = detect_after_ingest(user_id, before_ids)
+
+    progress.stage('commit')
+    with timed_stage('sync', 'commit'):
+        db.session.commit()
+    current_app.logger.info(f"[SimpleFin] Synced {synced_count} new transactions")
+
+    return {
+        'message': 'Sync successful',
+        'accounts': accounts,
+        'synced_accounts': synced_accounts,
+        'new_transactions': synced_count,
+        'possible_duplicates': possible_duplicates,
+        'errors': data.get('errors', [])
+    }
+
+def sync_job(progress, user_id, access_url):
+    """run_sync as a background job; the raw SimpleFin accounts are left out of the stored result."""
+    result = run_sync(progress, user_id, access_url)
+    result.pop('accounts')
+    return result
+
 @simplefin_bp.route('/sync', methods=['POST'])
 @token_required  
 def sync_accounts(current_user_id):
@@ -172,9 +360,20 @@ def sync_accounts(current_user_id):
     ---
     security:
       - Bearer: []
+    parameters:
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: >
+          Run in the background and return the job at once; follow it with
+          GET /api/jobs/{id}/events (stages fetch, process with per-account
+          counts, classify, dedupe, commit)
     responses:
       200:
         description: Synced data from SimpleFin
+      202:
+        description: Sync started (or already running); body is the job
     """
     user = User.query.get(current_user_id)
     
@@ -187,141 +386,19 @@ def sync_accounts(current_user_id):
         
     if not access_url:
         return jsonify({'message': 'SimpleFin not connected'}), 401
-    
-    from models import Income, Expense, CategoryMapping
-    from datetime import datetime, timedelta
-    
+
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        job = start_job(current_user_id, 'simplefin_sync', sync_job, current_user_id, access_url)
+        return jsonify(job.to_dict()), 202
+
     try:
-        current_app.logger.info(f"[SimpleFin] Syncing with access URL: {access_url[:20]}...")
-        
-        # Calculate date range (last 30 days)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        # SimpleFin access URL format: https://.../simplefin
-        # Append date range to get transactions embedded in accounts
-        # SimpleFin expects start-date and end-date params (sometimes start_date/end_date)
-        # Using standard 'start-date' based on common SimpleFin usage
-        accounts_url = f"{access_url}/accounts?start-date={int(start_date.timestamp())}&end-date={int(end_date.timestamp())}"
-        
-        response = requests.get(accounts_url, timeout=30)
-        
-        current_app.logger.info(f"[SimpleFin] Sync response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            accounts = data.get('accounts', [])
-            synced_count = 0
-            
-            from models import Account
-
-            for account_data in accounts:
-                # 1. Upsert Account
-                acc_id = account_data.get('id')
-                acc_name = account_data.get('name') or 'Unnamed Account'
-                acc_currency = account_data.get('currency', 'USD')
-                acc_balance_str = account_data.get('balance', '0')
-                
-                try:
-                    acc_balance = float(acc_balance_str)
-                except:
-                    acc_balance = 0.0
-
-                # Determine type guess
-                acc_type = 'checking'
-                lower_name = acc_name.lower()
-                if 'saving' in lower_name: acc_type = 'savings'
-                elif 'credit' in lower_name or 'card' in lower_name: acc_type = 'credit'
-                elif 'cash' in lower_name: acc_type = 'cash'
-                elif 'invest' in lower_name or 'broker' in lower_name: acc_type = 'investment'
-
-                db_account = Account.query.filter_by(simplefin_id=str(acc_id), user_id=current_user_id).first()
-                if not db_account:
-                    db_account = Account(
-                        user_id=current_user_id,
-                        simplefin_id=str(acc_id),
-                        name=acc_name,
-                        balance=acc_balance,
-                        type=acc_type,
-                        is_manual=False,
-                        last_synced=datetime.utcnow()
-                    )
-                    db.session.add(db_account)
-                    db.session.flush() # Get ID
-                else:
-                    db_account.balance = acc_balance
-                    db_account.last_synced = datetime.utcnow()
-                    db_account.name = acc_name # Update name if changed
-                
-                # 2. Process Transactions
-                transactions = account_data.get('transactions', [])
-                for txn in transactions:
-                    txn_id = txn.get('id')
-                    if not txn_id: 
-                        continue
-                        
-                    # Check if already exists in either table
-                    existing_income = Income.query.filter_by(simplefin_id=txn_id).first()
-                    existing_expense = Expense.query.filter_by(simplefin_id=txn_id).first()
-                    
-                    if existing_income or existing_expense:
-                        continue
-                        
-                    try:
-                        amount = float(txn.get('amount', 0))
-                    except:
-                        continue
-                        
-                    timestamp = txn.get('posted')
-                    txn_date = datetime.fromtimestamp(timestamp) if timestamp else datetime.utcnow()
-                    description = txn.get('payee') or txn.get('description') or 'Unknown Transaction'
-                    
-                    if amount > 0:
-                        # Income
-                        new_income = Income(
-                            user_id=current_user_id,
-                            account_id=db_account.id, # Link to account
-                            amount=amount,
-                            source=description,
-                            date=txn_date,
-                            simplefin_id=txn_id
-                        )
-                        db.session.add(new_income)
-                        synced_count += 1
-                        
-                    elif amount < 0:
-                        # Expense
-                        from utils import auto_categorize
-                        mapped_category = auto_categorize(description, current_user_id)
-                        
-                        new_expense = Expense(
-                            user_id=current_user_id,
-                            account_id=db_account.id, # Link to account
-                            amount=abs(amount),
-                            category=mapped_category, 
-                            description=description,
-                            date=txn_date,
-                            simplefin_id=txn_id
-                        )
-                        db.session.add(new_expense)
-                        synced_count += 1
-            
-            db.session.commit()
-            current_app.logger.info(f"[SimpleFin] Synced {synced_count} new transactions")
-            
-            return jsonify({
-                'message': 'Sync successful',
-                'accounts': accounts,
-                'new_transactions': synced_count,
-                'errors': data.get('errors', [])
-            }), 200
-        else:
-            return jsonify({
-                'message': 'Failed to sync',
-                'status': response.status_code,
-                'details': response.text[:500] if response.text else 'No details'
-            }), response.status_code
-            
+        return jsonify(run_sync(NullProgress(), current_user_id, access_url)), 200
+    except SyncError as e:
+        return jsonify({
+            'message': 'Failed to sync',
+            'status': e.status,
+            'details': e.details
+        }), e.status
     except Exception as e:
         current_app.logger.error(f"[SimpleFin] Sync error: {str(e)}")
         db.session.rollback()
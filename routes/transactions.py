@@ -1,11 +1,137 @@
 from flask import Blueprint, request, jsonify
-from models import db, Income, Expense, CategoryMapping
+from models import db, Income, Expense, Account, CategoryMapping, bump_data_version, to_money
 from routes.auth import token_required
+from utils import etag_cached, learn_category_mappings, normalize_merchant
+from ledger import adjust_balance, post_to_account, shift_checkpoints_many
+from bulk import run_bulk, BulkError, ArchivedRowsError
+import classifier
+from archive import history, is_archived_row
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from decimal import InvalidOperation
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/api')
 
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def _list_rows(model, user_id):
+    """List-endpoint rows for the start_date/end_date query args, spanning archived history if needed."""
+    start = _parse_date(request.args.get('start_date'))
+    end = _parse_date(request.args.get('end_date'))
+    source = history(model, start)
+    query = db.session.query(*model.list_columns(source)).filter(source.user_id == user_id)
+    if start:
+        query = query.filter(source.date >= start)
+    if end:
+        query = query.filter(source.date <= end)
+    return query.all()
+
+MAX_BATCH_SIZE = 1000
+
+# kind -> (model, required text field, sign of the balance change)
+BATCH_KINDS = {
+    'expense': (Expense, 'category', -1),
+    'income': (Income, 'source', 1),
+}
+
+
+def _is_id(value):
+    # bool is an int subclass; True must not pass as account 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_batch(items, current_user_id, kind):
+    """Check every item before anything is written. Returns (rows, errors)."""
+    model, required, _ = BATCH_KINDS[kind]
+    rows, errors = [], []
+    today = datetime.utcnow().date()
+
+    account_ids = {i.get('account_id') for i in items if isinstance(i, dict) and i.get('account_id')}
+    owned = set()
+    if account_ids:
+        owned = {a for (a,) in db.session.query(Account.id).filter(
+            Account.user_id == current_user_id, Account.id.in_([a for a in account_ids if _is_id(a)])
+        )}
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'error': 'Item must be an object'})
+            continue
+        try:
+            amount = to_money(item['amount'])
+            if not amount.is_finite() or amount <= 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            errors.append({'index': index, 'error': 'amount must be a positive number'})
+            continue
+        text = item.get(required)
+        if not isinstance(text, str) or not text.strip():
+            errors.append({'index': index, 'error': f'{required} is required'})
+            continue
+        try:
+            day = datetime.strptime(item['date'], '%Y-%m-%d').date() if item.get('date') else today
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'error': 'date must be YYYY-MM-DD'})
+            continue
+        account_id = item.get('account_id')
+        if account_id is not None and not (_is_id(account_id) and account_id in owned):
+            errors.append({'index': index, 'error': 'Account not found'})
+            continue
+        description = item.get('description')
+        if kind == 'expense' and description is not None and not isinstance(description, str):
+            errors.append({'index': index, 'error': 'description must be a string'})
+            continue
+
+        row = {'user_id': current_user_id, 'amount': amount, required: text, 'date': day,
+               'account_id': account_id or None}
+        if kind == 'expense':
+            row['description'] = description or ''
+        rows.append(row)
+    return rows, errors
+
+
+def _create_batch(current_user_id, kind):
+    data = request.get_json(silent=True)
+    items = data if isinstance(data, list) else (data or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Expected a non-empty array of items'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'message': f'At most {MAX_BATCH_SIZE} items per batch'}), 400
+
+    rows, errors = _validate_batch(items, current_user_id, kind)
+    if errors:
+        return jsonify({'message': 'Validation failed; nothing was saved', 'errors': errors}), 400
+
+    model, _, sign = BATCH_KINDS[kind]
+    ids = db.session.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows).scalars().all()
+
+    # Core-level writes skip the flush hooks: apply net balance and checkpoint
+    # changes once per account (and per account and date), then bump the version.
+    balance_deltas, checkpoint_deltas = {}, {}
+    for row in rows:
+        if row['account_id']:
+            delta = sign * row['amount']
+            balance_deltas[row['account_id']] = balance_deltas.get(row['account_id'], 0) + delta
+            key = (row['account_id'], row['date'])
+            checkpoint_deltas[key] = checkpoint_deltas.get(key, 0) + delta
+    connection = db.session.connection()
+    for account_id, delta in balance_deltas.items():
+        adjust_balance(connection, account_id, delta)
+    shift_checkpoints_many(connection, checkpoint_deltas)
+
+    if kind == 'expense':
+        learn_category_mappings(current_user_id, [(r['description'], r['category']) for r in rows])
+        classifier.learn(current_user_id, [(r['description'], r['category'], None) for r in rows])
+    bump_data_version(current_user_id)
+    db.session.commit()
+    return jsonify({'message': f'Added {len(ids)} {kind}s', 'ids': ids}), 201
+
 @transactions_bp.route('/incomes', methods=['POST'])
 @token_required
 def add_income(current_user_id):
@@ -31,8 +157,12 @@ def add_income(current_user_id):
     responses:
       201:
         description: Income added
+      404:
+        description: account_id is not one of the user's accounts
     """
     data = request.get_json()
+    if data.get('account_id') and not Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first():
+        return jsonify({'message': 'Account not found'}), 404
     new_income = Income(
         user_id=current_user_id,
         amount=data['amount'],
@@ -43,28 +173,68 @@ def add_income(current_user_id):
     db.session.add(new_income)
     
     if data.get('account_id'):
-        from models import Account
-        account = Account.query.get(data['account_id'])
-        if account and account.user_id == current_user_id:
-            account.balance = float(account.balance) + float(data['amount'])
+        post_to_account(db.session.connection(), data['account_id'], new_income.date, to_money(data['amount']))
             
     db.session.commit()
     return jsonify({'message': 'Income added'}), 201
 
+@transactions_bp.route('/incomes/batch', methods=['POST'])
+@token_required
+def add_incomes_batch(current_user_id):
+    """
+    Add many incomes in one request
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              amount:
+                type: number
+              source:
+                type: string
+              date:
+                type: string
+                format: date
+              account_id:
+                type: integer
+    responses:
+      201:
+        description: Incomes added; ids in input order
+      400:
+        description: Validation errors by item index; nothing was saved
+    """
+    return _create_batch(current_user_id, 'income')
+
 @transactions_bp.route('/incomes', methods=['GET'])
 @token_required
 def get_incomes(current_user_id):
     """
-    Get all incomes for user
+    Get all incomes for user (optionally within a date range)
     ---
     security:
       - Bearer: []
+    parameters:
+      - name: start_date
+        in: query
+        type: string
+        format: date
+      - name: end_date
+        in: query
+        type: string
+        format: date
     responses:
       200:
         description: List of incomes
     """
-    incomes = Income.query.filter_by(user_id=current_user_id).all()
-    return jsonify([i.to_dict() for i in incomes]), 200
+    rows = _list_rows(Income, current_user_id)
+    return jsonify([r._asdict() for r in rows]), 200
 
 @transactions_bp.route('/expenses', methods=['POST'])
 @token_required
@@ -93,8 +263,12 @@ def add_expense(current_user_id):
     responses:
       201:
         description: Expense added
+      404:
+        description: account_id is not one of the user's accounts
     """
     data = request.get_json()
+    if data.get('account_id') and not Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first():
+        return jsonify({'message': 'Account not found'}), 404
     description = data.get('description', '')
     category = data['category']
     
@@ -109,14 +283,11 @@ def add_expense(current_user_id):
     db.session.add(new_expense)
     
     if data.get('account_id'):
-        from models import Account
-        account = Account.query.get(data['account_id'])
-        if account and account.user_id == current_user_id:
-            account.balance = float(account.balance) - float(data['amount'])
+        post_to_account(db.session.connection(), data['account_id'], new_expense.date, -to_money(data['amount']))
     
     # Learn categorization if description is provided
     if description:
-        keyword = description.lower().strip()
+        keyword = normalize_merchant(description)
         existing_mapping = CategoryMapping.query.filter_by(
             user_id=current_user_id, 
             keyword=keyword
@@ -135,27 +306,74 @@ def add_expense(current_user_id):
                 category=category
             )
             db.session.add(new_mapping)
+        classifier.learn(current_user_id, [(description, category, None)])
     
     db.session.commit()
     return jsonify({'message': 'Expense added'}), 201
 
+@transactions_bp.route('/expenses/batch', methods=['POST'])
+@token_required
+def add_expenses_batch(current_user_id):
+    """
+    Add many expenses in one request
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              amount:
+                type: number
+              category:
+                type: string
+              description:
+                type: string
+              date:
+                type: string
+                format: date
+              account_id:
+                type: integer
+    responses:
+      201:
+        description: Expenses added; ids in input order
+      400:
+        description: Validation errors by item index; nothing was saved
+    """
+    return _create_batch(current_user_id, 'expense')
+
 @transactions_bp.route('/expenses', methods=['GET'])
 @token_required
 def get_expenses(current_user_id):
     """
-    Get all expenses for user
+    Get all expenses for user (optionally within a date range)
     ---
     security:
       - Bearer: []
+    parameters:
+      - name: start_date
+        in: query
+        type: string
+        format: date
+      - name: end_date
+        in: query
+        type: string
+        format: date
     responses:
       200:
         description: List of expenses
     """
-    expenses = Expense.query.filter_by(user_id=current_user_id).all()
-    return jsonify([e.to_dict() for e in expenses]), 200
+    rows = _list_rows(Expense, current_user_id)
+    return jsonify([r._asdict() for r in rows]), 200
 
 @transactions_bp.route('/summary', methods=['GET'])
 @token_required
+@etag_cached
 def get_summary(current_user_id):
     """
     Get financial summary (supports date filtering)
@@ -175,33 +393,18 @@ def get_summary(current_user_id):
       200:
         description: Summary of finances
     """
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-
-    income_query = Income.query.filter_by(user_id=current_user_id)
-    expense_query = Expense.query.filter_by(user_id=current_user_id)
+    dt_start = _parse_date(request.args.get('start_date'))
+    dt_end = _parse_date(request.args.get('end_date'))
 
-    if start_date:
-        try:
-            dt_start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            income_query = income_query.filter(Income.date >= dt_start)
-            expense_query = expense_query.filter(Expense.date >= dt_start)
-        except ValueError:
-            pass
-            
-    if end_date:
-        try:
-            dt_end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            income_query = income_query.filter(Income.date <= dt_end)
-            expense_query = expense_query.filter(Expense.date <= dt_end)
-        except ValueError:
-            pass
-
-    incomes = income_query.all()
-    expenses = expense_query.all()
-    
-    total_income = sum(i.amount for i in incomes)
-    total_expense = sum(e.amount for e in expenses)
+    totals = []
+    for model in (history(Income, dt_start), history(Expense, dt_start)):
+        query = db.session.query(func.sum(model.amount)).filter(model.user_id == current_user_id)
+        if dt_start:
+            query = query.filter(model.date >= dt_start)
+        if dt_end:
+            query = query.filter(model.date <= dt_end)
+        totals.append(query.scalar() or 0)
+    total_income, total_expense = totals
     
     return jsonify({
         'total_income': total_income,
@@ -237,17 +440,26 @@ def update_expense(current_user_id, expense_id):
     responses:
       200:
         description: Expense updated
+      404:
+        description: Expense not found
+      409:
+        description: The expense is archived and read-only
     """
     expense = Expense.query.filter_by(id=expense_id, user_id=current_user_id).first()
     if not expense:
+        if is_archived_row(Expense, current_user_id, expense_id):
+            return jsonify({'message': 'Expense is archived and read-only'}), 409
         return jsonify({'message': 'Expense not found'}), 404
         
     data = request.get_json()
     
     if 'category' in data:
+        previous_category = expense.category
         expense.category = data['category']
+        expense.category_fallback = False
         if expense.description:
-            keyword = expense.description.lower().strip()
+            classifier.learn(current_user_id, [(expense.description, data['category'], previous_category)])
+            keyword = normalize_merchant(expense.description)
             mapping = CategoryMapping.query.filter_by(user_id=current_user_id, keyword=keyword).first()
             if mapping:
                 mapping.category = data['category']
@@ -268,6 +480,7 @@ def update_expense(current_user_id, expense_id):
 
 @transactions_bp.route('/expenses/by-category', methods=['GET'])
 @token_required
+@etag_cached
 def get_expenses_by_category(current_user_id):
     """
     Get expense breakdown by category (supports date filtering)
@@ -287,33 +500,17 @@ def get_expenses_by_category(current_user_id):
       200:
         description: Category breakdown with amounts
     """
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    dt_start = _parse_date(request.args.get('start_date'))
+    dt_end = _parse_date(request.args.get('end_date'))
 
-    query = Expense.query.filter_by(user_id=current_user_id)
+    source = history(Expense, dt_start)
+    query = db.session.query(source.category, func.sum(source.amount)).filter(source.user_id == current_user_id)
+    if dt_start:
+        query = query.filter(source.date >= dt_start)
+    if dt_end:
+        query = query.filter(source.date <= dt_end)
 
-    if start_date:
-        try:
-            dt_start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(Expense.date >= dt_start)
-        except ValueError:
-            pass
-            
-    if end_date:
-        try:
-            dt_end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.filter(Expense.date <= dt_end)
-        except ValueError:
-            pass
-
-    expenses = query.all()
-    breakdown = {}
-    for expense in expenses:
-        if expense.category in breakdown:
-            breakdown[expense.category] += expense.amount
-        else:
-            breakdown[expense.category] = expense.amount
-    
+    breakdown = {category: total for category, total in query.group_by(source.category).all()}
     return jsonify(breakdown), 200
 
 @transactions_bp.route('/expenses/bulk-update', methods=['POST'])
@@ -340,6 +537,8 @@ def bulk_update_expenses(current_user_id):
     responses:
       200:
         description: Expenses updated successfully
+      409:
+        description: Some of the expenses are archived and read-only
     """
     data = request.get_json()
     expense_ids = data.get('ids', [])
@@ -348,9 +547,114 @@ def bulk_update_expenses(current_user_id):
     if not expense_ids or not new_category:
         return jsonify({'message': 'Missing IDs or category'}), 400
 
-    Expense.query.filter(Expense.user_id == current_user_id, Expense.id.in_(expense_ids)).update(
-        {Expense.category: new_category}, synchronize_session=False
-    )
+    try:
+        affected = run_bulk('expense', current_user_id, 'recategorize', {'ids': expense_ids}, {'category': new_category})
+    except BulkError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 409 if isinstance(e, ArchivedRowsError) else 400
     db.session.commit()
 
-    return jsonify({'message': f'Updated {len(expense_ids)} expenses successfully'}), 200
+    return jsonify({'message': f'Updated {affected} expenses successfully'}), 200
+
+def _bulk_mutation(current_user_id, kind):
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run'))
+    try:
+        affected = run_bulk(kind, current_user_id, data.get('action'), data.get('filter'), data, dry_run=dry_run)
+    except BulkError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 409 if isinstance(e, ArchivedRowsError) else 400
+    if not dry_run:
+        db.session.commit()
+    return jsonify({'action': data.get('action'), 'affected': affected, 'dry_run': dry_run}), 200
+
+@transactions_bp.route('/expenses/bulk', methods=['POST'])
+@token_required
+def bulk_mutate_expenses(current_user_id):
+    """
+    Recategorize, delete, move or re-date every expense matching a filter
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            action:
+              type: string
+              enum: [recategorize, delete, move_account, redate]
+            filter:
+              type: object
+              description: start_date, end_date, description (substring, * wildcard), category, account_id (null = unlinked), ids
+            category:
+              type: string
+              description: New category (recategorize)
+            account_id:
+              type: integer
+              description: Target account, or null to unlink (move_account)
+            date:
+              type: string
+              format: date
+              description: New date (redate)
+            shift_days:
+              type: integer
+              description: Days to move each date by (redate)
+            dry_run:
+              type: boolean
+              description: Only count matching rows
+    responses:
+      200:
+        description: Number of rows affected (or matched, for a dry run)
+      400:
+        description: Invalid filter or action
+      409:
+        description: The filter matches archived (read-only) rows
+    """
+    return _bulk_mutation(current_user_id, 'expense')
+
+@transactions_bp.route('/incomes/bulk', methods=['POST'])
+@token_required
+def bulk_mutate_incomes(current_user_id):
+    """
+    Delete, move or re-date every income matching a filter
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            action:
+              type: string
+              enum: [delete, move_account, redate]
+            filter:
+              type: object
+              description: start_date, end_date, description (matches source; substring, * wildcard), account_id (null = unlinked), ids
+            account_id:
+              type: integer
+              description: Target account, or null to unlink (move_account)
+            date:
+              type: string
+              format: date
+              description: New date (redate)
+            shift_days:
+              type: integer
+              description: Days to move each date by (redate)
+            dry_run:
+              type: boolean
+              description: Only count matching rows
+    responses:
+      200:
+        description: Number of rows affected (or matched, for a dry run)
+      400:
+        description: Invalid filter or action
+      409:
+        description: The filter matches archived (read-only) rows
+    """
+    return _bulk_mutation(current_user_id, 'income')
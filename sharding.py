@@ -0,0 +1,210 @@
+"""
+Optional per-user database sharding.
+
+With SHARDING on, the main database (SQLALCHEMY_DATABASE_URI) becomes a
+small directory holding only the user table, and each user's data lives in
+its own SQLite file, SHARD_DIR/user_<id>.db. A long import or sync then only
+locks its own user's file instead of every user's writes.
+
+db.session is routed per session: token_required calls use_shard() with the
+authenticated user id, after which queries on the user table go to the
+directory and everything else to that user's file. Background jobs route
+their session the same way. A session pins its shard engine on first use,
+so one transaction never spans two connections to the same file.
+
+Shard engines are opened on demand and kept in an LRU of at most
+SHARD_MAX_OPEN entries, each pooling a single idle connection; the least
+recently used engine is disposed when the cap is exceeded. A shard's schema
+is created or upgraded the first time this process opens it.
+
+`flask split-shards` copies an existing shared database into per-user files.
+"""
+from models import db, User
+from flask import current_app
+from sqlalchemy import create_engine, inspect, select, Table, Select
+from sqlalchemy.sql.dml import UpdateBase
+from collections import OrderedDict
+import threading
+import click
+import os
+import re
+
+# Tables that stay in the directory database; every other table is per user
+DIRECTORY_TABLES = {'user'}
+
+# Per-database bookkeeping that split-shards does not copy
+NOT_COPIED = {'schema_migration', 'change_log', 'change_horizon'}
+
+DEFAULT_MAX_OPEN = 32
+COPY_CHUNK_SIZE = 1000
+
+_SHARD_FILE = re.compile(r'^user_(\d+)\.db$')
+
+
+def directory_tables():
+    return [t for t in db.metadata.sorted_tables if t.name in DIRECTORY_TABLES or t.name == 'schema_migration']
+
+
+def shard_tables():
+    return [t for t in db.metadata.sorted_tables if t.name not in DIRECTORY_TABLES]
+
+
+def _tables(mapper, clause):
+    if mapper is not None:
+        return [inspect(mapper).local_table]
+    if isinstance(clause, Table):
+        return [clause]
+    if isinstance(clause, UpdateBase):
+        return [clause.table]
+    if isinstance(clause, Select):
+        return list(clause.get_final_froms())
+    return []
+
+
+class ShardRouter:
+    """Opens, caches and prepares per-user engines; picks the bind for a session."""
+
+    def __init__(self, app):
+        self.app = app
+        self.directory = app.config.get('SHARD_DIR') or os.path.join(app.instance_path, 'shards')
+        self.max_open = int(app.config.get('SHARD_MAX_OPEN') or DEFAULT_MAX_OPEN)
+        self._engines = OrderedDict()
+        self._prepared = set()
+        self._lock = threading.Lock()
+
+    def path(self, user_id):
+        return os.path.join(self.directory, f'user_{int(user_id)}.db')
+
+    def user_ids(self):
+        """Ids of users that have a shard file."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(m.group(1)) for m in map(_SHARD_FILE.match, os.listdir(self.directory)) if m)
+
+    def engine(self, user_id, force=False):
+        """The user's engine, opened (and its schema prepared) if needed."""
+        with self._lock:
+            engine = self._engines.get(user_id)
+            if engine is not None and not force:
+                self._engines.move_to_end(user_id)
+                return engine
+            if engine is None:
+                os.makedirs(self.directory, exist_ok=True)
+                engine = create_engine(f'sqlite:///{self.path(user_id)}', pool_size=1)
+                self._engines[user_id] = engine
+            if force or user_id not in self._prepared:
+                from startup import prepare_database
+                prepare_database(self.app, engine, shard_tables(), force=force)
+                self._prepared.add(user_id)
+            while len(self._engines) > self.max_open:
+                # Sessions that pinned the evicted engine keep their connection until they end
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+
+    def close(self, user_id=None):
+        """Dispose one user's engine (or all of them)."""
+        with self._lock:
+            ids = list(self._engines) if user_id is None else [user_id]
+            for uid in ids:
+                engine = self._engines.pop(uid, None)
+                if engine is not None:
+                    engine.dispose()
+                self._prepared.discard(uid)
+
+    def bind_for(self, session, mapper, clause):
+        """Engine for a session's statement; None means the directory (default) engine."""
+        tables = _tables(mapper, clause)
+        if tables and all(t.name in DIRECTORY_TABLES for t in tables):
+            return None
+        user_id = session.info.get('shard')
+        if user_id is None:
+            if mapper is None and clause is None:
+                return None
+            raise RuntimeError('Per-user data queried before use_shard() selected a user')
+        engine = session.info.get('shard_engine')
+        if engine is None:
+            engine = session.info['shard_engine'] = self.engine(user_id)
+        return engine
+
+
+def use_shard(user_id):
+    """Route db.session to this user's database. No-op unless sharding is on."""
+    if 'shards' not in current_app.extensions:
+        return
+    session = db.session()
+    if session.info.get('shard') == user_id:
+        return
+    if session.info.get('shard') is not None:
+        session.close()
+    session.info['shard'] = user_id
+    session.info.pop('shard_engine', None)
+
+
+def each_shard(user_id=None):
+    """
+    Yield user ids for a maintenance command, routing db.session to each one's
+    database in turn and committing after each. Without sharding, yields
+    user_id once (None meaning every user, in the one shared database).
+    """
+    if 'shards' not in current_app.extensions:
+        yield user_id
+        return
+    user_ids = [user_id] if user_id else [uid for (uid,) in db.session.query(User.id).order_by(User.id)]
+    for uid in user_ids:
+        use_shard(uid)
+        yield uid
+        db.session.commit()
+
+
+def split_user(router, source, user_id, replace=False):
+    """Copy one user's rows from the source engine into their shard. Returns rows copied, or None if skipped."""
+    path = router.path(user_id)
+    if os.path.exists(path):
+        if not replace:
+            return None
+        router.close(user_id)
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    target = router.engine(user_id)
+    source_tables = set(inspect(source).get_table_names())
+    copied = 0
+    with source.connect() as src, target.begin() as dst:
+        from changes import reset_horizon
+        for table in shard_tables():
+            # The shard's change log is rebuilt by its triggers as rows arrive
+            if table.name in NOT_COPIED or table.name not in source_tables:
+                continue
+            query = select(table)
+            if 'user_id' in table.c:
+                query = query.where(table.c.user_id == user_id)
+            result = src.execution_options(yield_per=COPY_CHUNK_SIZE).execute(query)
+            for rows in result.partitions():
+                dst.execute(table.insert(), [dict(r._mapping) for r in rows])
+                copied += len(rows)
+        reset_horizon(dst, user_id)
+    return copied
+
+
+def init_sharding(app):
+    """Install the shard router when SHARDING is on and register the split-shards CLI command."""
+    if app.config.get('SHARDING'):
+        app.extensions['shards'] = ShardRouter(app)
+
+    @app.cli.command('split-shards')
+    @click.option('--user-id', type=int, default=None, help='Only split out this user')
+    @click.option('--replace', is_flag=True, help='Overwrite shard files that already exist')
+    def split_shards_command(user_id, replace):
+        """Copy each user's data from the shared database into a per-user shard file."""
+        router = app.extensions.get('shards') or ShardRouter(app)
+        source = db.engine
+        user_ids = [user_id] if user_id else [uid for (uid,) in db.session.query(User.id).order_by(User.id)]
+        for uid in user_ids:
+            copied = split_user(router, source, uid, replace=replace)
+            if copied is None:
+                click.echo(f'user {uid}: {router.path(uid)} exists, skipped (use --replace)')
+            else:
+                click.echo(f'user {uid}: {copied} rows -> {router.path(uid)}')
+        if not app.config.get('SHARDING'):
+            click.echo('Set SHARDING=1 to serve from the shard files; the shared database is left unchanged.')
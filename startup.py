@@ -0,0 +1,276 @@
+"""
+Fast application start.
+
+create_app runs in every gunicorn worker (or once in the master with
+preload_app) and on every launch of the desktop build, so it is kept short:
+
+- The schema is checked with one PRAGMA read. SQLite's user_version holds a
+  fingerprint of the models and full-text DDL; create_all, index creation,
+  data migrations and FTS setup only run when it differs (or via `flask init-db`).
+- With FAST_START, Flasgger is imported and /apidocs built on first request.
+- Mappers, the URL map and Jinja templates are prepared up front so that,
+  with preload_app, forked workers share them instead of each building them
+  on their first request.
+
+Phase timings are logged and kept in app.config['STARTUP_TIMINGS'].
+"""
+from flask import Flask
+from models import db, ensure_indexes, to_money, Money, SchemaMigration, Income, Expense, ExpenseArchive, Job, User
+from fulltext import FTS_SOURCES, init_fulltext, fts_available, _ddl
+from changes import CHANGE_SOURCES, init_change_triggers, trigger_ddl
+from sqlalchemy import text, inspect
+from sqlalchemy.orm import configure_mappers
+from contextlib import contextmanager
+import threading
+import zlib
+import click
+import time
+
+
+def schema_fingerprint(tables=None):
+    """31-bit checksum of every table, column, index and FTS statement (of `tables`, if given)."""
+    tables = tables or db.metadata.sorted_tables
+    names = {t.name for t in tables}
+    parts = []
+    for table in tables:
+        parts.append(table.name)
+        parts.extend(f'{c.name}:{c.type!r}:{c.nullable}' for c in table.columns)
+        parts.extend(sorted(f'{i.name}:{[c.name for c in i.columns]}' for i in table.indexes))
+    for table, column in FTS_SOURCES.items():
+        if table in names:
+            parts.extend(_ddl(table, column))
+    if 'change_log' in names:
+        for table in CHANGE_SOURCES:
+            parts.extend(trigger_ddl(table))
+    return zlib.crc32('\n'.join(parts).encode()) & 0x7fffffff
+
+
+def migrate_money_to_cents(connection):
+    """Rewrite every Money column from decimal amounts to integer cents."""
+    if connection.dialect.name == 'sqlite':
+        # Stored values are REAL (or TEXT); round from their shortest repr, not the binary float
+        connection.connection.driver_connection.create_function(
+            'to_cents', 1, lambda v: None if v is None else int(to_money(v).scaleb(2)), deterministic=True)
+        expression = 'to_cents({column})'
+    else:
+        expression = 'ROUND({column} * 100)'
+    for table in db.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, Money):
+                connection.execute(text(
+                    f'UPDATE "{table.name}" SET "{column.name}" = {expression.format(column=column.name)}'
+                ))
+
+
+def migrate_autoincrement_ids(connection):
+    """Rebuild the expense and income tables with AUTOINCREMENT ids (SQLite only)."""
+    if connection.dialect.name != 'sqlite':
+        return
+    for table in (Expense.__table__, Income.__table__):
+        ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE type='table' AND name=:name"),
+                                 {'name': table.name}).scalar()
+        if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+            continue
+        old = f'_{table.name}_old'
+        # Renaming would carry the FTS triggers and indexes along; drop them (init_fulltext recreates the triggers)
+        for kind, name in connection.execute(text(
+                "SELECT type, name FROM sqlite_master WHERE tbl_name=:name AND "
+                "(type='trigger' OR (type='index' AND sql IS NOT NULL))"), {'name': table.name}).all():
+            connection.execute(text(f'DROP {kind.upper()} "{name}"'))
+        connection.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old}"'))
+        table.create(connection)
+        # Columns added by later migrations keep their defaults
+        present = {c['name'] for c in inspect(connection).get_columns(old)}
+        columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name in present)
+        connection.execute(text(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old}"'))
+        connection.execute(text(f'DROP TABLE "{old}"'))
+
+
+def migrate_job_stage_columns(connection):
+    """Add the stage and detail progress columns to an existing job table."""
+    existing = inspect(connection)
+    if not existing.has_table('job'):
+        return
+    columns = {c['name'] for c in existing.get_columns('job')}
+    for column in ('stage', 'detail'):
+        if column not in columns:
+            ddl = Job.__table__.c[column].type.compile(connection.dialect)
+            connection.execute(text(f'ALTER TABLE job ADD COLUMN {column} {ddl}'))
+
+
+def migrate_user_admin_flag(connection):
+    """Add the is_admin column to an existing user table (only the directory has one when sharded)."""
+    existing = inspect(connection)
+    if not existing.has_table('user'):
+        return
+    if 'is_admin' not in {c['name'] for c in existing.get_columns('user')}:
+        ddl = User.__table__.c.is_admin.type.compile(connection.dialect)
+        connection.execute(text(f'ALTER TABLE "user" ADD COLUMN is_admin {ddl} NOT NULL DEFAULT 0'))
+
+
+def migrate_expense_category_fallback(connection):
+    """
+    Add category_fallback to the expense tables and set it on imported or synced
+    rows still in 'Other'; manual entries in 'Other' are taken as chosen.
+    """
+    existing = inspect(connection)
+    for table in (Expense.__table__, ExpenseArchive.__table__):
+        if not existing.has_table(table.name):
+            continue
+        if 'category_fallback' not in {c['name'] for c in existing.get_columns(table.name)}:
+            ddl = table.c.category_fallback.type.compile(connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN category_fallback {ddl} NOT NULL DEFAULT 0'))
+        connection.execute(text(
+            f"UPDATE {table.name} SET category_fallback = 1 WHERE category = 'Other' AND simplefin_id IS NOT NULL"
+        ))
+
+
+# Applied in order, once per database; a new database starts with all of them applied
+MIGRATIONS = [
+    ('money_to_cents', migrate_money_to_cents),
+    ('autoincrement_ids', migrate_autoincrement_ids),
+    ('job_stage_columns', migrate_job_stage_columns),
+    ('user_admin_flag', migrate_user_admin_flag),
+    ('expense_category_fallback', migrate_expense_category_fallback),
+]
+
+
+def run_migrations(engine, fresh):
+    """Apply pending MIGRATIONS, each in its own transaction. Returns the names applied."""
+    applied = []
+    with engine.begin() as conn:
+        done = set(conn.execute(db.select(SchemaMigration.name)).scalars())
+    for name, migrate in MIGRATIONS:
+        if name in done:
+            continue
+        with engine.begin() as conn:
+            if not fresh:
+                migrate(conn)
+                applied.append(name)
+            conn.execute(SchemaMigration.__table__.insert().values(name=name))
+    return applied
+
+
+def prepare_database(app, engine, tables=None, force=False):
+    """
+    Create or upgrade one database holding `tables` (default: all) unless its
+    stamped fingerprint matches. Returns True if it ran.
+    """
+    tables = tables or db.metadata.sorted_tables
+    sqlite = engine.dialect.name == 'sqlite'
+    fingerprint = schema_fingerprint(tables)
+    if sqlite and not force:
+        with engine.connect() as conn:
+            if conn.execute(text('PRAGMA user_version')).scalar() == fingerprint:
+                return False
+    existing = inspect(engine)
+    fresh = not any(existing.has_table(t.name) for t in tables)
+    db.metadata.create_all(engine, tables=tables)
+    ensure_indexes(engine, tables)
+    for name in run_migrations(engine, fresh):
+        app.logger.info(f'Applied data migration {name} to {engine.url.database}')
+    if any(t.name in FTS_SOURCES for t in tables):
+        init_fulltext(app, engine)
+    if sqlite and 'change_log' in {t.name for t in tables}:
+        init_change_triggers(app, engine)
+    if sqlite:
+        with engine.begin() as conn:
+            conn.execute(text(f'PRAGMA user_version = {fingerprint}'))
+    return True
+
+
+def ensure_schema(app, force=False):
+    """Create or upgrade the main database (just the user directory when sharded). Returns True if it ran."""
+    with app.app_context():
+        tables = None
+        if 'shards' in app.extensions:
+            from sharding import directory_tables
+            tables = directory_tables()
+        return prepare_database(app, db.engine, tables, force=force)
+
+
+def warm_up(app):
+    """Build state that would otherwise be built lazily by each worker."""
+    configure_mappers()
+    app.url_map.bind('localhost').match('/health')  # Sorts and compiles the rule matcher
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        fts_available()
+        # Don't carry pooled connections across fork; an in-memory database
+        # lives in its single connection and must be kept.
+        if db.engine.url.database not in (None, '', ':memory:'):
+            db.engine.dispose()
+
+
+@contextmanager
+def startup_phase(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def report_startup(app, timings, started):
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    app.config['STARTUP_TIMINGS'] = timings
+    phases = ', '.join(f'{k} {v} ms' for k, v in timings.items() if k != 'total')
+    app.logger.info(f"Startup in {timings['total']} ms ({phases})")
+
+
+class LazyApiDocs:
+    """WSGI middleware that builds the Swagger UI the first time it is requested."""
+
+    PREFIXES = ('/apidocs', '/apispec', '/flasgger_static')
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._docs = None
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(self.PREFIXES):
+            return self._docs_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def _docs_app(self):
+        with self._lock:
+            if self._docs is None:
+                from flasgger import Swagger
+                # Flasgger reads docstrings from the URL map of the app it is
+                # bound to, so mirror the API routes onto a docs-only app.
+                docs = Flask(self.app.import_name, static_folder=None)
+                docs.config.update(self.app.config)
+                for rule in self.app.url_map.iter_rules():
+                    if rule.endpoint != 'static':
+                        docs.add_url_rule(rule.rule, rule.endpoint, self.app.view_functions[rule.endpoint],
+                                          methods=rule.methods)
+                Swagger(docs)
+                self._docs = docs
+        return self._docs
+
+
+def init_apidocs(app):
+    if app.config.get('FAST_START'):
+        app.wsgi_app = LazyApiDocs(app)
+    else:
+        from flasgger import Swagger
+        Swagger(app)
+
+
+def init_startup(app):
+    """Register the init-db CLI command."""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create or upgrade the schema now rather than on the next start."""
+        ensure_schema(app, force=True)
+        router = app.extensions.get('shards')
+        if router is not None:
+            with app.app_context():
+                for user_id in router.user_ids():
+                    router.engine(user_id, force=True)
+                click.echo(f'{len(router.user_ids())} user shards upgraded')
+        click.echo('Schema is up to date')
@@ -25,6 +25,69 @@ async function fetchAuth(url, options = {}) {
     return res;
 }
 
+// Follow a background job's Server-Sent Events until it finishes.
+// EventSource can't send the Authorization header, so the stream is read with fetch.
+// The server ends each stream after a while; we reconnect until the job is done or failed.
+// Gives up on any 4xx, or after WATCH_MAX_FAILURES failed connections in a row.
+// Resolves with the final job (check job.status).
+const WATCH_MAX_FAILURES = 5;
+
+async function watchJob(jobId, onProgress) {
+    let retryMs = 1000;
+    let failures = 0;
+    while (true) {
+        let res = null;
+        try {
+            res = await fetchAuth(`/api/jobs/${jobId}/events`);
+        } catch (e) {
+            res = null;
+        }
+        if (res && res.status >= 400 && res.status < 500) {
+            return { id: jobId, status: 'failed', error: `Progress unavailable (HTTP ${res.status})` };
+        }
+        let failed = !(res && res.ok && res.body);
+        if (!failed) {
+            try {
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    failures = 0;
+                    buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+                    let end;
+                    while ((end = buffer.indexOf('\n\n')) >= 0) {
+                        const block = buffer.slice(0, end);
+                        buffer = buffer.slice(end + 2);
+                        let name = 'message';
+                        const data = [];
+                        for (const line of block.split('\n')) {
+                            if (line.startsWith('event:')) name = line.slice(6).trim();
+                            else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                            else if (line.startsWith('retry:')) retryMs = parseInt(line.slice(6), 10) || retryMs;
+                        }
+                        if (!data.length) continue;  // Keep-alive comment
+                        const job = JSON.parse(data.join('\n'));
+                        if (onProgress) onProgress(job);
+                        if (name === 'done' || name === 'failed') {
+                            reader.cancel();
+                            return job;
+                        }
+                    }
+                }
+            } catch (e) {
+                failed = true;  // The connection dropped mid-stream
+            }
+        }
+        if (failed && ++failures >= WATCH_MAX_FAILURES) {
+            const error = res ? `Progress unavailable (HTTP ${res.status})` : 'Network error';
+            return { id: jobId, status: 'failed', error };
+        }
+        await new Promise(resolve => setTimeout(resolve, retryMs));
+    }
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     const logoutBtn = document.getElementById('logout-btn');
     if (logoutBtn) {
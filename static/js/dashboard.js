@@ -21,9 +21,10 @@ async function loadDashboard() {
     const queryParams = startDate ? `?start_date=${startDate}&end_date=${endDate}` : '';
 
     try {
-        // Summary
-        const summaryRes = await fetchAuth(`/api/summary${queryParams}`);
-        const summary = await summaryRes.json();
+        // Summary, breakdown, goals and accounts arrive in a single request
+        const res = await fetchAuth(`/api/dashboard${queryParams}`);
+        const data = await res.json();
+        const summary = data.summary;
 
         document.getElementById('total-income').textContent = formatCurrency(summary.total_income).slice(1);
         document.getElementById('total-expense').textContent = formatCurrency(summary.total_expense).slice(1);
@@ -32,21 +33,17 @@ async function loadDashboard() {
         netFlowEl.textContent = formatCurrency(netFlow).slice(1);
         netFlowEl.style.color = netFlow >= 0 ? '#00ff88' : '#ff6b6b';
 
-        // Goals Preview
-        loadGoalsPreview();
-
-        // Chart
-        const catRes = await fetchAuth(`/api/expenses/by-category${queryParams}`);
-        const breakdown = await catRes.json();
-        renderChart(breakdown);
+        renderGoalsPreview(data.goals);
+        renderChart(data.by_category);
+        renderAccountsPreview(data.accounts);
     } catch (error) {
         console.error('Error loading dashboard:', error);
+        const container = document.getElementById('accounts-preview');
+        if (container) container.innerHTML = '<p class="text-danger">Failed to load accounts.</p>';
     }
 }
 
-async function loadGoalsPreview() {
-    const goalsRes = await fetchAuth('/api/goals');
-    const goals = await goalsRes.json();
+function renderGoalsPreview(goals) {
     const goalsContainer = document.getElementById('goals-preview');
     if (!goalsContainer) return;
 
@@ -113,41 +110,30 @@ document.addEventListener('DOMContentLoaded', () => {
     if (periodSelector) {
         periodSelector.addEventListener('change', loadDashboard);
         loadDashboard();
-        loadAccountsPreview();
     }
 });
 
-async function loadAccountsPreview() {
+function renderAccountsPreview(accounts) {
     const container = document.getElementById('accounts-preview');
     const totalEl = document.getElementById('total-accounts-balance');
     if (!container) return;
 
-    try {
-        const res = await fetchAuth('/api/accounts');
-        if (res.ok) {
-            const accounts = await res.json();
-
-            if (accounts.length === 0) {
-                container.innerHTML = '<p class="text-muted">No accounts connected.</p>';
-                totalEl.textContent = formatCurrency(0);
-                return;
-            }
-
-            const total = accounts.reduce((sum, acc) => sum + parseFloat(acc.balance), 0);
-            totalEl.textContent = formatCurrency(total);
-
-            container.innerHTML = accounts.map(acc => `
-                <div class="flex-between mb-2" style="padding: 0.8rem; background: rgba(255,255,255,0.03); border-radius: 8px;">
-                    <div>
-                        <div style="font-weight: 600;">${acc.name}</div>
-                        <div style="font-size: 0.8rem; color: #aaa;">${acc.type} ${acc.is_manual ? '(manual)' : ''}</div>
-                    </div>
-                    <div style="font-weight: 600; color: #fff;">${formatCurrency(acc.balance)}</div>
-                </div>
-            `).join('');
-        }
-    } catch (e) {
-        console.error('Error loading accounts:', e);
-        container.innerHTML = '<p class="text-danger">Failed to load accounts.</p>';
+    if (accounts.length === 0) {
+        container.innerHTML = '<p class="text-muted">No accounts connected.</p>';
+        totalEl.textContent = formatCurrency(0);
+        return;
     }
+
+    const total = accounts.reduce((sum, acc) => sum + parseFloat(acc.balance), 0);
+    totalEl.textContent = formatCurrency(total);
+
+    container.innerHTML = accounts.map(acc => `
+        <div class="flex-between mb-2" style="padding: 0.8rem; background: rgba(255,255,255,0.03); border-radius: 8px;">
+            <div>
+                <div style="font-weight: 600;">${acc.name}</div>
+                <div style="font-size: 0.8rem; color: #aaa;">${acc.type} ${acc.is_manual ? '(manual)' : ''}</div>
+            </div>
+            <div style="font-weight: 600; color: #fff;">${formatCurrency(acc.balance)}</div>
+        </div>
+    `).join('');
 }
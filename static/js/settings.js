@@ -162,14 +162,18 @@ async function syncBank() {
     resDiv.style.display = 'none';
 
     try {
-        const res = await fetchAuth('/api/simplefin/sync', { method: 'POST' });
-        const data = await res.json();
+        const res = await fetchAuth('/api/simplefin/sync?async=1', { method: 'POST' });
+        let data = await res.json();
 
         resDiv.style.display = 'block';
-        if (res.ok) {
+        if (res.status === 202) {
+            const job = await watchJob(data.id, renderSyncProgress);
+            data = job.status === 'done' ? job.result : { message: job.error };
+        }
+        if (res.ok && data.synced_accounts) {
             resDiv.innerHTML = `
             <div style="color: #00ff88; background: rgba(0,255,136,0.1); padding: 1rem; border-radius: 8px;">
-                ✓ Sync Complete. Found ${data.accounts.length} accounts.<br>
+                ✓ Sync Complete. Found ${data.synced_accounts.length} accounts.<br>
                 ${data.new_transactions ? `+ ${data.new_transactions} new transactions.` : ''}
             </div>
         `;
@@ -185,6 +189,25 @@ async function syncBank() {
     btn.textContent = 'Sync Now';
 }
 
+const SYNC_STAGES = {
+    fetch: 'Contacting bank',
+    process: 'Importing transactions',
+    classify: 'Categorizing',
+    dedupe: 'Checking for duplicates',
+    commit: 'Saving'
+};
+
+function renderSyncProgress(job) {
+    const resDiv = document.getElementById('sync-result');
+    const label = SYNC_STAGES[job.stage] || 'Starting';
+    const count = job.total ? ` (${job.done}/${job.total} accounts)` : '';
+    const accounts = (job.detail && job.detail.accounts) || [];
+    resDiv.innerHTML = `
+        <div class="text-muted">⏳ ${label}${count}...</div>
+        ${accounts.map(a => `<div class="text-muted">${a.name}: +${a.new} new, ${a.skipped} skipped</div>`).join('')}
+    `;
+}
+
 async function loadAccounts() {
     try {
         const res = await fetchAuth('/api/accounts');
@@ -306,6 +306,19 @@ function closeImportModal() {
     setupModal('import-modal').close();
 }
 
+const IMPORT_STAGES = {
+    process: 'Importing rows',
+    commit: 'Saving'
+};
+
+function renderImportProgress(job) {
+    const statusText = document.getElementById('import-status-text');
+    const label = IMPORT_STAGES[job.stage] || 'Uploading and processing file';
+    const rows = job.total ? ` ${job.done}/${job.total} rows` : '';
+    const counts = job.detail ? ` (${job.detail.imported} new, ${job.detail.duplicates} duplicates)` : '';
+    statusText.textContent = `${label}...${rows}${counts}`;
+}
+
 async function processImport() {
     const fileInput = document.getElementById('import-file');
     const accountSelect = document.getElementById('import-account');
@@ -330,14 +343,18 @@ async function processImport() {
     statusText.textContent = 'Uploading and processing file...';
 
     try {
-        const res = await fetchAuth('/api/transactions/import', {
+        const res = await fetchAuth('/api/transactions/import?async=1', {
             method: 'POST',
             body: formData
         });
 
-        const data = await res.json();
+        let data = await res.json();
+        if (res.status === 202) {
+            const job = await watchJob(data.id, renderImportProgress);
+            data = job.status === 'done' ? job.result : { error: job.error };
+        }
 
-        if (res.ok) {
+        if (res.ok && data.message) {
             statusText.textContent = `Success! ${data.message} (${data.duplicates} duplicates skipped)`;
             setTimeout(() => {
                 closeImportModal();
@@ -0,0 +1,25 @@
+import pytest
+from app import create_app
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """create_app on a SQLite file in tmp_path (logs and metrics are written there too)."""
+    monkeypatch.chdir(tmp_path)
+
+    def make(database='app.db', **config):
+        return create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / database}',
+            'TESTING': True,
+            'SECRET_KEY': 'test-secret-key-0123456789abcdef',
+            'METRICS_DIR': str(tmp_path / 'metrics'),
+            **config,
+        })
+    return make
+
+
+def login(client, username, password='password'):
+    """Register (if needed) and log in; returns the Authorization header."""
+    client.post('/auth/register', json={'username': username, 'password': password})
+    token = client.post('/auth/login', json={'username': username, 'password': password}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
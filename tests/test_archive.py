@@ -0,0 +1,64 @@
+"""Archived rows are read-only: edits and bulk mutations that reach one answer 409."""
+from datetime import date, timedelta
+from decimal import Decimal
+from models import db, CategoryMapping, Expense, ExpenseArchive
+from archive import archive_transactions
+from categorization import recategorize_other
+from jobs import NullProgress
+from tests.conftest import login
+
+OLD = date.today() - timedelta(days=500)
+RECENT = date.today() - timedelta(days=10)
+
+
+def archived_app(make_app):
+    """alice with one archived fallback expense (id 1) and one recent expense (id 2)."""
+    app = make_app()
+    headers = login(app.test_client(), 'alice')
+    with app.app_context():
+        db.session.add_all([
+            Expense(user_id=1, amount=Decimal('4.50'), category='Other', category_fallback=True,
+                    description='STARBUCKS #12', date=OLD),
+            Expense(user_id=1, amount=Decimal('12.00'), category='Food', description='Lunch', date=RECENT),
+        ])
+        db.session.commit()
+        archive_transactions(NullProgress(), days=400)
+        assert db.session.get(ExpenseArchive, 1) is not None
+    return app, headers
+
+
+def test_editing_an_archived_expense_is_a_conflict(make_app):
+    app, headers = archived_app(make_app)
+    client = app.test_client()
+    assert client.put('/api/expenses/1', json={'category': 'Coffee'}, headers=headers).status_code == 409
+    assert client.put('/api/expenses/99', json={'category': 'Coffee'}, headers=headers).status_code == 404
+    # Another user's archived row stays invisible
+    other = login(client, 'bob')
+    assert client.put('/api/expenses/1', json={'category': 'Coffee'}, headers=other).status_code == 404
+
+
+def test_bulk_mutations_reaching_archived_rows_are_conflicts(make_app):
+    app, headers = archived_app(make_app)
+    client = app.test_client()
+    response = client.post('/api/expenses/bulk', headers=headers,
+                           json={'action': 'recategorize', 'category': 'Misc', 'filter': {'category': 'Other'}})
+    assert response.status_code == 409
+    response = client.post('/api/expenses/bulk-update', headers=headers, json={'ids': [1, 2], 'category': 'Misc'})
+    assert response.status_code == 409
+
+    response = client.post('/api/expenses/bulk', headers=headers, json={
+        'action': 'recategorize', 'category': 'Misc',
+        'filter': {'category': 'Food', 'start_date': (RECENT - timedelta(days=1)).isoformat()},
+    })
+    assert response.status_code == 200
+    assert response.get_json()['affected'] == 1
+
+
+def test_recategorize_other_covers_archived_fallbacks(make_app):
+    app, _ = archived_app(make_app)
+    with app.app_context():
+        db.session.add(CategoryMapping(user_id=1, keyword='starbucks', category='Coffee'))
+        db.session.commit()
+        recategorize_other(NullProgress(), 1)
+        row = db.session.get(ExpenseArchive, 1)
+        assert (row.category, row.category_fallback) == ('Coffee', False)
@@ -0,0 +1,27 @@
+"""Every row of a batch create is validated before anything is written."""
+from models import db, Expense, Account
+from tests.conftest import login
+
+
+def test_invalid_rows_are_reported_by_index(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = login(client, 'alice')
+    with app.app_context():
+        db.session.add(Account(user_id=1, name='Checking', balance=0, is_manual=True))
+        db.session.commit()
+
+    items = [
+        {'amount': 5, 'category': 'Food', 'description': 'Lunch', 'account_id': 1},
+        {'amount': 5, 'category': 'Food', 'description': 42},
+        {'amount': 5, 'category': 'Food', 'account_id': True},
+        {'amount': 5, 'category': 'Food', 'account_id': '1'},
+    ]
+    response = client.post('/api/expenses/batch', headers=headers, json=items)
+    assert response.status_code == 400
+    assert [e['index'] for e in response.get_json()['errors']] == [1, 2, 3]
+    with app.app_context():
+        assert Expense.query.count() == 0
+
+    response = client.post('/api/expenses/batch', headers=headers, json=items[:1] + [{'amount': 2, 'category': 'Food'}])
+    assert response.status_code == 201
@@ -0,0 +1,43 @@
+"""Re-applying mappings only to expenses left in the fallback 'Other'."""
+from datetime import date
+from io import BytesIO
+from decimal import Decimal
+from models import db, Expense, CategoryMapping
+from categorization import recategorize_other
+from jobs import NullProgress
+from tests.conftest import login
+
+
+def test_recategorize_skips_a_chosen_other(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        def expense(description, category_fallback):
+            return Expense(user_id=1, amount=Decimal('5.00'), category='Other', description=description,
+                           date=date(2024, 3, 1), category_fallback=category_fallback)
+        imported, chosen = expense('ACME MARKET 42', True), expense('ACME MARKET 7', False)
+        db.session.add_all([imported, chosen])
+        db.session.add(CategoryMapping(user_id=1, keyword='acme market', category='Groceries'))
+        db.session.commit()
+
+        result = recategorize_other(NullProgress(), 1)
+        assert result['scanned'] == 1 and result['recategorized'] == 1
+        db.session.expire_all()
+        assert (imported.category, imported.category_fallback) == ('Groceries', False)
+        assert (chosen.category, chosen.category_fallback) == ('Other', False)
+
+
+def test_import_marks_only_unmatched_rows(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = login(client, 'alice')
+    with app.app_context():
+        db.session.add(CategoryMapping(user_id=1, keyword='gift shop', category='Other'))
+        db.session.commit()
+    csv = b'Date,Description,Amount\n2024-03-01,GIFT SHOP,-5.00\n2024-03-02,ACME MARKET,-7.00\n'
+    response = client.post('/api/transactions/import', headers=headers,
+                           data={'file': (BytesIO(csv), 'bank.csv')}, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        flags = {e.description: (e.category, e.category_fallback) for e in Expense.query}
+        assert flags == {'GIFT SHOP': ('Other', False), 'ACME MARKET': ('Other', True)}
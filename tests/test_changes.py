@@ -0,0 +1,126 @@
+"""The change_log triggers behind GET /api/changes."""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import sqlite3
+from models import db, Expense, Income, ChangeLog
+from changes import changes_since, prune_tombstones
+from archive import archive_transactions
+from jobs import NullProgress
+from tests.conftest import login
+
+
+def expense(description, day=date(2024, 3, 1), amount='12.50'):
+    return Expense(user_id=1, amount=Decimal(amount), category='Food', description=description, date=day)
+
+
+def changed(result, table='expense'):
+    bucket = result['changes'].get(table, {'upserted': [], 'deleted': []})
+    return sorted(row['description'] for row in bucket['upserted']), sorted(bucket['deleted'])
+
+
+def test_inserts_updates_and_deletes_are_logged(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        lunch, dinner = expense('lunch'), expense('dinner')
+        db.session.add_all([lunch, dinner])
+        db.session.commit()
+        first = changes_since(1, 0)
+        assert changed(first) == (['dinner', 'lunch'], [])
+
+        lunch.description = 'brunch'
+        db.session.delete(dinner)
+        db.session.commit()
+        dinner_id = dinner.id
+        second = changes_since(1, first['seq'])
+        assert changed(second) == (['brunch'], [dinner_id])
+        assert not second['reset'] and not second['has_more']
+
+        # Bulk (Core) writes are captured too, one entry per row however often it changes
+        Expense.query.filter_by(id=lunch.id).update({'category': 'Dining'})
+        Expense.query.filter_by(id=lunch.id).update({'category': 'Eating out'})
+        db.session.commit()
+        third = changes_since(1, second['seq'])
+        assert [row['category'] for row in third['changes']['expense']['upserted']] == ['Eating out']
+        assert ChangeLog.query.filter_by(entity='expense', entity_id=lunch.id).count() == 1
+
+        assert changes_since(1, third['seq'])['changes'] == {}
+
+
+def test_changes_page_and_stay_per_user(make_app):
+    app = make_app()
+    client = app.test_client()
+    login(client, 'alice')
+    login(client, 'bob')
+    with app.app_context():
+        db.session.add_all([expense(f'item {i}') for i in range(5)])
+        db.session.add(Expense(user_id=2, amount=Decimal('1'), category='x', description='bob', date=date(2024, 1, 1)))
+        db.session.commit()
+        page = changes_since(1, 0, limit=3)
+        assert page['has_more'] and len(page['changes']['expense']['upserted']) == 3
+        rest = changes_since(1, page['seq'], limit=3)
+        assert not rest['has_more'] and len(rest['changes']['expense']['upserted']) == 2
+        assert changed(changes_since(2, 0)) == (['bob'], [])
+
+
+def test_invalid_since_is_rejected(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = login(client, 'alice')
+    for query in ('since=abc', 'since=-1', 'since=1.5', 'limit=abc', 'limit=0'):
+        assert client.get(f'/api/changes?{query}', headers=headers).status_code == 400, query
+    assert client.get('/api/changes?since=0', headers=headers).status_code == 200
+
+
+def test_archiving_is_not_a_delete(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        db.session.add(expense('old', day=date.today() - timedelta(days=800)))
+        db.session.commit()
+        seq = changes_since(1, 0)['seq']
+        archive_transactions(NullProgress(), days=730)
+        assert db.session.query(Expense).count() == 0
+        assert changes_since(1, seq)['changes'] == {}
+
+
+def test_existing_rows_are_backfilled(make_app, tmp_path):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        db.session.add(expense('before triggers'))
+        db.session.add(Income(user_id=1, amount=Decimal('100'), source='Salary', date=date(2024, 3, 1)))
+        db.session.commit()
+
+    # As if the database predates the change feed
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '%_changes_%'").fetchall():
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.execute('DELETE FROM change_log')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.close()
+
+    app = make_app()
+    with app.app_context():
+        result = changes_since(1, 0)
+        assert changed(result) == (['before triggers'], [])
+        assert [row['source'] for row in result['changes']['income']['upserted']] == ['Salary']
+
+
+def test_pruned_delete_markers_force_a_reset(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        gone = expense('gone')
+        db.session.add(gone)
+        db.session.commit()
+        db.session.delete(gone)
+        db.session.commit()
+        ChangeLog.query.update({'changed_at': datetime.utcnow() - timedelta(days=100)})
+        db.session.commit()
+
+        assert prune_tombstones(days=90) == 1
+        stale = changes_since(1, 0)
+        assert stale['reset'] and stale['changes'] == {}
+        assert not changes_since(1, stale['seq'])['reset']
@@ -0,0 +1,42 @@
+"""Queued categorization events and their batched fold into the stored model."""
+from datetime import date
+from decimal import Decimal
+from models import db, CategoryModel, CategoryExample, Expense
+import classifier
+from tests.conftest import login
+
+
+def test_learning_queues_until_a_batch_is_due(make_app, monkeypatch):
+    monkeypatch.setattr(classifier, 'LEARN_BATCH_SIZE', 3)
+    app = make_app()
+    client = app.test_client()
+    headers = login(client, 'alice')
+    for description in ('ACME MARKET', 'ACME MARKET 2'):
+        response = client.post('/api/expenses', headers=headers, json={
+            'amount': 5, 'category': 'Groceries', 'description': description, 'date': '2024-03-01'})
+        assert response.status_code == 201
+
+    with app.app_context():
+        # Nothing stored yet, but predictions already see the queued events
+        assert db.session.get(CategoryModel, 1) is None
+        assert CategoryExample.query.count() == 2
+        assert classifier.predict(1, ['ACME MARKET'])[0][0] == 'Groceries'
+
+    client.post('/api/expenses', headers=headers, json={
+        'amount': 5, 'category': 'Groceries', 'description': 'ACME MARKET 3', 'date': '2024-03-02'})
+    with app.app_context():
+        assert db.session.get(CategoryModel, 1).version == 1
+        assert CategoryExample.query.count() == 0
+        assert classifier.predict(1, ['ACME MARKET'])[0][0] == 'Groceries'
+
+
+def test_classifying_an_import_folds_the_queue_first(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        classifier.learn(1, [('ACME MARKET', 'Groceries', None)] * 3)
+        db.session.add(Expense(user_id=1, amount=Decimal('5.00'), category='Other', description='ACME MARKET',
+                               date=date(2024, 3, 1), category_fallback=True))
+        assert classifier.classify_uncategorized(1, 0) == 1
+        assert CategoryExample.query.count() == 0
+        assert db.session.get(CategoryModel, 1) is not None
@@ -0,0 +1,45 @@
+"""The LIKE fallback used when SQLite lacks FTS5."""
+from datetime import date
+from decimal import Decimal
+from models import db, Expense
+import fulltext
+from tests.conftest import login
+
+
+def test_like_fallback_matches_wildcards_literally(make_app, monkeypatch):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    monkeypatch.setattr(fulltext, 'fts_available', lambda: False)
+    with app.app_context():
+        for description in ('50% off sale', '500 off sale', 'pay_pal', 'paypal', 'a\\b', 'ab'):
+            db.session.add(Expense(user_id=1, amount=Decimal('1.00'), category='Food',
+                                   description=description, date=date(2024, 3, 1)))
+        db.session.commit()
+
+        def found(query):
+            return sorted(r['description'] for r in fulltext.search_transactions(1, query))
+        assert found('50%') == ['50% off sale']
+        assert found('pay_') == ['pay_pal']
+        assert found('a\\b') == ['a\\b']
+
+
+def test_non_finite_amount_bounds_are_rejected(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = login(client, 'alice')
+    for query in ('min_amount=nan', 'max_amount=inf', 'min_amount=-Infinity', 'max_amount=abc'):
+        assert client.get(f'/api/transactions/search?q=lunch&{query}', headers=headers).status_code == 400, query
+    assert client.get('/api/transactions/search?q=lunch&min_amount=1.5', headers=headers).status_code == 200
+
+
+def test_like_fallback_matches_punctuation_only_queries(make_app, monkeypatch):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    monkeypatch.setattr(fulltext, 'fts_available', lambda: False)
+    with app.app_context():
+        for description in ('AT&T', 'ATT'):
+            db.session.add(Expense(user_id=1, amount=Decimal('1.00'), category='Bills',
+                                   description=description, date=date(2024, 3, 1)))
+        db.session.commit()
+        assert [r['description'] for r in fulltext.search_transactions(1, '&')] == ['AT&T']
+        assert fulltext.search_transactions(1, '   ') == []
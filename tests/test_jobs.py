@@ -0,0 +1,52 @@
+"""Background import jobs: progress is visible while the import itself stays atomic."""
+from models import db, Job, Expense
+import jobs
+import routes.imports
+from tests.conftest import login
+
+CSV = 'Date,Description,Amount\n' + ''.join(f'2024-03-01,Shop {i},-{i + 1}.00\n' for i in range(450))
+
+
+def run(app, monkeypatch, fail=False):
+    stages = []
+    write = jobs.JobProgress._write
+
+    def record(self, values):
+        write(self, values)
+        # Written on its own connection, so a second connection sees it while the import is open
+        with db.engine.connect() as connection:
+            stages.append(connection.execute(
+                db.select(Job.stage, Job.done).where(Job.id == self.job_id)).one())
+            stages.append(connection.execute(db.select(db.func.count()).select_from(Expense)).scalar())
+    monkeypatch.setattr(jobs.JobProgress, '_write', record)
+    if fail:
+        def boom(*args):
+            raise RuntimeError('dedupe failed')
+        monkeypatch.setattr(routes.imports, 'detect_after_ingest', boom)
+
+    with app.app_context():
+        job = Job(user_id=1, kind='import', status='queued')
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+    jobs._run(app, 1, job_id, routes.imports.run_import, (1, 'bank.csv', CSV.encode(), None))
+    with app.app_context():
+        return db.session.get(Job, job_id), Expense.query.count(), stages
+
+
+def test_progress_is_written_without_committing_the_import(make_app, monkeypatch):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    job, count, stages = run(app, monkeypatch)
+    assert job.status == 'done' and count == 450
+    progress = stages[0::2]
+    assert [tuple(p) for p in progress] == [('process', 200), ('process', 400), ('process', 450), ('commit', 0)]
+    assert set(stages[1::2]) == {0}  # Nothing visible before the final commit
+
+
+def test_failed_import_leaves_nothing_behind(make_app, monkeypatch):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    job, count, _ = run(app, monkeypatch, fail=True)
+    assert job.status == 'failed' and 'dedupe failed' in job.error
+    assert count == 0
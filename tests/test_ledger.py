@@ -0,0 +1,60 @@
+"""Checkpoints move only together with the stored balance, so reconcile sees no drift."""
+from datetime import date, timedelta
+from decimal import Decimal
+from models import db, Account, Expense, DuplicateCandidate
+from ledger import reconcile, ensure_checkpoints
+from dedupe import merge_candidate
+from tests.conftest import login
+
+LAST_MONTH = date.today().replace(day=1) - timedelta(days=20)
+
+
+def drifted(user_id):
+    return [r['account_id'] for r in reconcile(user_id=user_id) if r['drifted']]
+
+
+def test_merging_a_synced_duplicate_leaves_no_drift(make_app):
+    app = make_app()
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        account = Account(user_id=1, name='Bank', balance=Decimal('100.00'), is_manual=False, simplefin_id='acc')
+        db.session.add(account)
+        db.session.flush()
+        rows = [Expense(user_id=1, account_id=account.id, amount=Decimal('9.99'), category='Food',
+                        description='Lunch', date=LAST_MONTH, simplefin_id=f'sf_{i}') for i in range(2)]
+        db.session.add_all(rows)
+        db.session.flush()
+        ensure_checkpoints(account)
+        db.session.add(DuplicateCandidate(user_id=1, kind='expense', primary_id=rows[0].id, duplicate_id=rows[1].id))
+        db.session.commit()
+        assert drifted(1) == []
+
+        # The bank's balance never counted the duplicate twice; neither may the ledger
+        merge_candidate(DuplicateCandidate.query.one())
+        db.session.commit()
+        assert drifted(1) == []
+        assert db.session.get(Account, account.id).balance == Decimal('100.00')
+
+
+def test_manual_postings_move_balance_and_checkpoints_together(make_app):
+    app = make_app()
+    client = app.test_client()
+    alice = login(client, 'alice')
+    bob = login(client, 'bob')
+    with app.app_context():
+        for user_id in (1, 2):
+            account = Account(user_id=user_id, name='Cash', balance=Decimal('50.00'), is_manual=True)
+            db.session.add(account)
+            db.session.flush()
+            ensure_checkpoints(account)
+        db.session.commit()
+
+    expense = {'amount': 5, 'category': 'Food', 'description': 'Lunch', 'date': LAST_MONTH.isoformat()}
+    assert client.post('/api/expenses', headers=alice, json={**expense, 'account_id': 1}).status_code == 201
+    assert client.post('/api/incomes', headers=alice, json={
+        'amount': 20, 'source': 'Gift', 'date': LAST_MONTH.isoformat(), 'account_id': 1}).status_code == 201
+    # Someone else's account is refused rather than stored on the row
+    assert client.post('/api/expenses', headers=bob, json={**expense, 'account_id': 1}).status_code == 404
+    with app.app_context():
+        assert db.session.get(Account, 1).balance == Decimal('65.00')
+        assert drifted(1) == [] and drifted(2) == []
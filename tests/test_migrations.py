@@ -0,0 +1,128 @@
+"""Upgrading a database created before money was stored as cents and ids used AUTOINCREMENT."""
+from datetime import date
+from decimal import Decimal
+import sqlite3
+from models import db, Expense, Account
+from ledger import reconcile, balance_as_of
+
+# The schema as created before the money_to_cents and autoincrement_ids migrations
+LEGACY_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(120) NOT NULL,
+    simplefin_token VARCHAR(200), PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE account (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, simplefin_id VARCHAR(100), name VARCHAR(100) NOT NULL,
+    balance NUMERIC(10, 2), type VARCHAR(50), is_manual BOOLEAN, last_synced DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE budget (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, category VARCHAR(100) NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL, month VARCHAR(7) NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE income (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, account_id INTEGER, amount NUMERIC(10, 2) NOT NULL,
+    source VARCHAR(100) NOT NULL, date DATE NOT NULL, category VARCHAR(50), simplefin_id VARCHAR(100),
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id),
+    FOREIGN KEY(account_id) REFERENCES account (id) ON DELETE CASCADE, UNIQUE (simplefin_id)
+);
+CREATE TABLE expense (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, account_id INTEGER, amount NUMERIC(10, 2) NOT NULL,
+    category VARCHAR(100) NOT NULL, description VARCHAR(200), date DATE NOT NULL, simplefin_id VARCHAR(100),
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id),
+    FOREIGN KEY(account_id) REFERENCES account (id) ON DELETE CASCADE, UNIQUE (simplefin_id)
+);
+INSERT INTO user VALUES (1, 'alice', 'x', NULL);
+INSERT INTO account VALUES (1, 1, NULL, 'Checking', 1234.56, 'checking', 1, NULL);
+INSERT INTO budget VALUES (1, 1, 'Food', 300.1, '2024-01');
+INSERT INTO income VALUES (1, 1, 1, 2500.0, 'Salary', '2024-01-01', NULL, 'sf_1');
+INSERT INTO expense VALUES (1, 1, 1, 10.1, 'Food', 'Lunch', '2024-01-02', NULL);
+INSERT INTO expense VALUES (2, 1, 1, 2.675, 'Food', 'Coffee', '2024-01-03', NULL);
+INSERT INTO expense VALUES (3, 1, 1, 0.005, 'Fees', 'Interest', '2024-01-04', NULL);
+INSERT INTO expense VALUES (4, 1, 1, 1.004, 'Fees', 'Rounding', '2024-01-05', NULL);
+INSERT INTO expense VALUES (5, 1, NULL, 19.99, 'Shopping', 'Socks', '2024-01-06', 'sf_2');
+"""
+
+
+def legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+
+def test_money_becomes_integer_cents_rounded_half_up(make_app, tmp_path):
+    legacy_database(tmp_path / 'app.db')
+    make_app()
+
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    amounts = dict(conn.execute('SELECT id, amount FROM expense'))
+    assert amounts == {1: 1010, 2: 268, 3: 1, 4: 100, 5: 1999}
+    assert all(isinstance(v, int) for v in amounts.values())
+    assert conn.execute('SELECT balance FROM account').fetchone() == (123456,)
+    assert conn.execute('SELECT amount FROM income').fetchone() == (250000,)
+    assert conn.execute('SELECT amount FROM budget').fetchone() == (30010,)
+    applied = {name for (name,) in conn.execute('SELECT name FROM schema_migration')}
+    assert {'money_to_cents', 'autoincrement_ids'} <= applied
+
+
+def test_migrations_run_once(make_app, tmp_path):
+    legacy_database(tmp_path / 'app.db')
+    make_app()
+    # A forced upgrade (as `flask init-db` does) must not scale the amounts again
+    app = make_app()
+    from startup import ensure_schema
+    ensure_schema(app, force=True)
+
+    with app.app_context():
+        assert db.session.get(Expense, 1).amount == Decimal('10.10')
+        assert db.session.get(Account, 1).balance == Decimal('1234.56')
+
+
+def test_ids_are_rebuilt_with_autoincrement(make_app, tmp_path):
+    legacy_database(tmp_path / 'app.db')
+    app = make_app()
+
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    for table in ('expense', 'income'):
+        ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+        assert 'AUTOINCREMENT' in ddl.upper()
+    conn.close()
+
+    with app.app_context():
+        # Every row survived the rebuild, and a deleted id is never handed out again
+        assert Expense.query.count() == 5
+        db.session.delete(db.session.get(Expense, 5))
+        db.session.commit()
+        expense = Expense(user_id=1, amount=Decimal('1.00'), category='Food', description='Tea',
+                          date=date(2024, 1, 7))
+        db.session.add(expense)
+        db.session.commit()
+        assert expense.id == 6
+
+
+def test_upgraded_ledger_reconciles(make_app, tmp_path):
+    legacy_database(tmp_path / 'app.db')
+    app = make_app()
+
+    with app.app_context():
+        reports = reconcile()
+        assert [(r['account_id'], r['drifted']) for r in reports] == [(1, False)]
+        assert reports[0]['stored'] == Decimal('1234.56')
+        assert isinstance(reports[0]['ledger'], Decimal)
+        # Opening balance: the stored balance minus the exact cents posted since
+        account = db.session.get(Account, 1)
+        assert balance_as_of(account, date(2024, 1, 1)) == Decimal('1234.56') + Decimal('13.79')
+
+
+def test_imported_other_is_marked_as_fallback(make_app, tmp_path):
+    legacy_database(tmp_path / 'app.db')
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.execute("INSERT INTO expense VALUES (6, 1, 1, 4.5, 'Other', 'ACME 123', '2024-01-07', 'sf_3')")
+    conn.execute("INSERT INTO expense VALUES (7, 1, 1, 3.0, 'Other', 'Gift', '2024-01-08', NULL)")
+    conn.commit()
+    conn.close()
+    make_app()
+
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    flags = dict(conn.execute('SELECT id, category_fallback FROM expense'))
+    assert flags == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 1, 7: 0}
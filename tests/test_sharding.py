@@ -0,0 +1,98 @@
+"""Per-user database routing (SHARDING) and splitting a shared database into shards."""
+import sqlite3
+import pytest
+from models import User, Expense
+from sharding import use_shard, each_shard
+from tests.conftest import login
+
+
+def sharded(make_app, tmp_path, **config):
+    return make_app(SHARDING=True, SHARD_DIR=str(tmp_path / 'shards'), **config)
+
+
+def add_expense(client, headers, description):
+    response = client.post('/api/expenses', headers=headers, json={
+        'amount': 12.5, 'category': 'Food', 'description': description, 'date': '2024-03-01'})
+    assert response.status_code == 201
+
+
+def descriptions(client, headers):
+    return sorted(e['description'] for e in client.get('/api/expenses', headers=headers).get_json())
+
+
+def tables(path):
+    conn = sqlite3.connect(path)
+    names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    conn.close()
+    return names
+
+
+def test_each_user_gets_their_own_database(make_app, tmp_path):
+    app = sharded(make_app, tmp_path)
+    client = app.test_client()
+    alice, bob = login(client, 'alice'), login(client, 'bob')
+    add_expense(client, alice, 'alice lunch')
+    add_expense(client, bob, 'bob lunch')
+
+    assert descriptions(client, alice) == ['alice lunch']
+    assert descriptions(client, bob) == ['bob lunch']
+
+    router = app.extensions['shards']
+    assert router.user_ids() == [1, 2]
+    # The main database is only the user directory; transactions live in the user's file
+    assert 'expense' not in tables(tmp_path / 'app.db')
+    assert 'user' in tables(tmp_path / 'app.db')
+    assert 'user' not in tables(router.path(1))
+    conn = sqlite3.connect(router.path(1))
+    assert [d for (d,) in conn.execute('SELECT description FROM expense')] == ['alice lunch']
+    conn.close()
+
+
+def test_user_data_needs_a_selected_shard(make_app, tmp_path):
+    app = sharded(make_app, tmp_path)
+    login(app.test_client(), 'alice')
+    with app.app_context():
+        assert User.query.count() == 1  # Directory tables need no shard
+        with pytest.raises(RuntimeError):
+            Expense.query.count()
+        use_shard(1)
+        assert Expense.query.count() == 0
+
+
+def test_each_shard_visits_every_user(make_app, tmp_path):
+    app = sharded(make_app, tmp_path)
+    client = app.test_client()
+    for name in ('alice', 'bob', 'carol'):
+        add_expense(client, login(client, name), f'{name} lunch')
+
+    with app.app_context():
+        seen = {uid: [e.description for e in Expense.query.all()] for uid in each_shard()}
+    assert seen == {1: ['alice lunch'], 2: ['bob lunch'], 3: ['carol lunch']}
+
+
+def test_lru_keeps_at_most_max_open_engines(make_app, tmp_path):
+    app = sharded(make_app, tmp_path, SHARD_MAX_OPEN=1)
+    client = app.test_client()
+    alice, bob = login(client, 'alice'), login(client, 'bob')
+    add_expense(client, alice, 'alice lunch')
+    add_expense(client, bob, 'bob lunch')
+    # Reopening an evicted shard still finds its data
+    assert descriptions(client, alice) == ['alice lunch']
+    assert len(app.extensions['shards']._engines) == 1
+
+
+def test_split_shards_copies_each_users_rows(make_app, tmp_path):
+    shared = make_app(SHARD_DIR=str(tmp_path / 'shards'))
+    client = shared.test_client()
+    alice, bob = login(client, 'alice'), login(client, 'bob')
+    add_expense(client, alice, 'alice lunch')
+    add_expense(client, alice, 'alice dinner')
+    add_expense(client, bob, 'bob lunch')
+
+    result = shared.test_cli_runner().invoke(args=['split-shards'])
+    assert result.exit_code == 0, result.output
+
+    app = sharded(make_app, tmp_path)
+    client = app.test_client()
+    assert descriptions(client, login(client, 'alice')) == ['alice dinner', 'alice lunch']
+    assert descriptions(client, login(client, 'bob')) == ['bob lunch']
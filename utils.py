@@ -1,22 +1,207 @@
-from models import CategoryMapping
+from flask import request, make_response, current_app
+from flask.json.provider import DefaultJSONProvider
+from functools import wraps
+from collections import OrderedDict
+from decimal import Decimal
+import threading
+from datetime import date, timedelta
+import hashlib
+import re
+from models import db, CategoryMapping, get_data_version
+from sqlalchemy import insert, update, func, type_coerce, String
+
+_CARD_SUFFIX = re.compile(r"\b(?:card|acct|account|ending(?: in)?)\s*(?:no\.?|#)?\s*[x*]*\d+")
+_HAS_DIGIT = re.compile(r"\S*\d\S*")
+_PUNCTUATION = re.compile(r"[^\w&']+|_")
+
+def normalize_merchant(description):
+    """
+    Merchant key for a bank description: lowercased, with card suffixes, dates,
+    store numbers and reference ids (any token containing a digit) removed, so
+    "AMAZON MKTPL*K47Y3" and "AMAZON MKTPL #4521" both become "amazon mktpl".
+    Falls back to the lowercased description if nothing is left.
+    """
+    if not description:
+        return ''
+    raw = description.lower().strip()
+    key = _CARD_SUFFIX.sub(' ', raw.replace('*', ' '))
+    key = _HAS_DIGIT.sub(' ', key)
+    key = ' '.join(_PUNCTUATION.sub(' ', key).split())
+    return key or raw
+
+FALLBACK_CATEGORY = 'Other'
 
 def auto_categorize(description, user_id):
     """
     Suggests a category based on the description using learned CategoryMapping.
     """
+    return match_category(description, user_id) or FALLBACK_CATEGORY
+
+def match_category(description, user_id):
+    """
+    The learned category for a description, or None when no mapping matches
+    (so callers can tell the fallback from a mapping that says 'Other').
+    """
     if not description:
-        return 'Other'
+        return None
     
-    keyword = description.lower().strip()
+    keyword = normalize_merchant(description)
     # Try exact match first
     mapping = CategoryMapping.query.filter_by(user_id=user_id, keyword=keyword).first()
     if mapping:
         return mapping.category
     
     # Try fuzzy match (if any mapping keyword is inside the description)
+    raw = description.lower().strip()
     all_mappings = CategoryMapping.query.filter_by(user_id=user_id).all()
     for m in all_mappings:
-        if m.keyword in keyword:
+        if m.keyword in keyword or m.keyword in raw:
             return m.category
             
-    return 'Other'
+    return None
+
+def learn_category_mappings(user_id, pairs):
+    """
+    Learn from (description, category) pairs in order, with the same rules as
+    adding expenses one at a time: the mapped category again bumps the count,
+    a different one replaces it and resets the count. One read, then one bulk
+    update and one bulk insert. Bypasses the flush, so callers bump the data version.
+    """
+    pairs = [(normalize_merchant(d), c) for d, c in pairs if d and d.strip()]
+    if not pairs:
+        return 0
+    keywords = {k for k, _ in pairs}
+    learned = {}
+    rows = db.session.query(CategoryMapping.id, CategoryMapping.keyword, CategoryMapping.category,
+                            CategoryMapping.count).filter(
+        CategoryMapping.user_id == user_id, CategoryMapping.keyword.in_(keywords)
+    ).order_by(CategoryMapping.id)
+    for row in rows:
+        learned.setdefault(row.keyword, {'id': row.id, 'category': row.category, 'count': row.count or 1})
+
+    changed = set()
+    for keyword, category in pairs:
+        mapping = learned.get(keyword)
+        if mapping is None:
+            learned[keyword] = {'id': None, 'category': category, 'count': 1}
+        elif mapping['category'] == category:
+            mapping['count'] += 1
+        else:
+            mapping['category'] = category
+            mapping['count'] = 1
+        changed.add(keyword)
+
+    updates = [learned[k] for k in changed if learned[k]['id'] is not None]
+    inserts = [{'user_id': user_id, 'keyword': k, 'category': learned[k]['category'], 'count': learned[k]['count']}
+               for k in changed if learned[k]['id'] is None]
+    if updates:
+        db.session.execute(update(CategoryMapping), updates)
+    if inserts:
+        db.session.execute(insert(CategoryMapping), inserts)
+    return len(changed)
+
+BUCKETS = ('day', 'week', 'month')
+
+def bucket_expr(column, bucket):
+    """SQL expression for the YYYY-MM-DD start of the day, week (Monday) or month a date column falls in."""
+    if bucket == 'day':
+        # Dates are already stored as YYYY-MM-DD text
+        return type_coerce(column, String)
+    if bucket == 'week':
+        # Monday of the week
+        return func.date(column, '-6 days', 'weekday 1')
+    return func.strftime('%Y-%m-01', column)
+
+def bucket_start(d, bucket):
+    if bucket == 'day':
+        return d
+    if bucket == 'week':
+        return d - timedelta(days=d.weekday())
+    return d.replace(day=1)
+
+def next_bucket(d, bucket):
+    if bucket == 'day':
+        return d + timedelta(days=1)
+    if bucket == 'week':
+        return d + timedelta(days=7)
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def previous_bucket(d, bucket):
+    """Start of the bucket before the one starting at d."""
+    if bucket == 'day':
+        return d - timedelta(days=1)
+    if bucket == 'week':
+        return d - timedelta(days=7)
+    return (d - timedelta(days=1)).replace(day=1)
+
+class FinanceJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider with fast paths for the values our queries return:
+    Decimal as a number and date/datetime as ISO 8601 (matching to_dict()).
+    """
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Decimal):
+            return float(o)
+        if isinstance(o, date):  # also covers datetime
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+_result_cache_lock = threading.Lock()
+RESULT_CACHE_SIZE = 256
+
+def cached_for_version(user_id, key, compute):
+    """
+    Memoize compute() per (user, data version, key) in this process. Each app
+    has its own cache, so apps on different databases never share entries.
+    Entries for older versions are never hit again and age out of the LRU.
+    Results that depend on today's date must include it in key.
+    """
+    cache = current_app.extensions.setdefault('result_cache', OrderedDict())
+    cache_key = (user_id, get_data_version(user_id), key)
+    with _result_cache_lock:
+        if cache_key in cache:
+            cache.move_to_end(cache_key)
+            return cache[cache_key]
+    value = compute()
+    with _result_cache_lock:
+        cache[cache_key] = value
+        while len(cache) > RESULT_CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
+
+def compute_etag(user_id, version=None):
+    """
+    Strong ETag for the current request: database + endpoint + query args + the user's
+    data version + today's date, since ranges that default to today (analytics, net
+    worth, budgets) move on at midnight without any write.
+    """
+    if version is None:
+        version = get_data_version(user_id)
+    args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    raw = f"{db.engine.url}|{request.endpoint}|{user_id}|{version}|{args}|{date.today().isoformat()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def etag_cached(f):
+    """
+    Conditional GET for per-user read endpoints. Must be applied below @token_required.
+    Answers a matching If-None-Match with 304 before the view runs any queries.
+    """
+    @wraps(f)
+    def decorated(current_user_id, *args, **kwargs):
+        etag = compute_etag(current_user_id)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(current_user_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # The view may have written (e.g. seeding categories), so re-read the version
+            etag = compute_etag(current_user_id)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Authorization')
+        return response
+    return decorated